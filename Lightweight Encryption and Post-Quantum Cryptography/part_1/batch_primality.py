@@ -0,0 +1,230 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from itertools import compress
+from math import gcd, prod
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from miller_rabin import miller_rabin, baillie_psw, simple_sieve
+from prime_generation import sieve_window
+
+PREFILTER_LIMIT = 1000
+PREFILTER_PRIMES = simple_sieve(PREFILTER_LIMIT)
+PREFILTER_SET = frozenset(PREFILTER_PRIMES)
+PRIMORIAL = prod(PREFILTER_PRIMES)
+# Anything below this with no prefilter factor is prime, no worker needed
+EXACT_BELOW = PREFILTER_PRIMES[-1] ** 2
+
+TARGET_CHUNK_SECONDS = 0.05
+MIN_CHUNK, MAX_CHUNK = 16, 8192
+RANGE_WINDOW = 1 << 15
+
+
+@dataclass
+class BatchStats:
+    total: int = 0           # numbers seen
+    prefiltered: int = 0     # settled by the sieve prefilter
+    dispatched: int = 0      # sent to the workers
+    chunks: int = 0
+    chunk_size: int = 0
+    elapsed: float = 0.0
+    worker_busy: Dict[int, float] = field(default_factory=dict)   # pid -> seconds
+
+    @property
+    def throughput(self) -> float:
+        """Numbers classified per second"""
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def utilization(self) -> Dict[int, float]:
+        """Fraction of the wall time each worker spent testing"""
+        if not self.elapsed:
+            return {}
+        return {pid: busy / self.elapsed for pid, busy in self.worker_busy.items()}
+
+
+def prefilter(n: int) -> Optional[bool]:
+    """Cheap verdict from small primes, or None when a full test is needed"""
+    if n < 2:
+        return False
+    if n <= PREFILTER_LIMIT:
+        return n in PREFILTER_SET
+    if gcd(n, PRIMORIAL) != 1:
+        return False
+    if n < EXACT_BELOW:
+        return True
+    return None
+
+
+def _test_one(n: int, k: Optional[int]) -> bool:
+    return baillie_psw(n) if k is None else miller_rabin(n, k)
+
+
+def _test_chunk(chunk: List[int], k: Optional[int]) -> Tuple[List[bool], int, float]:
+    """Worker entry point: verdicts for one chunk plus the time spent on it"""
+    start = time.perf_counter()
+    verdicts = [_test_one(n, k) for n in chunk]
+    return verdicts, os.getpid(), time.perf_counter() - start
+
+
+def tune_chunk_size(sample: List[int], k: Optional[int] = None) -> int:
+    """Size chunks so each takes about TARGET_CHUNK_SECONDS in a worker"""
+    sample = sample[:8]
+    if not sample:
+        return MIN_CHUNK
+    start = time.perf_counter()
+    for n in sample:
+        _test_one(n, k)
+    per_item = (time.perf_counter() - start) / len(sample)
+    if per_item <= 0:
+        return MAX_CHUNK
+    return max(MIN_CHUNK, min(MAX_CHUNK, int(TARGET_CHUNK_SECONDS / per_item)))
+
+
+def _classify(numbers: Iterable[int], k: Optional[int], workers: Optional[int],
+              chunk_size: Optional[int], ordered: bool,
+              stats: BatchStats) -> Iterator[Tuple[int, bool]]:
+    """Core loop: prefilter, chunk the survivors and yield (n, verdict) pairs"""
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    def batches() -> Iterator[Tuple[List[int], List[Optional[bool]]]]:
+        # Each batch keeps the input order; pending slots are filled by a worker
+        it = iter(numbers)
+        size = chunk_size
+        while True:
+            group, verdicts, survivors = [], [], []
+            while len(survivors) < (size or MIN_CHUNK):
+                n = next(it, None)
+                if n is None:
+                    break
+                stats.total += 1
+                verdict = prefilter(n)
+                if verdict is None:
+                    survivors.append(n)
+                else:
+                    stats.prefiltered += 1
+                group.append(n)
+                verdicts.append(verdict)
+            if not group:
+                return
+            if size is None:
+                size = tune_chunk_size(survivors, k)
+                stats.chunk_size = size
+            yield group, verdicts
+
+    def merge(group, verdicts, results):
+        results = iter(results)
+        for n, verdict in zip(group, verdicts):
+            yield n, next(results) if verdict is None else verdict
+
+    def record(result) -> List[bool]:
+        verdicts, pid, busy = result
+        if pid is not None:
+            stats.worker_busy[pid] = stats.worker_busy.get(pid, 0.0) + busy
+        return verdicts
+
+    def submit(pool, survivors) -> Future:
+        stats.dispatched += len(survivors)
+        if survivors:
+            stats.chunks += 1
+            return pool.submit(_test_chunk, survivors, k)
+        future = Future()   # whole batch settled by the prefilter
+        future.set_result(([], None, 0.0))
+        return future
+
+    try:
+        if workers <= 1:
+            for group, verdicts in batches():
+                survivors = [n for n, v in zip(group, verdicts) if v is None]
+                stats.dispatched += len(survivors)
+                if survivors:
+                    stats.chunks += 1
+                    yield from merge(group, verdicts, record(_test_chunk(survivors, k)))
+                else:
+                    yield from zip(group, verdicts)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
+            max_in_flight = 2 * workers
+            for group, verdicts in batches():
+                survivors = [n for n, v in zip(group, verdicts) if v is None]
+                in_flight.append((group, verdicts, submit(pool, survivors)))
+                while len(in_flight) >= max_in_flight:
+                    if ordered:
+                        group, verdicts, future = in_flight.popleft()
+                        yield from merge(group, verdicts, record(future.result()))
+                    else:
+                        wait([f for _, _, f in in_flight], return_when=FIRST_COMPLETED)
+                        ready, remaining = [], deque()
+                        for item in in_flight:
+                            (ready if item[2].done() else remaining).append(item)
+                        in_flight = remaining
+                        for group, verdicts, future in ready:
+                            yield from merge(group, verdicts, record(future.result()))
+            while in_flight:
+                group, verdicts, future = in_flight.popleft()
+                yield from merge(group, verdicts, record(future.result()))
+    finally:
+        stats.elapsed = time.perf_counter() - start
+
+
+def is_prime_many(numbers: Iterable[int], k: Optional[int] = None, workers: Optional[int] = None,
+                  chunk_size: Optional[int] = None, stream: bool = False, ordered: bool = True,
+                  stats: Optional[BatchStats] = None):
+    """Primality verdicts for many numbers using a process pool.
+
+    Numbers settled by the small-prime prefilter never leave this process;
+    the rest are tested in chunks with baillie_psw, or with miller_rabin(n, k)
+    when k is given. Returns a list of booleans in input order, or with
+    stream=True a generator of (n, verdict) pairs (ordered=False lets chunks
+    come back in completion order). Pass a BatchStats to collect throughput
+    and per-worker utilization.
+    """
+    stats = stats if stats is not None else BatchStats()
+    results = _classify(numbers, k, workers, chunk_size, ordered or not stream, stats)
+    if stream:
+        return results
+    return [verdict for _, verdict in results]
+
+
+def _range_candidates(lo: int, hi: int) -> Iterator[int]:
+    """Odd numbers in [lo, hi) with no factor below PREFILTER_LIMIT (plus 2 and small primes)"""
+    for p in PREFILTER_PRIMES:
+        if lo <= p < hi:
+            yield p
+    odd_primes = PREFILTER_PRIMES[1:]
+    base = max(lo, PREFILTER_LIMIT + 1) | 1
+    while base < hi:
+        window = min(RANGE_WINDOW, (hi - base + 1) // 2)
+        residues = [base % p for p in odd_primes]
+        sieve = sieve_window(residues, odd_primes, window)
+        yield from compress(range(base, base + 2 * window, 2), sieve)
+        base += 2 * window
+
+
+def primes_in_range(lo: int, hi: int, k: Optional[int] = None, workers: Optional[int] = None,
+                    chunk_size: Optional[int] = None, stream: bool = False,
+                    stats: Optional[BatchStats] = None):
+    """Primes p with lo <= p < hi, sieving windows before dispatching survivors"""
+    if hi <= lo:
+        return iter(()) if stream else []
+    results = is_prime_many(_range_candidates(lo, hi), k=k, workers=workers,
+                            chunk_size=chunk_size, stream=True, stats=stats)
+    primes = (n for n, verdict in results if verdict)
+    return primes if stream else list(primes)
+
+
+if __name__ == "__main__":
+    import random
+    for bits in (64, 256):
+        numbers = [random.getrandbits(bits) | 1 for _ in range(20000)]
+        stats = BatchStats()
+        verdicts = is_prime_many(numbers, stats=stats)
+        print(f"{bits}-bit: {sum(verdicts)} primes in {stats.total} numbers, "
+              f"{stats.prefiltered} prefiltered, chunk size {stats.chunk_size}, "
+              f"{stats.throughput:.0f} numbers/s")
+        for pid, share in stats.utilization().items():
+            print(f"  worker {pid}: {share:.0%} busy")
@@ -1,4 +1,11 @@
 import random
+from itertools import compress
+from math import isqrt
+
+try:
+    import numpy as np
+except ImportError:      # optional, only speeds up prime_count
+    np = None
 
 def miller_rabin(n, k):
     if n == 2 or n == 3:
@@ -26,19 +33,288 @@ def miller_rabin(n, k):
             return False
     return True
 
-print(miller_rabin(17, 5))
+TRIAL_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47)
+
+def strong_probable_prime(n, a):
+    """Single strong (Miller-Rabin) round for odd n > 2 with a fixed base"""
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        r += 1
+        d //= 2
+    x = pow(a, d, n)
+    if x == 1 or x == n - 1:
+        return True
+    for _ in range(r - 1):
+        x = x * x % n
+        if x == n - 1:
+            return True
+    return False
+
+def jacobi(a, n):
+    """Jacobi symbol (a/n) for odd positive n"""
+    a %= n
+    result = 1
+    while a:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
+
+def strong_lucas_test(n):
+    """Strong Lucas probable prime test with Selfridge's parameters (method A)"""
+    root = isqrt(n)
+    if root * root == n:
+        return False    # no D with (D/n) = -1 exists for squares
+
+    # First D in 5, -7, 9, -11, ... with (D/n) = -1
+    D = 5
+    while True:
+        j = jacobi(D, n)
+        if j == -1:
+            break
+        if j == 0 and abs(D) != n:
+            return False
+        D = -D - 2 if D > 0 else -D + 2
+    P, Q = 1, (1 - D) // 4
+
+    # n + 1 = d * 2^s
+    d, s = n + 1, 0
+    while d % 2 == 0:
+        s += 1
+        d //= 2
+
+    # Left-to-right binary chain for U_d, V_d and Q^d
+    U, V, Qk = 1, P, Q % n
+    for bit in bin(d)[3:]:
+        U = U * V % n
+        V = (V * V - 2 * Qk) % n
+        Qk = Qk * Qk % n
+        if bit == '1':
+            U, V = P * U + V, D * U + P * V
+            if U % 2:
+                U += n
+            U = (U // 2) % n
+            if V % 2:
+                V += n
+            V = (V // 2) % n
+            Qk = Qk * Q % n
+
+    if U == 0 or V == 0:
+        return True
+    for _ in range(s - 1):
+        V = (V * V - 2 * Qk) % n
+        if V == 0:
+            return True
+        Qk = Qk * Qk % n
+    return False
+
+def baillie_psw(n):
+    """Baillie-PSW test: base-2 strong test followed by a strong Lucas test.
+
+    Deterministic, with no known counterexample, and its cost does not grow
+    with a confidence parameter the way miller_rabin(n, k) does.
+    """
+    if n < 2:
+        return False
+    for p in TRIAL_PRIMES:
+        if n % p == 0:
+            return n == p
+    return strong_probable_prime(n, 2) and strong_lucas_test(n)
 
 def modularExponentiation(base, exponent, modulus):
     result = 1
     base = base % modulus
     while exponent > 0:
         if (exponent % 2) == 1:
-            result = (result % modulus * base % modulus) % modulus
+            result = result * base % modulus
         exponent = exponent >> 1
-        base = (base % modulus * base % modulus) % modulus
+        base = base * base % modulus
     return result
 
-print(modularExponentiation(123456789, 123456789, 100000007))
+def simple_sieve(limit):
+    """All primes <= limit using a plain odd-only Eratosthenes sieve"""
+    if limit < 2:
+        return []
+    flags = bytearray([1]) * ((limit - 1) // 2)    # flags[i] <-> 2i + 3
+    for i in range((isqrt(limit) - 1) // 2):
+        if flags[i]:
+            p = 2 * i + 3
+            start = (p * p - 3) // 2
+            flags[start::p] = bytes(len(range(start, len(flags), p)))
+    return [2] + [2 * i + 3 for i in range(len(flags)) if flags[i]]
+
+# Odd numbers 1, 3, 5, ... with multiples of 3, 5 and 7 already struck out.
+# The pattern repeats every 105 odd numbers (3 * 5 * 7), so a segment can be
+# initialised from it instead of sieving those three primes every time.
+WHEEL_PRIMES = (3, 5, 7)
+WHEEL_PERIOD = 105
+WHEEL_PATTERN = bytes(0 if any((2 * i + 1) % p == 0 for p in WHEEL_PRIMES) else 1
+                      for i in range(WHEEL_PERIOD))
+
+def segmented_sieve(limit, start=2, segment_size=1 << 18, wheel=False):
+    """Yield the primes in [start, limit] lazily, one segment at a time.
+
+    Only odd numbers are stored, one byte each, so memory stays around
+    sqrt(limit) base primes plus segment_size bytes. With wheel=True each
+    segment is pre-filled from a 3*5*7 wheel pattern and sieving starts at 11.
+    """
+    if limit < 2 or start > limit:
+        return
+    if segment_size < 1:
+        raise ValueError("segment_size must be positive")
+    if start <= 2:
+        yield 2
+
+    skip = WHEEL_PRIMES if wheel else ()
+    for p in skip:
+        if start <= p <= limit:
+            yield p
+    base_primes = [p for p in simple_sieve(isqrt(limit))[1:] if p not in skip]
+    if wheel:
+        tile = WHEEL_PATTERN * (segment_size // WHEEL_PERIOD + 2)
+
+    low = max(start, 3) | 1
+    while low <= limit:
+        high = min(low + 2 * segment_size, limit + 1)   # segment covers odd n in [low, high)
+        size = (high - low + 1) // 2
+        if wheel:
+            offset = ((low - 1) // 2) % WHEEL_PERIOD
+            segment = bytearray(tile[offset:offset + size])
+            for p in skip:
+                if low <= p < high:
+                    segment[(p - low) // 2] = 0    # already yielded above
+        else:
+            segment = bytearray([1]) * size
+
+        for p in base_primes:
+            if p * p >= high:
+                break
+            first = max(p * p, (low + p - 1) // p * p)
+            if first % 2 == 0:
+                first += p
+            idx = (first - low) // 2
+            segment[idx::p] = bytes(len(range(idx, size, p)))
+
+        yield from compress(range(low, high, 2), segment)
+        low = high if high % 2 else high + 1
+
+def _prime_count_lists(x, r, primes):
+    """Lucy_Hedgehog's recurrence on Python lists (any size of x)"""
+    small = [v - 1 for v in range(r + 1)]             # small[v] = S(v)
+    large = [0] + [x // i - 1 for i in range(1, r + 1)]  # large[i] = S(x // i)
+    for p in primes:
+        sp = small[p - 1]
+        p2 = p * p
+        last = min(r, x // p2)
+        k = min(last, r // p)             # x // (i * p) is still a large value up to here
+        large[1:k + 1] = [a - b + sp for a, b in zip(large[1:k + 1], large[p:k * p + 1:p])]
+        large[k + 1:last + 1] = [large[i] - small[x // (i * p)] + sp for i in range(k + 1, last + 1)]
+        if p2 <= r:
+            small[p2:] = [small[v] - small[v // p] + sp for v in range(p2, r + 1)]
+    return large[1]
+
+def _prime_count_numpy(x, r, primes):
+    """Same recurrence with one vectorized update per prime and value range"""
+    small = np.arange(-1, r, dtype=np.int64)
+    quotients = np.zeros(r + 1, dtype=np.int64)
+    quotients[1:] = x // np.arange(1, r + 1, dtype=np.int64)     # x // i
+    large = quotients - 1
+    for p in primes:
+        sp = small[p - 1]
+        p2 = p * p
+        last = min(r, x // p2)
+        k = min(last, r // p)
+        large[1:k + 1] -= large[p:k * p + 1:p] - sp
+        if last > k:
+            # x // (i * p) == (x // i) // p, and below sqrt(x) for these i
+            large[k + 1:last + 1] -= small[quotients[k + 1:last + 1] // p] - sp
+        if p2 <= r:
+            # v // p for v = p2..r runs through p, p+1, ... each repeated p times
+            large_v = np.repeat(small[p:r // p + 1], p)[:r - p2 + 1]
+            small[p2:] -= large_v - sp
+    return int(large[1])
+
+def prime_count(x):
+    """Number of primes <= x, pi(x), by Lucy_Hedgehog's method.
+
+    Only the S(v) = #{2 <= n <= v surviving the sieve} for the 2*sqrt(x)
+    distinct values v = x // i are kept, and the multiples of each prime
+    p <= sqrt(x) are removed from all of them at once. That is
+    O(x^(3/4) / log x) work in O(sqrt(x)) memory; with NumPy the updates
+    are vectorized and x = 10**12 takes a few seconds.
+    """
+    if x < 2:
+        return 0
+    r = isqrt(x)
+    primes = simple_sieve(r)
+    if np is not None and x < 1 << 62:
+        return _prime_count_numpy(x, r, primes)
+    return _prime_count_lists(x, r, primes)
+
+def benchmark_prime_count(exponents=(6, 7, 8, 9, 10, 11, 12), sieve_limit=10 ** 7):
+    """Seconds for prime_count(10**e), next to counting a segmented sieve where that is practical"""
+    import time
+    results = []
+    for e in exponents:
+        x = 10 ** e
+        start = time.perf_counter()
+        count = prime_count(x)
+        row = {"x": x, "count": count, "prime_count": time.perf_counter() - start}
+        if x <= sieve_limit:
+            start = time.perf_counter()
+            assert sum(1 for _ in segmented_sieve(x, wheel=True)) == count
+            row["sieve"] = time.perf_counter() - start
+        results.append(row)
+    return results
+
+def benchmark_primality(bit_sizes=(64, 256, 512, 1024, 2048), samples=5, rounds=(5, 20, 40)):
+    """Average seconds per prime for baillie_psw and miller_rabin(n, k).
+
+    Primes are used as inputs because every round has to run for them,
+    which is the latency a caller pays for a candidate that passes.
+    """
+    import time
+    results = []
+    for bits in bit_sizes:
+        primes = []
+        while len(primes) < samples:
+            n = random.getrandbits(bits) | (1 << (bits - 1)) | 1
+            while not baillie_psw(n):
+                n += 2
+            primes.append(n)
+
+        row = {"bits": bits}
+        start = time.perf_counter()
+        for n in primes:
+            baillie_psw(n)
+        row["bpsw"] = (time.perf_counter() - start) / samples
+        for k in rounds:
+            start = time.perf_counter()
+            for n in primes:
+                miller_rabin(n, k)
+            row["mr%d" % k] = (time.perf_counter() - start) / samples
+        results.append(row)
+    return results
+
+if __name__ == "__main__":
+    print(miller_rabin(17, 5))
+    print(modularExponentiation(123456789, 123456789, 100000007))
+
+    print("\nBPSW vs Miller-Rabin (ms per prime input)")
+    for row in benchmark_primality():
+        print("%5d bits | BPSW %8.2f | MR k=5 %8.2f | MR k=20 %8.2f | MR k=40 %8.2f" % (
+            row["bits"], row["bpsw"] * 1e3, row["mr5"] * 1e3, row["mr20"] * 1e3, row["mr40"] * 1e3))
+
+    print("\nprime_count(x) (seconds)")
+    for row in benchmark_prime_count():
+        sieve = "%8.2f" % row["sieve"] if "sieve" in row else "       -"
+        print("x = 10^%-2d | pi(x) = %14d | Lucy_Hedgehog %7.3f | segmented sieve %s" % (
+            len(str(row["x"])) - 1, row["count"], row["prime_count"], sieve))
 
 
 
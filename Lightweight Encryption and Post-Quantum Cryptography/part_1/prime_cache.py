@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from miller_rabin import miller_rabin, baillie_psw
+from batch_primality import prefilter, is_prime_many as _batch_is_prime_many
+
+DEFAULT_CAPACITY = 4096     # verdicts kept in memory
+COMMIT_EVERY = 64           # new verdicts buffered before an sqlite commit
+
+EXACT, BPSW, MILLER_RABIN = "exact", "baillie_psw", "miller_rabin"
+
+
+@dataclass(frozen=True)
+class Verdict:
+    is_prime: bool
+    method: str          # EXACT, BPSW or MILLER_RABIN
+    rounds: int = 0      # Miller-Rabin rounds, 0 otherwise
+
+    @property
+    def confidence(self) -> float:
+        """Probability bound that the verdict is right (composites are always certain)"""
+        if not self.is_prime or self.method != MILLER_RABIN:
+            return 1.0
+        return 1.0 - 4.0 ** -self.rounds
+
+    def satisfies(self, k: Optional[int]) -> bool:
+        """Whether this verdict is at least as strong as a fresh test with k rounds (None = BPSW)"""
+        if not self.is_prime or self.method in (EXACT, BPSW):
+            return True     # a witness proves compositeness; BPSW outranks any round count
+        return k is not None and self.rounds >= k
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    upgrades: int = 0      # cached verdict too weak for the request, retested
+
+    @property
+    def lookups(self) -> int:
+        return self.memory_hits + self.disk_hits + self.misses + self.upgrades
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.memory_hits + self.disk_hits
+        return hits / self.lookups if self.lookups else 0.0
+
+
+def compute_verdict(n: int, k: Optional[int] = None) -> Verdict:
+    """Uncached verdict: prefilter if exact, else baillie_psw or miller_rabin(n, k)"""
+    quick = prefilter(n)
+    if quick is not None:
+        return Verdict(quick, EXACT)
+    if k is None:
+        return Verdict(baillie_psw(n), BPSW)
+    return Verdict(miller_rabin(n, k), MILLER_RABIN, k)
+
+
+class PrimeCache:
+    """Memoized primality verdicts: an in-memory LRU in front of an optional sqlite file.
+
+    Numbers are stored as hex text with the verdict, method and round
+    count. A cached prime found with fewer Miller-Rabin rounds than a
+    request asks for is retested and the stronger verdict replaces it.
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Capacity must be positive")
+        self.capacity = capacity
+        self.memory: "OrderedDict[int, Verdict]" = OrderedDict()
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        self.pending: List[tuple] = []
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS verdicts ("
+                            "n TEXT PRIMARY KEY, prime INTEGER NOT NULL, "
+                            "method TEXT NOT NULL, rounds INTEGER NOT NULL)")
+            self.db.commit()
+
+    def _remember(self, n: int, verdict: Verdict) -> None:
+        self.memory[n] = verdict
+        self.memory.move_to_end(n)
+        if len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def get(self, n: int) -> Optional[Verdict]:
+        """Cached verdict for n, from memory or disk, without testing"""
+        with self.lock:
+            return self._lookup(n)[0]
+
+    def _lookup(self, n: int):
+        verdict = self.memory.get(n)
+        if verdict is not None:
+            self.memory.move_to_end(n)
+            return verdict, "memory"
+        if self.db is not None:
+            row = self.db.execute("SELECT prime, method, rounds FROM verdicts WHERE n = ?",
+                                  (format(n, "x"),)).fetchone()
+            if row is not None:
+                verdict = Verdict(bool(row[0]), row[1], row[2])
+                self._remember(n, verdict)
+                return verdict, "disk"
+        return None, None
+
+    def put(self, n: int, verdict: Verdict) -> None:
+        with self.lock:
+            self._store(n, verdict)
+
+    def _store(self, n: int, verdict: Verdict) -> None:
+        self._remember(n, verdict)
+        if self.db is not None:
+            self.pending.append((format(n, "x"), int(verdict.is_prime), verdict.method, verdict.rounds))
+            if len(self.pending) >= COMMIT_EVERY:
+                self._flush()
+
+    def _flush(self) -> None:
+        if self.db is not None and self.pending:
+            self.db.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)", self.pending)
+            self.db.commit()
+            self.pending.clear()
+
+    def flush(self) -> None:
+        """Write buffered verdicts to disk"""
+        with self.lock:
+            self._flush()
+
+    def _cached(self, n: int, k: Optional[int]) -> Optional[Verdict]:
+        """Cached verdict strong enough for the request; updates the statistics"""
+        verdict, source = self._lookup(n)
+        if verdict is None:
+            self.stats.misses += 1
+            return None
+        if not verdict.satisfies(k):
+            self.stats.upgrades += 1
+            return None
+        if source == "memory":
+            self.stats.memory_hits += 1
+        else:
+            self.stats.disk_hits += 1
+        return verdict
+
+    def verdict(self, n: int, k: Optional[int] = None) -> Verdict:
+        """Full cached verdict for n; k as in miller_rabin, None for baillie_psw"""
+        with self.lock:
+            verdict = self._cached(n, k)
+        if verdict is None:
+            verdict = compute_verdict(n, k)
+            self.put(n, verdict)
+        return verdict
+
+    def is_prime(self, n: int, k: Optional[int] = None) -> bool:
+        return self.verdict(n, k).is_prime
+
+    def is_prime_many(self, numbers: Iterable[int], k: Optional[int] = None,
+                      workers: Optional[int] = None) -> List[bool]:
+        """Cached verdicts for many numbers; misses are tested together in a process pool"""
+        numbers = list(numbers)
+        verdicts: List[Optional[bool]] = []
+        missing: List[int] = []
+        with self.lock:
+            for n in numbers:
+                verdict = self._cached(n, k)
+                verdicts.append(None if verdict is None else verdict.is_prime)
+                if verdict is None:
+                    missing.append(n)
+        if missing:
+            unique = list(dict.fromkeys(missing))
+            results = dict(zip(unique, _batch_is_prime_many(unique, k=k, workers=workers)))
+            with self.lock:
+                for n, is_prime in results.items():
+                    quick = prefilter(n)
+                    if quick is not None:
+                        verdict = Verdict(quick, EXACT)
+                    elif k is None:
+                        verdict = Verdict(is_prime, BPSW)
+                    else:
+                        verdict = Verdict(is_prime, MILLER_RABIN, k)
+                    self._store(n, verdict)
+            verdicts = [results[n] if v is None else v for n, v in zip(numbers, verdicts)]
+        return verdicts
+
+    def warm(self, path: str, k: Optional[int] = None, workers: Optional[int] = None) -> int:
+        """Precompute verdicts for the numbers in a text file.
+
+        One number per line, decimal or 0x-prefixed hex; blank lines and
+        lines starting with '#' are skipped. Returns the count of numbers read.
+        """
+        numbers = []
+        with open(path) as file:
+            for line in file:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    numbers.append(int(line, 0))
+        self.is_prime_many(numbers, k=k, workers=workers)
+        self.flush()
+        return len(numbers)
+
+    def __len__(self) -> int:
+        """Verdicts stored on disk (or in memory without a file)"""
+        with self.lock:
+            if self.db is None:
+                return len(self.memory)
+            self._flush()
+            return self.db.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
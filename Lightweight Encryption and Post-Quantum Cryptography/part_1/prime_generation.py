@@ -0,0 +1,134 @@
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from miller_rabin import miller_rabin, simple_sieve
+
+SMALL_PRIME_LIMIT = 2000
+DEFAULT_WINDOW = 4096   # odd candidates per sieve window
+DEFAULT_ROUNDS = 40     # Miller-Rabin rounds for survivors
+
+SMALL_PRIMES = simple_sieve(SMALL_PRIME_LIMIT)[1:]    # odd primes only
+
+
+@dataclass
+class PrimeSearchStats:
+    candidates: int = 0      # odd numbers looked at (sieved or tested)
+    mr_tests: int = 0        # survivors handed to Miller-Rabin
+    windows: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def candidates_per_second(self) -> float:
+        return self.candidates / self.elapsed if self.elapsed else 0.0
+
+    def merge(self, other: "PrimeSearchStats") -> None:
+        self.candidates += other.candidates
+        self.mr_tests += other.mr_tests
+        self.windows += other.windows
+
+
+def _random_start(bits: int, window: int) -> int:
+    """Random odd number with the top bit set and room for one full window"""
+    low = 1 << (bits - 1)
+    span = low - 2 * window
+    return (low + secrets.randbelow(span)) | 1
+
+
+def sieve_window(residues: List[int], primes: List[int], window: int) -> bytearray:
+    """Mark which of base, base + 2, ... base + 2 * (window - 1) have no small factor.
+
+    residues[i] is base % primes[i]; index j is divisible by p when
+    j = -base / 2 (mod p), so each prime strikes a single arithmetic slice.
+    """
+    sieve = bytearray([1]) * window
+    for p, r in zip(primes, residues):
+        start = ((p - r) * ((p + 1) >> 1)) % p
+        if start < window:
+            sieve[start::p] = bytes(len(range(start, window, p)))
+    return sieve
+
+
+def _search(bits: int, k: int, window: int, max_windows: Optional[int]) -> Tuple[Optional[int], PrimeSearchStats]:
+    """Scan consecutive windows from a random start until a probable prime is found"""
+    primes = [p for p in SMALL_PRIMES if p < 1 << (bits - 1)]
+    stats = PrimeSearchStats()
+    limit = 1 << bits
+    step = 2 * window
+
+    base = _random_start(bits, window)
+    residues = [base % p for p in primes]
+    while max_windows is None or stats.windows < max_windows:
+        if base + step > limit:
+            base = _random_start(bits, window)
+            residues = [base % p for p in primes]
+
+        stats.windows += 1
+        sieve = sieve_window(residues, primes, window)
+        j = sieve.find(1)
+        while j != -1:
+            stats.mr_tests += 1
+            candidate = base + 2 * j
+            if miller_rabin(candidate, k):
+                stats.candidates += j + 1
+                return candidate, stats
+            j = sieve.find(1, j + 1)
+        stats.candidates += window
+
+        # Move to the next window; only the small residues need updating
+        base += step
+        residues = [(r + step) % p for r, p in zip(residues, primes)]
+    return None, stats
+
+
+def generate_prime(bits: int, k: int = DEFAULT_ROUNDS, window: int = DEFAULT_WINDOW,
+                   workers: Optional[int] = None, windows_per_task: int = 8,
+                   return_stats: bool = False):
+    """Generate a random probable prime of exactly `bits` bits.
+
+    Candidates are sieved in windows against SMALL_PRIMES and only the
+    survivors are passed to miller_rabin(n, k). With workers > 1 several
+    independent windows are searched in a process pool and the first prime
+    found wins. With return_stats=True a (prime, PrimeSearchStats) pair is
+    returned instead of the prime alone.
+    """
+    if bits < 16:
+        raise ValueError("bits must be at least 16")
+    if window < 1:
+        raise ValueError("window must be positive")
+    window = min(window, 1 << (bits - 4))
+
+    start = time.perf_counter()
+    if not workers or workers <= 1:
+        prime, stats = _search(bits, k, window, None)
+    else:
+        stats = PrimeSearchStats()
+        prime = None
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {pool.submit(_search, bits, k, window, windows_per_task)
+                       for _ in range(workers)}
+            while prime is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    found, task_stats = future.result()
+                    stats.merge(task_stats)
+                    if found is not None and prime is None:
+                        prime = found
+                    elif prime is None:
+                        pending.add(pool.submit(_search, bits, k, window, windows_per_task))
+            for future in pending:
+                future.cancel()
+    stats.elapsed = time.perf_counter() - start
+
+    if return_stats:
+        return prime, stats
+    return prime
+
+
+if __name__ == "__main__":
+    for size in (512, 1024, 2048):
+        p, s = generate_prime(size, return_stats=True)
+        print(f"{size}-bit prime found: {s.candidates} candidates, {s.mr_tests} MR tests, "
+              f"{s.elapsed:.2f}s ({s.candidates_per_second:.0f} candidates/s)")
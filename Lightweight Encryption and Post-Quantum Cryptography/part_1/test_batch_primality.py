@@ -0,0 +1,64 @@
+import random
+from batch_primality import is_prime_many, primes_in_range, prefilter, BatchStats
+from miller_rabin import simple_sieve, baillie_psw
+
+LIMIT = 100000
+PRIMES = simple_sieve(LIMIT)
+PRIME_SET = set(PRIMES)
+
+def test_prefilter():
+    assert prefilter(1) is False
+    assert prefilter(2) is True
+    assert prefilter(997) is True
+    assert prefilter(1003) is False     # 17 * 59
+    assert prefilter(1009) is True
+    assert prefilter(2 ** 61 - 1) is None
+    print("Prefilter test passed!")
+
+def test_primes_in_range():
+    for workers in (1, 2):
+        assert primes_in_range(0, LIMIT + 1, workers=workers) == PRIMES
+        for lo, hi in [(0, 0), (0, 3), (2, 3), (3, 4), (999, 1010), (1010, 1013), (5000, 9000)]:
+            expected = [p for p in PRIMES if lo <= p < hi]
+            error_msg = "Failed for range [{}, {})".format(lo, hi)
+            assert primes_in_range(lo, hi, workers=workers) == expected, error_msg
+    print("Range test passed!")
+
+def test_is_prime_many_matches_sieve():
+    rng = random.Random(7)
+    numbers = [rng.randrange(0, LIMIT) for _ in range(3000)]
+    expected = [n in PRIME_SET for n in numbers]
+    for workers in (1, 2):
+        assert is_prime_many(numbers, workers=workers) == expected
+        assert is_prime_many(numbers, workers=workers, k=10) == expected
+        streamed = is_prime_many(numbers, workers=workers, chunk_size=20, stream=True, ordered=False)
+        assert sorted(streamed) == sorted(zip(numbers, expected))
+    print("Batch verdict test passed!")
+
+def test_large_numbers_and_stats():
+    rng = random.Random(11)
+    numbers = [rng.getrandbits(128) for _ in range(2000)]
+    stats = BatchStats()
+    verdicts = is_prime_many(numbers, workers=2, stats=stats)
+    assert verdicts == [baillie_psw(n) for n in numbers]
+    assert stats.total == len(numbers)
+    assert stats.prefiltered + stats.dispatched == stats.total
+    assert stats.throughput > 0
+    assert all(0 <= share <= 1 for share in stats.utilization().values())
+    print(f"Throughput: {stats.throughput:.0f} numbers/s, chunk size {stats.chunk_size}")
+
+def test_streaming_range():
+    lo = 10 ** 12
+    primes = primes_in_range(lo, lo + 2000, workers=1, stream=True)
+    first = next(primes)
+    assert first >= lo and baillie_psw(first)
+    print("Streaming range test passed!")
+
+if __name__ == "__main__":
+    print("Running batch primality tests...\n")
+    test_prefilter()
+    test_primes_in_range()
+    test_is_prime_many_matches_sieve()
+    test_large_numbers_and_stats()
+    test_streaming_range()
+    print("\nAll tests passed!")
@@ -0,0 +1,115 @@
+import bisect
+import random
+from math import isqrt
+import miller_rabin as prime_module
+from miller_rabin import (miller_rabin, modularExponentiation, simple_sieve, segmented_sieve,
+                          baillie_psw, strong_lucas_test, jacobi, prime_count)
+
+LIMIT = 20000
+
+def test_modular_exponentiation():
+    assert modularExponentiation(2, 3, 5) == 3
+    assert modularExponentiation(3, 4, 7) == 4
+    assert modularExponentiation(123456789, 123456789, 100000007) == 15470403
+    print("Modular exponentiation test passed!")
+
+def test_sieve_matches_miller_rabin():
+    expected = [n for n in range(LIMIT + 1) if miller_rabin(n, 10)]
+    assert simple_sieve(LIMIT) == expected
+
+    for wheel in (False, True):
+        for segment_size in (1, 7, 105, 1000, 1 << 18):
+            primes = list(segmented_sieve(LIMIT, segment_size=segment_size, wheel=wheel))
+            error_msg = "Failed for segment size {} (wheel={})".format(segment_size, wheel)
+            assert primes == expected, error_msg
+    print("Segmented sieve cross-check passed!")
+
+def test_sieve_ranges():
+    expected = [n for n in range(LIMIT + 1) if miller_rabin(n, 10)]
+    for start in (0, 1, 2, 3, 4, 5, 7, 8, 11, 100, 1001):
+        for wheel in (False, True):
+            primes = list(segmented_sieve(LIMIT, start=start, segment_size=64, wheel=wheel))
+            assert primes == [p for p in expected if p >= start], "Failed for start {}".format(start)
+
+    for limit in range(0, 60):
+        small = [p for p in expected if p <= limit]
+        assert list(segmented_sieve(limit)) == small
+        assert list(segmented_sieve(limit, wheel=True)) == small
+    print("Sieve range test passed!")
+
+def test_sieve_is_lazy():
+    primes = segmented_sieve(10 ** 10, segment_size=1 << 12)
+    first = [next(primes) for _ in range(10)]
+    assert first == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    print("Lazy sieve test passed!")
+
+def test_baillie_psw_matches_sieve():
+    expected = simple_sieve(LIMIT)
+    assert [n for n in range(-5, LIMIT + 1) if baillie_psw(n)] == expected
+    print("BPSW validation against sieve passed!")
+
+def test_baillie_psw_pseudoprimes():
+    # Strong pseudoprimes to base 2 (several to many bases) and strong Lucas pseudoprimes
+    pseudoprimes = [2047, 3277, 4033, 4681, 8321, 3215031751, 2152302898747,
+                    3474749660383, 341550071728321, 3825123056546413051,
+                    5459, 5777, 10877, 16109, 18971]
+    for n in pseudoprimes:
+        assert not baillie_psw(n), "Pseudoprime {} passed".format(n)
+    for n in (5459, 5777, 10877, 16109, 18971):
+        assert strong_lucas_test(n), "{} is a strong Lucas pseudoprime".format(n)
+
+    assert baillie_psw(2 ** 127 - 1)
+    assert baillie_psw(2 ** 521 - 1)
+    assert not baillie_psw(2 ** 521 + 1)
+    assert not baillie_psw(1009 ** 2)
+    print("BPSW pseudoprime test passed!")
+
+def test_jacobi():
+    assert jacobi(1001, 9907) == -1
+    assert jacobi(19, 45) == 1
+    assert jacobi(8, 21) == -1
+    assert jacobi(5, 21) == 1
+    assert jacobi(3, 9) == 0
+
+def count_both_ways(x):
+    """prime_count through the list and (if NumPy is installed) the vectorized path"""
+    if x < 2:
+        return [prime_count(x)]
+    r = isqrt(x)
+    primes = simple_sieve(r)
+    counts = [prime_count(x), prime_module._prime_count_lists(x, r, primes)]
+    if prime_module.np is not None:
+        counts.append(prime_module._prime_count_numpy(x, r, primes))
+    return counts
+
+def test_prime_count_matches_sieve():
+    limit = 2 * 10 ** 6
+    primes = list(segmented_sieve(limit))
+    rng = random.Random(4)
+    points = list(range(-2, 200)) + [p * p + d for p in simple_sieve(1400)[::10] for d in (-1, 0, 1)]
+    points += [rng.randrange(limit) for _ in range(40)] + [limit]
+    for x in points:
+        expected = bisect.bisect_right(primes, x)
+        assert set(count_both_ways(x)) == {expected}, "Failed for {}".format(x)
+    print("prime_count sieve cross-check passed!")
+
+def test_prime_count_known_values():
+    known = {10 ** 7: 664579, 10 ** 8: 5761455, 9973 ** 2: 5732087, 2 ** 27: 7603553}
+    for x, count in known.items():
+        assert set(count_both_ways(x)) == {count}, "Failed for {}".format(x)
+    if prime_module.np is not None:
+        assert prime_count(10 ** 10) == 455052511
+    print("prime_count known values passed!")
+
+if __name__ == "__main__":
+    print("Running prime module tests...\n")
+    test_modular_exponentiation()
+    test_sieve_matches_miller_rabin()
+    test_sieve_ranges()
+    test_sieve_is_lazy()
+    test_baillie_psw_matches_sieve()
+    test_baillie_psw_pseudoprimes()
+    test_jacobi()
+    test_prime_count_matches_sieve()
+    test_prime_count_known_values()
+    print("\nAll tests passed!")
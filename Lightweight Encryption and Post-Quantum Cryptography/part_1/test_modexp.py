@@ -0,0 +1,48 @@
+import random
+from modexp import ModExpEngine, pow_each, get_engine
+
+def test_engine_matches_pow():
+    rng = random.Random(1234)
+    moduli = [1, 2, 3, 10, 97, 2 ** 61 - 1, rng.getrandbits(300), rng.getrandbits(1024) | 1]
+    for window in (1, 3, 4, 8):
+        for n in moduli:
+            engine = ModExpEngine(n, window)
+            for base in (0, 1, 2, rng.getrandbits(400)):
+                engine.precompute(base, 16)
+                for exponent in (0, 1, 2, 255, rng.getrandbits(900)):
+                    error_msg = "Failed for window {} modulus {}".format(window, n)
+                    assert engine.pow(base, exponent) == pow(base, exponent, n), error_msg
+    print("Engine correctness test passed!")
+
+def test_pow_many_and_batch():
+    rng = random.Random(99)
+    n = rng.getrandbits(512) | 1
+    engine = ModExpEngine(n)
+    exponents = [rng.getrandbits(512) for _ in range(20)]
+    assert engine.pow_many(7, exponents) == [pow(7, e, n) for e in exponents]
+    assert engine.has_table(7)
+
+    bases = [rng.getrandbits(600) for _ in range(10)] + [5, 5, 7]
+    assert pow_each(bases, 65537, n) == [pow(b, 65537, n) for b in bases]
+    assert get_engine(n) is get_engine(n)
+    print("Batch API test passed!")
+
+def test_error_cases():
+    try:
+        ModExpEngine(0)
+        assert False, "Should fail with zero modulus"
+    except ValueError:
+        pass
+
+    try:
+        ModExpEngine(97).pow(3, -1)
+        assert False, "Should fail with negative exponent"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    print("Running modexp engine tests...\n")
+    test_engine_matches_pow()
+    test_pow_many_and_batch()
+    test_error_cases()
+    print("\nAll tests passed!")
@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+from prime_cache import PrimeCache, Verdict, compute_verdict, EXACT, BPSW, MILLER_RABIN
+from miller_rabin import baillie_psw
+
+MERSENNE_61 = 2 ** 61 - 1
+CARMICHAEL = 3215031751      # strong pseudoprime to bases 2, 3, 5 and 7
+
+def test_verdicts_and_confidence():
+    assert compute_verdict(97) == Verdict(True, EXACT)
+    assert compute_verdict(MERSENNE_61) == Verdict(True, BPSW)
+    verdict = compute_verdict(MERSENNE_61, k=10)
+    assert verdict.method == MILLER_RABIN and verdict.rounds == 10
+    assert verdict.confidence == 1.0 - 4.0 ** -10
+    assert compute_verdict(CARMICHAEL).confidence == 1.0
+    assert verdict.satisfies(5) and not verdict.satisfies(20) and not verdict.satisfies(None)
+    print("Verdict test passed!")
+
+def test_memory_cache_and_lru():
+    cache = PrimeCache(capacity=2)
+    assert cache.is_prime(MERSENNE_61)
+    assert cache.is_prime(MERSENNE_61)
+    assert cache.stats.misses == 1 and cache.stats.memory_hits == 1
+    cache.is_prime(CARMICHAEL)
+    cache.is_prime(10 ** 12 + 39)
+    assert MERSENNE_61 not in cache.memory and len(cache.memory) == 2
+
+    # A weaker verdict is upgraded, a stronger one is reused
+    cache.is_prime(MERSENNE_61, k=5)
+    cache.is_prime(MERSENNE_61, k=20)
+    assert cache.stats.upgrades == 1 and cache.get(MERSENNE_61).rounds == 20
+    cache.is_prime(MERSENNE_61, k=10)
+    assert cache.stats.memory_hits == 2
+    print("Memory cache test passed!")
+
+def test_persistence_and_warming():
+    rng = random.Random(5)
+    numbers = [rng.getrandbits(96) | 1 for _ in range(300)] + [MERSENNE_61, CARMICHAEL]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "verdicts.sqlite")
+        listing = os.path.join(tmp, "params.txt")
+        with open(listing, "w") as f:
+            f.write("# parameter file\n\n")
+            f.write("\n".join(hex(n) if i % 2 else str(n) for i, n in enumerate(numbers)))
+
+        with PrimeCache(db) as cache:
+            assert cache.warm(listing, workers=1) == len(numbers)
+            assert len(cache) == len(numbers)
+
+        with PrimeCache(db, capacity=16) as cache:
+            verdicts = cache.is_prime_many(numbers, workers=1)
+            assert verdicts == [baillie_psw(n) for n in numbers]
+            assert cache.stats.disk_hits == len(numbers) and cache.stats.hit_rate == 1.0
+            assert cache.get(CARMICHAEL) == Verdict(False, EXACT)     # 151 * 751 * 28351
+    print("Persistence test passed!")
+
+def test_hit_rate_on_repeated_validation():
+    rng = random.Random(9)
+    pool = [rng.getrandbits(128) | 1 for _ in range(50)]
+    cache = PrimeCache()
+    for _ in range(4):
+        cache.is_prime_many(rng.sample(pool, 25), workers=1)
+    assert cache.stats.misses <= 50
+    assert 0.4 < cache.stats.hit_rate < 1.0
+    print(f"Hit rate over repeated validation: {cache.stats.hit_rate:.0%}")
+
+if __name__ == "__main__":
+    print("Running prime cache tests...\n")
+    test_verdicts_and_confidence()
+    test_memory_cache_and_lru()
+    test_persistence_and_warming()
+    test_hit_rate_on_repeated_validation()
+    print("\nAll tests passed!")
@@ -0,0 +1,62 @@
+from prime_generation import generate_prime, sieve_window, SMALL_PRIMES
+from miller_rabin import miller_rabin
+
+def is_prime_trial(n):
+    if n < 2:
+        return False
+    f = 2
+    while f * f <= n:
+        if n % f == 0:
+            return False
+        f += 1
+    return True
+
+def test_sieve_window_matches_trial_division():
+    base = 1000001
+    window = 500
+    residues = [base % p for p in SMALL_PRIMES]
+    sieve = sieve_window(residues, SMALL_PRIMES, window)
+    for j in range(window):
+        n = base + 2 * j
+        has_small_factor = any(n % p == 0 for p in SMALL_PRIMES)
+        assert sieve[j] == (not has_small_factor), f"Sieve mismatch at {n}"
+    print("Sieve window test passed!")
+
+def test_small_primes_are_exact():
+    for bits in (16, 20, 24):
+        for _ in range(20):
+            p = generate_prime(bits)
+            assert p.bit_length() == bits, f"Wrong size for {bits} bits"
+            assert is_prime_trial(p), f"{p} is not prime"
+    print("Small prime generation test passed!")
+
+def test_large_prime_and_stats():
+    p, stats = generate_prime(512, return_stats=True)
+    assert p.bit_length() == 512
+    assert miller_rabin(p, 20)
+    assert stats.mr_tests >= 1
+    assert stats.candidates >= stats.mr_tests
+    print(f"512-bit prime: {stats.candidates} candidates, "
+          f"{stats.candidates_per_second:.0f} candidates/s")
+
+def test_process_pool():
+    p = generate_prime(256, workers=2)
+    assert p.bit_length() == 256
+    assert miller_rabin(p, 20)
+    print("Process pool generation test passed!")
+
+def test_error_cases():
+    try:
+        generate_prime(8)
+        assert False, "Should fail with too few bits"
+    except ValueError:
+        pass
+
+if __name__ == "__main__":
+    print("Running prime generation tests...\n")
+    test_sieve_window_matches_trial_division()
+    test_small_primes_are_exact()
+    test_large_prime_and_stats()
+    test_process_pool()
+    test_error_cases()
+    print("\nAll tests passed!")
@@ -0,0 +1,54 @@
+import random
+import pytest
+from miller_rabin import miller_rabin, simple_sieve, baillie_psw
+
+np = pytest.importorskip("numpy")
+from vector_primality import miller_rabin_vector, benchmark_vector, _mul_wide
+
+def test_mul_wide():
+    rng = random.Random(1)
+    a = [rng.getrandbits(64) for _ in range(1000)] + [2 ** 64 - 1, 0, 1]
+    b = [rng.getrandbits(64) for _ in range(1000)] + [2 ** 64 - 1, 2 ** 64 - 1, 2 ** 64 - 1]
+    high, low = _mul_wide(np.array(a, dtype=np.uint64), np.array(b, dtype=np.uint64))
+    for x, y, h, l in zip(a, b, high, low):
+        assert (int(h) << 64) | int(l) == x * y
+    print("128-bit product test passed!")
+
+def test_matches_sieve():
+    limit = 200000
+    mask = miller_rabin_vector(np.arange(limit, dtype=np.uint64))
+    assert list(np.flatnonzero(mask)) == simple_sieve(limit - 1)
+    print("Sieve cross-check passed!")
+
+def test_matches_scalar_tests():
+    rng = random.Random(3)
+    numbers = [rng.getrandbits(64) | 1 for _ in range(3000)]
+    numbers += [rng.getrandbits(33) | 1 for _ in range(1000)]
+    numbers += [2 ** 64 - 59, 2 ** 64 - 1, 2 ** 63 + 1, 2 ** 61 - 1,
+                3215031751, 3825123056546413051]
+    mask = miller_rabin_vector(np.array(numbers, dtype=np.uint64))
+    for n, verdict in zip(numbers, mask):
+        assert verdict == baillie_psw(n), "Failed for {}".format(n)
+        if verdict:
+            assert miller_rabin(n, 5)
+    assert not mask[numbers.index(3825123056546413051)]    # strong pseudoprime to bases 2..23
+    print("Scalar cross-check passed!")
+
+def test_shapes_and_empty():
+    assert miller_rabin_vector([]).shape == (0,)
+    assert list(miller_rabin_vector([0, 1, 2, 3, 4, 97, 2 ** 64 - 59])) == \
+        [False, False, True, True, False, True, True]
+
+def test_throughput():
+    r = benchmark_vector(count=4000)
+    assert r["vector"] > 0 and r["scalar"] > 0
+    print(f"Vectorized: {r['vector']:.0f} candidates/s, scalar: {r['scalar']:.0f} candidates/s")
+
+if __name__ == "__main__":
+    print("Running vectorized Miller-Rabin tests...\n")
+    test_mul_wide()
+    test_matches_sieve()
+    test_matches_scalar_tests()
+    test_shapes_and_empty()
+    test_throughput()
+    print("\nAll tests passed!")
@@ -0,0 +1,153 @@
+import time
+
+try:
+    import numpy as np
+except ImportError:      # optional dependency, only needed for the vectorized test
+    np = None
+
+from miller_rabin import miller_rabin, simple_sieve, strong_probable_prime
+
+# Deterministic Miller-Rabin bases for every n < 2**64 (Sinclair, 2011)
+DETERMINISTIC_BASES = (2, 325, 9375, 28178, 450775, 9780504, 1795265022)
+SMALL_PRIMES = simple_sieve(256)      # trial-divided before any exponentiation
+CHUNK = 1 << 16          # lanes processed together; bounds temporary arrays
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("miller_rabin_vector requires NumPy (pip install numpy)")
+
+
+def _mul_wide(a, b):
+    """Full 128-bit products of two uint64 arrays as (high, low) words, using 32-bit limbs"""
+    mask = np.uint64(0xFFFFFFFF)
+    shift = np.uint64(32)
+    a0, a1 = a & mask, a >> shift
+    b0, b1 = b & mask, b >> shift
+    p00, p01, p10, p11 = a0 * b0, a0 * b1, a1 * b0, a1 * b1
+    middle = (p00 >> shift) + (p01 & mask) + (p10 & mask)
+    high = p11 + (p01 >> shift) + (p10 >> shift) + (middle >> shift)
+    return high, a * b        # the low word is the wrapping product
+
+
+def _neg_inverse(n):
+    """-n^-1 mod 2**64 for odd n (Newton iteration, 3 -> 96 correct bits)"""
+    x = n.copy()
+    two = np.uint64(2)
+    for _ in range(5):
+        x *= two - n * x
+    return np.uint64(0) - x
+
+
+def _redc(high, low, n, n_neg_inv):
+    """Montgomery reduction of high:low (< n * 2**64) to a value below n"""
+    m = low * n_neg_inv
+    m_high, _ = _mul_wide(m, n)
+    # low + (m * n) mod 2**64 is 0 or exactly 2**64, so the carry is low != 0
+    t = high + m_high
+    overflow = t < high
+    t2 = t + (low != 0).astype(np.uint64)
+    overflow |= t2 < t
+    return np.where(overflow | (t2 >= n), t2 - n, t2)
+
+
+def _mont_mul(a, b, n, n_neg_inv):
+    high, low = _mul_wide(a, b)
+    return _redc(high, low, n, n_neg_inv)
+
+
+def _strong_rounds(n):
+    """Deterministic Miller-Rabin for odd uint64 lanes above SMALL_PRIMES; returns a prime mask"""
+    n_neg_inv = _neg_inverse(n)
+    one = np.uint64(0) - n
+    one %= n                                   # R mod n with R = 2**64
+    r_squared = one.copy()
+    for _ in range(64):                        # R * 2**64 mod n by repeated doubling
+        doubled = r_squared + r_squared
+        r_squared = np.where((doubled < r_squared) | (doubled >= n), doubled - n, doubled)
+    minus_one = n - one
+
+    n_minus_1 = n - np.uint64(1)
+    low_bit = n_minus_1 & (np.uint64(0) - n_minus_1)
+    r = np.log2(low_bit.astype(np.float64)).astype(np.uint64)   # exact for powers of two
+    d = n_minus_1 >> r
+
+    prime = np.ones(len(n), dtype=bool)
+    alive = np.arange(len(n))
+    for a in DETERMINISTIC_BASES:
+        # Lanes already proven composite drop out before the next base
+        ln, ld, lr = n[alive], d[alive], r[alive]
+        inv, l_one, l_minus_one = n_neg_inv[alive], one[alive], minus_one[alive]
+        top_bit = int(ld.max()).bit_length()
+        base = np.uint64(a) % ln
+        base_m = _mont_mul(base, r_squared[alive], ln, inv)
+        x = l_one.copy()
+        for bit in range(top_bit - 1, -1, -1):
+            x = _mont_mul(x, x, ln, inv)
+            use = ((ld >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+            x = np.where(use, _mont_mul(x, base_m, ln, inv), x)
+        passed = (base == 0) | (x == l_one) | (x == l_minus_one)
+        for i in range(1, int(lr.max())):
+            x = _mont_mul(x, x, ln, inv)
+            passed |= (x == l_minus_one) & (lr > np.uint64(i))
+        prime[alive[~passed]] = False
+        alive = alive[passed]
+        if not len(alive):
+            break
+    return prime
+
+
+def miller_rabin_vector(candidates):
+    """Deterministic primality mask for an array of 64-bit unsigned integers.
+
+    All lanes run the same seven Miller-Rabin bases together with
+    Montgomery arithmetic on 32-bit limbs, so the answer is exact for the
+    whole uint64 range. Returns a NumPy bool array of the same length.
+    """
+    _require_numpy()
+    values = np.asarray(candidates, dtype=np.uint64).ravel()
+    result = np.zeros(len(values), dtype=bool)
+    for start in range(0, len(values), CHUNK):
+        n = values[start:start + CHUNK]
+        verdict = np.zeros(len(n), dtype=bool)
+        pending = n > np.uint64(SMALL_PRIMES[-1])
+        for p in SMALL_PRIMES:
+            verdict |= n == np.uint64(p)
+            pending &= n % np.uint64(p) != 0
+        index = np.flatnonzero(pending)
+        if len(index):
+            verdict[index] = _strong_rounds(n[index])
+        result[start:start + CHUNK] = verdict
+    return result
+
+
+def benchmark_vector(count=20000, bits=64, seed=1):
+    """Candidates per second: vectorized mask versus scalar deterministic rounds"""
+    _require_numpy()
+    rng = np.random.default_rng(seed)
+    high = np.uint64(1) << np.uint64(bits - 1)
+    candidates = rng.integers(0, 1 << (bits - 1), size=count, dtype=np.uint64) | high | np.uint64(1)
+
+    start = time.perf_counter()
+    mask = miller_rabin_vector(candidates)
+    vector_time = time.perf_counter() - start
+
+    sample = [int(n) for n in candidates[:max(1, count // 10)]]
+    start = time.perf_counter()
+    scalar = [all(strong_probable_prime(n, a) for a in DETERMINISTIC_BASES if a % n) for n in sample]
+    scalar_time = (time.perf_counter() - start) * count / len(sample)
+    assert scalar == list(mask[:len(sample)])
+
+    start = time.perf_counter()
+    for n in sample:
+        miller_rabin(n, len(DETERMINISTIC_BASES))
+    loop_time = (time.perf_counter() - start) * count / len(sample)
+
+    return {"count": count, "primes": int(mask.sum()), "vector": count / vector_time,
+            "scalar": count / scalar_time, "miller_rabin": count / loop_time}
+
+if __name__ == "__main__":
+    for bits in (32, 48, 64):
+        r = benchmark_vector(bits=bits)
+        print(f"{bits} bits | vectorized {r['vector']:9.0f} | deterministic scalar {r['scalar']:9.0f} | "
+              f"miller_rabin(n, 7) loop {r['miller_rabin']:9.0f} candidates/s")
@@ -0,0 +1,468 @@
+# aead_service.py
+import itertools
+import os
+import queue
+import socket
+import stat
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from crypto_base import AuthenticatedData, AuthenticationError
+from elephant import Elephant
+from isap import ISAP
+
+# Wire format: every frame is a 4-byte big-endian length followed by the body.
+# Request body:  header, then key | nonce | tag | associated data | data
+# Response body: header, then tag | data (an error message when status != OK)
+FRAME = struct.Struct(">I")
+REQUEST_HEADER = struct.Struct(">IBBBBBI")   # id, op, algorithm, key/nonce/tag lengths, AD length
+RESPONSE_HEADER = struct.Struct(">IBB")      # id, status, tag length
+MAX_FRAME = 64 * 1024 * 1024
+
+OP_ENCRYPT, OP_DECRYPT = 1, 2
+ALGORITHMS = {1: 'ISAP', 2: 'Elephant'}
+ALGORITHM_IDS = {name: number for number, name in ALGORITHMS.items()}
+STATUS_OK, STATUS_AUTH_FAILED, STATUS_BAD_REQUEST, STATUS_SERVER_ERROR = 0, 1, 2, 3
+
+
+def encode_request(request_id: int, op: int, algorithm: str, key: bytes, nonce: bytes,
+                   data: bytes, tag: bytes = b"", associated_data: Optional[bytes] = None) -> bytes:
+    if algorithm not in ALGORITHM_IDS:
+        raise ValueError("Unsupported algorithm specified.")
+    associated_data = associated_data or b""
+    header = REQUEST_HEADER.pack(request_id, op, ALGORITHM_IDS[algorithm], len(key), len(nonce),
+                                 len(tag), len(associated_data))
+    return b"".join((header, key, nonce, tag, associated_data, data))
+
+
+def encode_response(request_id: int, status: int, tag: bytes = b"", data: bytes = b"") -> bytes:
+    return RESPONSE_HEADER.pack(request_id, status, len(tag)) + tag + data
+
+
+def request_id_of(body: bytes) -> int:
+    """The id of an encoded request, or 0 if it is too short to carry one"""
+    return struct.unpack_from(">I", body)[0] if len(body) >= 4 else 0
+
+
+def decode_response(body: bytes) -> Tuple[int, int, bytes, bytes]:
+    request_id, status, tag_len = RESPONSE_HEADER.unpack_from(body)
+    start = RESPONSE_HEADER.size
+    return request_id, status, body[start:start + tag_len], body[start + tag_len:]
+
+
+def recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Read exactly size bytes, or None if the peer closed first"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            return None
+        received += count
+    return bytes(buffer)
+
+
+def read_frame(sock: socket.socket) -> Optional[bytes]:
+    prefix = recv_exact(sock, FRAME.size)
+    if prefix is None:
+        return None
+    length = FRAME.unpack(prefix)[0]
+    if length > MAX_FRAME:
+        raise ValueError("Frame too large")
+    return recv_exact(sock, length)
+
+
+def write_frame(sock: socket.socket, body: bytes) -> None:
+    sock.sendall(FRAME.pack(len(body)) + body)
+
+
+# Warm cipher contexts, one per algorithm in each worker
+_contexts = {}
+
+def _cipher(algorithm: str):
+    cipher = _contexts.get(algorithm)
+    if cipher is None:
+        cipher = _contexts[algorithm] = ISAP() if algorithm == 'ISAP' else Elephant()
+    return cipher
+
+
+def process_request(body: bytes) -> bytes:
+    """Run one encoded request and return the encoded response"""
+    try:
+        request_id, op, algorithm_id, key_len, nonce_len, tag_len, ad_len = REQUEST_HEADER.unpack_from(body)
+    except struct.error:
+        return encode_response(0, STATUS_BAD_REQUEST, data=b"Malformed header")
+    try:
+        algorithm = ALGORITHMS[algorithm_id]
+        offset = REQUEST_HEADER.size
+        fields = []
+        for size in (key_len, nonce_len, tag_len, ad_len):
+            fields.append(body[offset:offset + size])
+            offset += size
+        key, nonce, tag, associated_data = fields
+        data = body[offset:]
+        cipher = _cipher(algorithm)
+        if op == OP_ENCRYPT:
+            result = cipher.encrypt(data, key, nonce, associated_data or None)
+            return encode_response(request_id, STATUS_OK, result.tag, result.ciphertext)
+        if op == OP_DECRYPT:
+            try:
+                plaintext = cipher.decrypt(data, key, nonce, tag, associated_data or None)
+            except AuthenticationError as e:
+                return encode_response(request_id, STATUS_AUTH_FAILED, data=str(e).encode())
+            return encode_response(request_id, STATUS_OK, data=plaintext)
+        raise ValueError("Unknown operation")
+    except (KeyError, ValueError) as e:
+        return encode_response(request_id, STATUS_BAD_REQUEST, data=str(e).encode())
+
+
+def process_batch(bodies: List[bytes]) -> List[bytes]:
+    """Worker entry point: one task per coalesced batch amortizes the dispatch cost"""
+    return [process_request(body) for body in bodies]
+
+
+class _Connection:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.write_lock = threading.Lock()
+        self.reader: Optional[threading.Thread] = None
+
+    def send(self, body: bytes) -> None:
+        with self.write_lock:
+            try:
+                write_frame(self.sock, body)
+            except OSError:
+                pass     # client went away; nothing to deliver to
+
+    def close(self) -> None:
+        """Wake the reader blocked on this socket and close it"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+@dataclass
+class ServiceStats:
+    requests: int = 0
+    batches: int = 0
+    connections: int = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+
+class AEADServer:
+    """Encryption service on a Unix domain socket.
+
+    Connection threads decode frames into a shared queue. A batcher thread
+    coalesces whatever arrives within max_delay (up to max_batch requests)
+    and hands each batch to a worker pool whose workers keep their cipher
+    instances warm. Clients may pipeline requests; responses carry the
+    request id.
+    """
+
+    def __init__(self, path: str, workers: Optional[int] = None, max_batch: int = 64,
+                 max_delay: float = 0.002, use_processes: bool = True):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        workers = workers or os.cpu_count() or 1
+        self.workers = workers
+        self.use_processes = use_processes
+        self.pool = self._new_pool()
+        self.pool_lock = threading.Lock()
+        self.connections: "set[_Connection]" = set()
+        self.connections_lock = threading.Lock()
+        self.in_flight = threading.BoundedSemaphore(2 * workers)
+        self.requests: "queue.Queue[Tuple[_Connection, bytes]]" = queue.Queue()
+        self.stats = ServiceStats()
+        self.stopping = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.listener: Optional[socket.socket] = None
+        self.inode: Optional[int] = None     # of the socket file this server bound
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers) if self.use_processes else ThreadPoolExecutor(self.workers)
+
+    def _replace_pool(self, broken) -> None:
+        """Swap in a fresh pool once a worker process has died; later batches would all fail"""
+        with self.pool_lock:
+            if self.pool is broken and not self.stopping.is_set():
+                self.pool = self._new_pool()
+                broken.shutdown(wait=False)
+
+    def _clear_stale_socket(self) -> None:
+        """Remove a socket file left by a server that is gone; refuse anything else"""
+        try:
+            mode = os.lstat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise ValueError("{} exists and is not a socket".format(self.path))
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise ValueError("Another service is already listening on {}".format(self.path))
+
+    def start(self) -> "AEADServer":
+        self._clear_stale_socket()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.inode = os.lstat(self.path).st_ino
+        self.listener.listen(128)
+        self.listener.settimeout(0.2)
+        for target in (self._accept_loop, self._batch_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def _accept_loop(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                sock, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            self.stats.connections += 1
+            connection = _Connection(sock)
+            connection.reader = threading.Thread(target=self._read_loop, args=(connection,), daemon=True)
+            with self.connections_lock:
+                self.connections.add(connection)
+            connection.reader.start()
+
+    def _read_loop(self, connection: _Connection) -> None:
+        try:
+            while not self.stopping.is_set():
+                body = read_frame(connection.sock)
+                if body is None:
+                    break
+                self.requests.put((connection, body))
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self.connections_lock:
+                self.connections.discard(connection)
+            connection.sock.close()
+
+    def _batch_loop(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                batch = [self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self.requests.get(timeout=remaining) if remaining > 0
+                                 else self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            self.in_flight.acquire()
+            self.stats.batches += 1
+            self.stats.requests += len(batch)
+            bodies = [body for _, body in batch]
+            pool = self.pool
+            try:
+                future = pool.submit(process_batch, bodies)
+            except BrokenProcessPool:
+                self._replace_pool(pool)
+                pool = self.pool
+                future = pool.submit(process_batch, bodies)
+            future.add_done_callback(lambda f, batch=batch, pool=pool: self._deliver(batch, f, pool))
+
+    def _deliver(self, batch, future, pool) -> None:
+        try:
+            responses = future.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._replace_pool(pool)
+            message = (str(e) or type(e).__name__).encode()
+            responses = [encode_response(request_id_of(body), STATUS_SERVER_ERROR, data=message)
+                         for _, body in batch]
+        finally:
+            self.in_flight.release()
+        for (connection, _), response in zip(batch, responses):
+            connection.send(response)
+
+    def close(self) -> None:
+        self.stopping.set()
+        if self.listener is not None:
+            self.listener.close()
+        for thread in self.threads:
+            thread.join()
+        self.pool.shutdown()     # batches in flight are still answered
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+            connection.reader.join()
+        try:
+            if os.lstat(self.path).st_ino == self.inode:     # never another server's socket
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AEADClient:
+    """Thread-safe client holding a small pool of service connections"""
+
+    def __init__(self, path: str, pool_size: int = 4):
+        self.path = path
+        self.connections: "queue.LifoQueue[socket.socket]" = queue.LifoQueue()
+        self.ids = itertools.count(1)
+        self.all: List[socket.socket] = []
+        self.lock = threading.Lock()
+        self.available = threading.BoundedSemaphore(pool_size)
+
+    def _acquire(self) -> socket.socket:
+        self.available.acquire()
+        try:
+            return self.connections.get_nowait()
+        except queue.Empty:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                self.available.release()
+                raise
+            with self.lock:
+                self.all.append(sock)
+            return sock
+
+    def _call(self, body: bytes, request_id: int) -> Tuple[int, bytes, bytes]:
+        sock = self._acquire()
+        try:
+            write_frame(sock, body)
+            response = read_frame(sock)
+        except (OSError, ValueError):
+            sock.close()
+            self.available.release()
+            raise
+        if response is None:
+            sock.close()
+            self.available.release()
+            raise ConnectionError("Service closed the connection")
+        self.connections.put(sock)
+        self.available.release()
+        response_id, status, tag, data = decode_response(response)
+        if response_id != request_id and status != STATUS_BAD_REQUEST:
+            raise ConnectionError("Mismatched response id")
+        return status, tag, data
+
+    def encrypt(self, algorithm: str, plaintext: bytes, key: bytes, nonce: bytes,
+                associated_data: Optional[bytes] = None) -> AuthenticatedData:
+        request_id = next(self.ids) & 0xFFFFFFFF
+        status, tag, data = self._call(encode_request(request_id, OP_ENCRYPT, algorithm, key, nonce,
+                                                      plaintext, associated_data=associated_data),
+                                       request_id)
+        if status != STATUS_OK:
+            raise ValueError(data.decode())
+        return AuthenticatedData(data, tag)
+
+    def decrypt(self, algorithm: str, ciphertext: bytes, key: bytes, nonce: bytes, tag: bytes,
+                associated_data: Optional[bytes] = None) -> bytes:
+        request_id = next(self.ids) & 0xFFFFFFFF
+        status, _, data = self._call(encode_request(request_id, OP_DECRYPT, algorithm, key, nonce,
+                                                    ciphertext, tag, associated_data), request_id)
+        if status != STATUS_OK:
+            raise ValueError(data.decode())
+        return data
+
+    def close(self) -> None:
+        with self.lock:
+            for sock in self.all:
+                sock.close()
+            self.all.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_test(path: str, clients: int = 8, requests_per_client: int = 50,
+              message_size: int = 64, algorithm: str = 'ISAP') -> dict:
+    """Drive the service from several threads and report latency percentiles"""
+    nonce_size = 16 if algorithm == 'ISAP' else 8
+    key = os.urandom(16)
+    message = os.urandom(message_size)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    with AEADClient(path, pool_size=clients) as client:
+        def worker():
+            local = []
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                client.encrypt(algorithm, message, key, os.urandom(nonce_size))
+                local.append(time.perf_counter() - start)
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker) for _ in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local AEAD encryption service")
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--socket", default="/tmp/aead_service.sock")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--size", type=int, default=64)
+    parser.add_argument("--algorithm", choices=["ISAP", "Elephant"], default="ISAP")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = AEADServer(args.socket, args.workers).start()
+        print(f"Serving on {args.socket}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.close()
+    else:
+        with AEADServer(args.socket, args.workers) as server:
+            result = load_test(args.socket, args.clients, args.requests, args.size, args.algorithm)
+            print(f"{result['requests']} requests, {result['rps']:.0f} req/s, "
+                  f"p50 {result['p50'] * 1e3:.2f} ms, p99 {result['p99'] * 1e3:.2f} ms, "
+                  f"mean batch {server.stats.mean_batch_size:.1f}")
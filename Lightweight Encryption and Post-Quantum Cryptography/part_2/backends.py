@@ -0,0 +1,489 @@
+# backends.py
+import atexit
+import hmac
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:      # optional dependency, only needed for the vector backend
+    np = None
+
+import elephant
+from crypto_base import AuthenticatedData, AuthenticationError
+from elephant import Elephant
+from isap import ISAP
+
+BLOCK = 8                 # bytes per permutation in the default parameter sets
+CALIBRATION_POINTS = ((1, 8), (1, 64), (8, 8), (8, 64))   # (messages, bytes per message)
+CALIBRATION_REPEATS = 5       # best-of timings per point ...
+CALIBRATION_BUDGET = 0.05     # ... until this many seconds were spent on it
+CACHE_ENV = "LWC_BACKEND_CACHE"
+OVERRIDE_ENV = "LWC_BACKEND"
+
+
+def default_cache_path() -> str:
+    return os.environ.get(CACHE_ENV) or os.path.join(os.path.expanduser("~"), ".cache", "lwc_backends.json")
+
+
+def _check_batch(cipher, key: bytes, nonces, count: int) -> None:
+    nonce_size = ISAP.NONCE_SIZE if isinstance(cipher, ISAP) else 8
+    if len(key) != 16:
+        raise ValueError("Key must be 16 bytes")
+    if len(nonces) != count:
+        raise ValueError("Need one nonce per message")
+    for nonce in nonces:
+        if len(nonce) != nonce_size:
+            raise ValueError("Nonce must be {} bytes".format(nonce_size))
+
+
+class Backend:
+    """An engine that encrypts or decrypts a batch of messages for one cipher"""
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    def supports(self, cipher) -> bool:
+        return True
+
+    def encrypt_many(self, cipher, messages, key, nonces, associated_data=None):
+        raise NotImplementedError
+
+    def decrypt_many(self, cipher, ciphertexts, key, nonces, tags, associated_data=None):
+        raise NotImplementedError
+
+
+class ScalarBackend(Backend):
+    """One cipher call per message; no setup cost, best for single small messages"""
+    name = "scalar"
+
+    def encrypt_many(self, cipher, messages, key, nonces, associated_data=None):
+        return [cipher.encrypt(m, key, n, associated_data) for m, n in zip(messages, nonces)]
+
+    def decrypt_many(self, cipher, ciphertexts, key, nonces, tags, associated_data=None):
+        return [cipher.decrypt(c, key, n, t, associated_data)
+                for c, n, t in zip(ciphertexts, nonces, tags)]
+
+
+def _scalar_chunk(cipher, items, key, associated_data, decrypting):
+    if decrypting:
+        return [cipher.decrypt(c, key, n, t, associated_data) for c, n, t in items]
+    return [cipher.encrypt(m, key, n, associated_data) for m, n in items]
+
+
+class ProcessBackend(Backend):
+    """Scalar calls spread over a process pool; pays off with many cores and large batches.
+
+    The pool is created on first use and kept for the life of the process,
+    so calibration measures the same warm workers later batches run on.
+    """
+    name = "process"
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pool_pid = None
+        self.pool_lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self.pool_lock:
+            if self.pool is None or self.pool_pid != os.getpid():   # a forked child needs its own workers
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                self.pool_pid = os.getpid()
+            return self.pool
+
+    def _discard(self, broken: ProcessPoolExecutor) -> None:
+        """Drop a pool whose worker died so the next call starts a fresh one"""
+        with self.pool_lock:
+            if self.pool is broken:
+                self.pool = None
+        broken.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes; a later call starts a new pool"""
+        with self.pool_lock:
+            pool, self.pool = self.pool, None
+        if pool is not None and self.pool_pid == os.getpid():
+            pool.shutdown()
+
+    def _run(self, cipher, items, key, associated_data, decrypting):
+        size = -(-len(items) // self.workers)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        for attempt in range(2):
+            pool = self._pool()
+            try:
+                futures = [pool.submit(_scalar_chunk, cipher, chunk, key, associated_data, decrypting)
+                           for chunk in chunks]
+                return [result for future in futures for result in future.result()]
+            except BrokenProcessPool:
+                self._discard(pool)
+                if attempt:
+                    raise
+
+    def encrypt_many(self, cipher, messages, key, nonces, associated_data=None):
+        if not messages:
+            return []
+        return self._run(cipher, list(zip(messages, nonces)), key, associated_data, False)
+
+    def decrypt_many(self, cipher, ciphertexts, key, nonces, tags, associated_data=None):
+        if not ciphertexts:
+            return []
+        return self._run(cipher, list(zip(ciphertexts, nonces, tags)), key, associated_data, True)
+
+
+def _rotl(values, shifts):
+    """Rotate uint64 values left; shifts may be 0 (the right shift is split to stay below 64)"""
+    return (values << shifts) | ((values >> np.uint64(1)) >> (np.uint64(63) - shifts))
+
+
+class VectorBackend(Backend):
+    """NumPy engine: one permutation step advances every message of the batch together.
+
+    Messages are sorted by length so the lanes still running are a prefix
+    of the state array. Requires NumPy and the default 8-byte rate.
+    """
+    name = "vector"
+
+    def __init__(self):
+        if np is not None:
+            source, rotation = zip(*elephant.RHO_PI)
+            self.rho_source = np.array(source)
+            self.rho_rotation = np.array(rotation, dtype=np.uint64)[:, None]
+            self.isap_rot1 = np.array([19, 61, 1, 10, 7], dtype=np.uint64)[:, None]
+            self.isap_rot2 = np.array([28, 39, 6, 17, 41], dtype=np.uint64)[:, None]
+
+    def available(self) -> bool:
+        return np is not None
+
+    def supports(self, cipher) -> bool:
+        return isinstance(cipher, ISAP) or (isinstance(cipher, Elephant) and cipher.rate == elephant.DEFAULT_RATE)
+
+    # --- permutations over (lanes, messages) arrays ---
+
+    def _elephant_permutation(self, cipher, state):
+        one = np.uint64(1)
+        for constant in cipher.round_constants[:cipher.ROUNDS]:
+            rows = state.reshape(5, 5, -1)
+            column = rows[0] ^ rows[1] ^ rows[2] ^ rows[3] ^ rows[4]
+            rows ^= np.roll(column, 1, axis=0) ^ _rotl(np.roll(column, -1, axis=0), one)
+            state = _rotl(state[self.rho_source], self.rho_rotation)
+            rows = state.reshape(5, 5, -1)
+            rows ^= ~np.roll(rows, -1, axis=1) & np.roll(rows, -2, axis=1)
+            state[0] ^= np.uint64(constant)
+        return state
+
+    def _isap_permutation(self, cipher, state, rounds):
+        for constant in cipher.round_constants[:rounds]:
+            state[2] ^= np.uint64(constant)
+            t = state ^ np.roll(state, 1, axis=0)
+            state = state ^ np.roll(t, -1, axis=0)
+            state = _rotl(state, self.isap_rot1) ^ _rotl(state, self.isap_rot2)
+        return state
+
+    # --- batch layout ---
+
+    @staticmethod
+    def _layout(payloads):
+        """Sort by length; return (order, lengths, blocks, lanes[max_blocks, count], masks)"""
+        lengths = np.array([len(p) for p in payloads], dtype=np.int64)
+        order = np.argsort(-lengths, kind="stable")
+        lengths = lengths[order]
+        blocks = -(-lengths // BLOCK)
+        width = int(blocks[0]) * BLOCK if len(blocks) else 0
+        packed = b"".join(bytes(payloads[i]).ljust(width, b"\x00") for i in order)
+        lanes = np.frombuffer(packed, dtype=">u8").reshape(len(payloads), -1).T.astype(np.uint64)
+        # Mask of the bytes each lane really carries (all ones, a tail, or nothing)
+        offsets = np.arange(lanes.shape[0])[:, None] * BLOCK
+        valid = np.clip(lengths[None, :] - offsets, 0, BLOCK).astype(np.uint64)
+        full = np.uint64(0xFFFFFFFFFFFFFFFF)
+        masks = np.where(valid == BLOCK, full, ~(full >> (valid * np.uint64(8) % np.uint64(64))))
+        return order, lengths, blocks, lanes, masks
+
+    @staticmethod
+    def _unpack(lanes, order, lengths):
+        rows = lanes.T.astype(">u8")
+        result = [b""] * len(order)
+        for row, index, length in zip(rows, order, lengths):
+            result[index] = row.tobytes()[:length]
+        return result
+
+    # --- Elephant ---
+
+    def _elephant(self, cipher, payloads, key, nonces, associated_data, decrypting):
+        order, lengths, blocks, lanes, masks = self._layout(payloads)
+        initial = {}
+        columns = []
+        for i in order:
+            # The default key setup may map many nonces to one state; set up each once
+            seed = tuple(cipher.bytes_to_state(key + nonces[i]))
+            if seed not in initial:
+                initial[seed] = cipher._initial_states(key, nonces[i], associated_data)[0]
+            columns.append(initial[seed])
+        state = np.array(columns, dtype=np.uint64).T.copy()
+        out = np.empty_like(lanes)
+        for step in range(lanes.shape[0]):
+            active = int(np.count_nonzero(blocks > step))
+            value = lanes[step, :active]
+            result = value ^ state[0, :active]
+            out[step, :active] = result
+            # Default mode keeps tag_state equal to state, so one permutation serves both
+            state[0, :active] ^= (result & masks[step, :active]) if decrypting else value
+            state[:, :active] = self._elephant_permutation(cipher, state[:, :active])
+        tags = [b""] * len(order)
+        for column, index in enumerate(order):
+            tags[index] = struct.pack(">Q", int(state[0, column]))
+        return self._unpack(out, order, lengths), tags
+
+    # --- ISAP ---
+
+    def _isap_states(self, cipher, key, nonces, order, suffix=b""):
+        packed = b"".join((key + nonces[i] + suffix).ljust(40, b"\x00") for i in order)
+        state = np.frombuffer(packed, dtype=">u8").reshape(-1, 5).T.astype(np.uint64)
+        return self._isap_permutation(cipher, state, cipher.PA_ROUNDS)
+
+    def _isap_absorb(self, cipher, state, lanes, blocks, domain):
+        for step in range(lanes.shape[0]):
+            active = int(np.count_nonzero(blocks > step))
+            part = state[:, :active]
+            part[0] ^= lanes[step, :active]
+            part[4] ^= np.where(blocks[:active] == step + 1, np.uint64(domain), np.uint64(0))
+            state[:, :active] = self._isap_permutation(cipher, part, cipher.PB_ROUNDS)
+        return state
+
+    def _isap_tags(self, cipher, key, nonces, order, lanes, blocks):
+        state = self._isap_states(cipher, key, nonces, order, bytes([0x02]))
+        state = self._isap_absorb(cipher, state, lanes, blocks, 0x03)
+        first = state[0].copy()
+        second = self._isap_permutation(cipher, state, cipher.PB_ROUNDS)[0]
+        tags = [b""] * len(order)
+        for column, index in enumerate(order):
+            tags[index] = struct.pack(">QQ", int(first[column]), int(second[column]))
+        return tags
+
+    def _isap_keystream(self, cipher, key, nonces, order, associated_data):
+        """ISAP squeezes the first lane of the data state for every block"""
+        state = self._isap_states(cipher, key, nonces, order)
+        if associated_data:
+            ad_lanes = np.repeat(self._layout([associated_data])[3], len(order), axis=1)
+            ad_blocks = np.full(len(order), ad_lanes.shape[0])
+            state = self._isap_absorb(cipher, state, ad_lanes, ad_blocks, 0x01)
+        return state[0]
+
+    def encrypt_many(self, cipher, messages, key, nonces, associated_data=None):
+        if not messages:
+            return []
+        if isinstance(cipher, Elephant):
+            ciphertexts, tags = self._elephant(cipher, messages, key, nonces, associated_data, False)
+            return [elephant.AuthenticatedData(c, t) for c, t in zip(ciphertexts, tags)]
+        order, lengths, blocks, lanes, masks = self._layout(messages)
+        keystream = self._isap_keystream(cipher, key, nonces, order, associated_data)
+        cipher_lanes = (lanes ^ keystream[None, :]) & masks
+        tags = self._isap_tags(cipher, key, nonces, order, cipher_lanes, blocks)
+        return [AuthenticatedData(c, t) for c, t in zip(self._unpack(cipher_lanes, order, lengths), tags)]
+
+    def decrypt_many(self, cipher, ciphertexts, key, nonces, tags, associated_data=None):
+        if not ciphertexts:
+            return []
+        if isinstance(cipher, Elephant):
+            plaintexts, computed = self._elephant(cipher, ciphertexts, key, nonces, associated_data, True)
+        else:
+            order, lengths, blocks, lanes, masks = self._layout(ciphertexts)
+            computed = self._isap_tags(cipher, key, nonces, order, lanes, blocks)
+            keystream = self._isap_keystream(cipher, key, nonces, order, associated_data)
+            plaintexts = self._unpack((lanes ^ keystream[None, :]) & masks, order, lengths)
+        for expected, tag in zip(computed, tags):
+            if not hmac.compare_digest(expected, tag):
+                raise AuthenticationError("Authentication failed")
+        return plaintexts
+
+
+BACKENDS: Dict[str, Backend] = {}
+
+
+def register_backend(backend: Backend) -> None:
+    """Make an engine available to every dispatcher; it is calibrated on next use"""
+    BACKENDS[backend.name] = backend
+
+
+for _backend in (ScalarBackend(), VectorBackend(), ProcessBackend()):
+    register_backend(_backend)
+
+
+def available_backends(cipher=None) -> List[str]:
+    return [name for name, backend in BACKENDS.items()
+            if backend.available() and (cipher is None or backend.supports(cipher))]
+
+
+@dataclass
+class CostModel:
+    """Seconds per call as fixed + per_step * longest message + per_block * all messages (in blocks)"""
+    fixed: float
+    per_step: float
+    per_block: float
+
+    def estimate(self, steps: int, blocks: int) -> float:
+        return self.fixed + self.per_step * steps + self.per_block * blocks
+
+
+def _least_squares(rows, values):
+    """Non-negative coefficients minimising the squared error (normal equations, refit without negatives)"""
+    active = list(range(len(rows[0])))
+    while True:
+        size = len(active)
+        matrix = [[sum(r[i] * r[j] for r in rows) for j in active] +
+                  [sum(r[i] * v for r, v in zip(rows, values))] for i in active]
+        for col in range(size):          # Gauss-Jordan elimination with partial pivoting
+            pivot = max(range(col, size), key=lambda r: abs(matrix[r][col]))
+            matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+            if matrix[col][col] == 0:
+                continue
+            for r in range(size):
+                if r != col:
+                    factor = matrix[r][col] / matrix[col][col]
+                    matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[col])]
+        solution = {i: (matrix[k][size] / matrix[k][k] if matrix[k][k] else 0.0) for k, i in enumerate(active)}
+        negative = [i for i in active if solution[i] < 0]
+        if not negative:
+            return [solution.get(i, 0.0) for i in range(len(rows[0]))]
+        active.remove(min(negative, key=solution.get))
+
+
+def _shape(lengths: Sequence[int]):
+    """(steps, blocks) of a batch; each message also counts one block of setup"""
+    sizes = [-(-length // BLOCK) + 1 for length in lengths]
+    return (max(sizes) if sizes else 0), sum(sizes)
+
+
+class Dispatcher:
+    """Routes batches of one cipher to the registered backend expected to be fastest.
+
+    On first use every available backend is timed at CALIBRATION_POINTS
+    and fitted to a CostModel; the models are cached in a JSON file keyed
+    by cipher, Python/NumPy version and CPU count. The backend argument
+    (or the LWC_BACKEND environment variable) forces an engine by name.
+    """
+
+    def __init__(self, cipher, cache_path: Optional[str] = None, backend: Optional[str] = None):
+        self.cipher = cipher
+        self.cache_path = cache_path if cache_path is not None else default_cache_path()
+        self.backend = backend
+        self.models: Dict[str, CostModel] = {}
+        self.last_backend: Optional[str] = None
+
+    @property
+    def cache_key(self) -> str:
+        name = type(self.cipher).__name__
+        if isinstance(self.cipher, Elephant):
+            name += "-{}".format(self.cipher.rate)
+        numpy_version = np.__version__ if np is not None else "none"
+        return "{}|python {}.{}|numpy {}|cpus {}".format(name, sys.version_info[0], sys.version_info[1],
+                                                        numpy_version, os.cpu_count())
+
+    def _load(self) -> dict:
+        try:
+            with open(self.cache_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, models: Dict[str, CostModel]) -> None:
+        cache = self._load()
+        cache[self.cache_key] = {name: [m.fixed, m.per_step, m.per_block] for name, m in models.items()}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            with open(self.cache_path + ".tmp", "w") as file:
+                json.dump(cache, file, indent=1)
+            os.replace(self.cache_path + ".tmp", self.cache_path)
+        except OSError:
+            pass    # calibration still applies to this process
+
+    def _measure(self, backend: Backend) -> CostModel:
+        key = bytes(16)
+        nonce = bytes(ISAP.NONCE_SIZE if isinstance(self.cipher, ISAP) else 8)
+        warm_up = max(count for count, _ in CALIBRATION_POINTS)    # starts every pool worker
+        backend.encrypt_many(self.cipher, [bytes(BLOCK)] * warm_up, key, [nonce] * warm_up)
+        timings = []
+        for count, size in CALIBRATION_POINTS:
+            messages = [bytes(size)] * count
+            best = spent = float("inf")
+            for repeat in range(CALIBRATION_REPEATS):
+                start = time.perf_counter()
+                backend.encrypt_many(self.cipher, messages, key, [nonce] * count)
+                elapsed = time.perf_counter() - start
+                best = min(best, elapsed)
+                spent = elapsed if repeat == 0 else spent + elapsed
+                if spent > CALIBRATION_BUDGET:
+                    break
+            timings.append((_shape([size] * count), best))
+        return CostModel(*_least_squares([(1.0, steps, blocks) for (steps, blocks), _ in timings],
+                                         [seconds for _, seconds in timings]))
+
+    def calibrate(self, force: bool = False) -> Dict[str, CostModel]:
+        """Cost models of every usable backend, measuring any not yet cached"""
+        names = available_backends(self.cipher)
+        if not force:
+            cached = self._load().get(self.cache_key, {})
+            self.models = {name: CostModel(*cached[name]) for name in names if name in cached}
+        else:
+            self.models = {}
+        missing = [name for name in names if name not in self.models]
+        for name in missing:
+            self.models[name] = self._measure(BACKENDS[name])
+        if missing:
+            self._save(self.models)
+        return self.models
+
+    def estimate(self, lengths: Sequence[int]) -> Dict[str, float]:
+        """Predicted seconds per backend for a batch with the given message lengths"""
+        if set(self.models) != set(available_backends(self.cipher)):
+            self.calibrate()
+        steps, blocks = _shape(lengths)
+        return {name: model.estimate(steps, blocks) for name, model in self.models.items()}
+
+    def choose(self, lengths: Sequence[int], backend: Optional[str] = None) -> str:
+        """Backend name for a batch: the override if any, else the cheapest estimate"""
+        forced = backend or self.backend or os.environ.get(OVERRIDE_ENV)
+        if forced:
+            if forced not in available_backends(self.cipher):
+                raise ValueError("Backend {!r} is not available for {}".format(forced, type(self.cipher).__name__))
+            return forced
+        estimates = self.estimate(lengths)
+        return min(estimates, key=estimates.get)
+
+    def encrypt_many(self, messages, key, nonces, associated_data=None, backend=None):
+        messages = list(messages)
+        _check_batch(self.cipher, key, nonces, len(messages))
+        self.last_backend = self.choose([len(m) for m in messages], backend)
+        return BACKENDS[self.last_backend].encrypt_many(self.cipher, messages, key, list(nonces), associated_data)
+
+    def decrypt_many(self, ciphertexts, key, nonces, tags, associated_data=None, backend=None):
+        ciphertexts = list(ciphertexts)
+        _check_batch(self.cipher, key, nonces, len(ciphertexts))
+        if len(tags) != len(ciphertexts):
+            raise ValueError("Need one tag per message")
+        self.last_backend = self.choose([len(c) for c in ciphertexts], backend)
+        return BACKENDS[self.last_backend].decrypt_many(self.cipher, ciphertexts, key, list(nonces),
+                                                        list(tags), associated_data)
+
+
+_dispatchers: Dict[str, Dispatcher] = {}
+
+
+def dispatcher_for(cipher) -> Dispatcher:
+    """Shared dispatcher for a cipher's parameter set (calibrated once per process)"""
+    probe = Dispatcher(cipher)
+    if probe.cache_key not in _dispatchers:
+        _dispatchers[probe.cache_key] = probe
+    dispatcher = _dispatchers[probe.cache_key]
+    dispatcher.cipher = cipher
+    return dispatcher
@@ -0,0 +1,201 @@
+# benchmark.py
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from backends import BACKENDS, available_backends, dispatcher_for
+from elephant import Elephant
+from file_encryption import encrypt_stream, decrypt_stream
+from file_integrity import FileIntegrity
+from isap import ISAP
+from keystream_pool import KeystreamPool
+from nonce_source import NonceAllocator, ReuseDetector, random_nonce
+from read_ahead import PipelineStats
+
+def _per_call(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+def bench_ciphers(sizes=(64, 1024), repeats=3):
+    """Encryption throughput of both ciphers in KB/s"""
+    key = os.urandom(16)
+    results = []
+    for name, cipher, nonce_size in [('ISAP', ISAP(), 16), ('Elephant', Elephant(), 8)]:
+        for size in sizes:
+            data = os.urandom(size)
+            nonce = os.urandom(nonce_size)
+            seconds = _per_call(lambda: cipher.encrypt(data, key, nonce), repeats)
+            results.append({"cipher": name, "size": size, "kb_per_s": size / seconds / 1024})
+    return results
+
+def bench_nonces(count=20000, message_size=64):
+    """Cost of each nonce strategy per call, and relative to one small ISAP message"""
+    key = os.urandom(16)
+    allocator = NonceAllocator.for_isap()
+    checked = NonceAllocator.for_isap(detector=ReuseDetector())
+    isap = ISAP()
+    data = os.urandom(message_size)
+    message = _per_call(lambda: isap.encrypt(data, key, allocator.next()), 20)
+
+    results = {
+        "os.urandom": _per_call(lambda: os.urandom(16), count),
+        "random_nonce": _per_call(lambda: random_nonce(16), count),
+        "counter": _per_call(allocator.next, count),
+        "counter+detector": _per_call(lambda: checked.next(key), count),
+    }
+    return {name: {"seconds": seconds, "overhead": seconds / message}
+            for name, seconds in results.items()}
+
+def sample_inputs(size=16 * 1024, seed=1):
+    """Log lines, JSON records and random bytes of roughly the given size"""
+    rng = random.Random(seed)
+    levels = ["INFO", "DEBUG", "WARNING", "ERROR"]
+    lines = []
+    while sum(map(len, lines)) < size:
+        lines.append(f"2024-05-{rng.randint(1, 28):02d} 12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d} "
+                     f"{rng.choice(levels)} worker-{rng.randint(1, 8)} request {rng.randint(0, 10 ** 6)} "
+                     f"completed in {rng.random() * 100:.2f} ms\n")
+    records = [{"id": i, "user": f"user{rng.randint(1, 500)}", "active": rng.random() < 0.5,
+                "score": round(rng.random(), 4), "tags": rng.sample(levels, 2)} for i in range(size // 60)]
+    return {
+        "log": "".join(lines).encode()[:size],
+        "json": json.dumps(records).encode()[:size],
+        "random": os.urandom(size),
+    }
+
+def bench_compression(size=16 * 1024, codecs=("none", "zlib", "lzma", "bz2"), algorithm="Elephant"):
+    """End-to-end encrypt+decrypt time per input type and codec, and time saved versus no codec"""
+    key = os.urandom(16)
+    results = []
+    for kind, data in sample_inputs(size).items():
+        baseline = None
+        for codec in codecs:
+            container = io.BytesIO()
+            start = time.perf_counter()
+            stats = encrypt_stream(io.BytesIO(data), container, key, algorithm, codec)
+            container.seek(0)
+            output = io.BytesIO()
+            decrypt_stream(container, output, key)
+            seconds = time.perf_counter() - start
+            assert output.getvalue() == data
+            baseline = seconds if baseline is None else baseline
+            results.append({"input": kind, "codec": codec, "used": stats.codec, "ratio": stats.ratio,
+                            "seconds": seconds, "saved": 1 - seconds / baseline})
+    return results
+
+def bench_ofb_pool(messages=20, message_size=64):
+    """Request-path latency of ISAP OFB with and without a precomputed keystream"""
+    isap = ISAP()
+    key = os.urandom(16)
+    data = os.urandom(message_size)
+    ivs = [os.urandom(16) for _ in range(messages)]
+    direct = _per_call(lambda: isap.encrypt_ofb(data, key, os.urandom(16)), messages)
+    with KeystreamPool(isap) as pool:
+        for iv in ivs:
+            pool.reserve(key, iv, message_size)
+        pool.wait()
+        it = iter(ivs)
+        pooled = _per_call(lambda: pool.encrypt(data, key, next(it)), messages)
+    return {"direct": direct, "pooled": pooled, "speedup": direct / pooled}
+
+def bench_mac(size=16 * 1024):
+    """Seconds to authenticate size bytes: full AEAD, MAC-only mode, and hash-then-encrypt"""
+    key = os.urandom(16)
+    data = os.urandom(size)
+    results = []
+    for name, cipher, nonce_size in [('Elephant', Elephant(), 8)]:     # ISAP has no MAC-only mode
+        nonce = os.urandom(nonce_size)
+        timings = {
+            "aead": _per_call(lambda: cipher.encrypt(data, key, nonce).tag, 1),
+            "mac": _per_call(lambda: cipher.mac(data, key, nonce), 1),
+            "hash+seal": _per_call(lambda: cipher.encrypt(hashlib.sha256(data).digest(), key, nonce), 1),
+        }
+        results.append({"cipher": name, "size": size, **timings})
+    return results
+
+def bench_permutation_pair(count=200):
+    """Seconds per Elephant block: two permutation calls versus one permutation_pair"""
+    cipher = Elephant()
+    rng = random.Random(1)
+    state = [rng.getrandbits(64) for _ in range(25)]
+    other = [rng.getrandbits(64) for _ in range(25)]
+    results = {"separate": _per_call(lambda: (cipher.permutation(state), cipher.permutation(other)), count),
+               "pair": _per_call(lambda: cipher.permutation_pair(state, other), count)}
+    twin = state.copy()
+    results["pair (equal states)"] = _per_call(lambda: cipher.permutation_pair(state, twin), count)
+    return results
+
+def bench_read_ahead(size=64 * 1024 * 1024, depths=(1, 2, 4)):
+    """Hashing a file for an integrity extract at several read-ahead depths"""
+    key, nonce = os.urandom(16), os.urandom(16)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.bin")
+        with open(path, "wb") as f:
+            for _ in range(size // (1 << 20)):
+                f.write(os.urandom(1 << 20))
+        for depth in depths:
+            stats = PipelineStats()
+            seconds = _per_call(lambda: FileIntegrity.generate_file_extract(path, key, nonce, 'ISAP',
+                                                                            depth=depth, stats=stats), 1)
+            results.append({"depth": depth, "seconds": seconds, "io_wait": stats.io_wait,
+                            "read": stats.read_time, "compute": stats.compute_time, "overlap": stats.overlap})
+    return results
+
+def bench_backends(batches=(1, 8, 64), message_size=64):
+    """Seconds per batch on every backend, next to the dispatcher's choice"""
+    key = os.urandom(16)
+    results = []
+    for name, cipher, nonce_size in [('ISAP', ISAP(), 16), ('Elephant', Elephant(), 8)]:
+        dispatcher = dispatcher_for(cipher)
+        for count in batches:
+            messages = [os.urandom(message_size) for _ in range(count)]
+            nonces = [os.urandom(nonce_size) for _ in range(count)]
+            timings = {backend: _per_call(lambda: BACKENDS[backend].encrypt_many(cipher, messages, key, nonces), 1)
+                       for backend in available_backends(cipher)}
+            results.append({"cipher": name, "batch": count, "chosen": dispatcher.choose([message_size] * count),
+                            **timings})
+    return results
+
+
+if __name__ == "__main__":
+    print("Cipher throughput\n")
+    for r in bench_ciphers():
+        print(f"{r['cipher']:9s} {r['size']:6d} B | {r['kb_per_s']:9.2f} KB/s")
+
+    print("\nNonce allocation (per nonce, share of a 64-byte ISAP encryption)\n")
+    for name, r in bench_nonces().items():
+        print(f"{name:17s} | {r['seconds'] * 1e6:7.2f} us | {r['overhead'] * 100:6.3f}%")
+
+    print("\nElephant permutations per block\n")
+    for name, seconds in bench_permutation_pair().items():
+        print(f"{name:19s} | {seconds * 1e6:8.1f} us")
+
+    print("\nAuthenticating 16 KB (seconds)\n")
+    for r in bench_mac():
+        print(f"{r['cipher']:9s} | AEAD tag {r['aead']:7.3f} | MAC-only {r['mac']:7.3f} | "
+              f"SHA-256 + seal {r['hash+seal']:7.4f} | MAC-only saves {1 - r['mac'] / r['aead']:5.1%} of AEAD")
+
+    print("\nBatch encryption backends (64-byte messages, seconds per batch)\n")
+    for r in bench_backends():
+        timings = " | ".join(f"{name} {r[name]:7.4f}" for name in available_backends() if name in r)
+        print(f"{r['cipher']:9s} x{r['batch']:<3d} | {timings} | dispatcher picks {r['chosen']}")
+
+    print("\nRead-ahead while hashing 64 MB for an integrity extract (seconds)\n")
+    for r in bench_read_ahead():
+        print(f"depth {r['depth']} | total {r['seconds']:6.3f} | I/O wait {r['io_wait']:6.3f} | "
+              f"reads {r['read']:6.3f} | compute {r['compute']:6.3f} | {r['overlap']:5.1%} of reads hidden")
+
+    r = bench_ofb_pool()
+    print(f"\nISAP OFB, 64-byte message: {r['direct'] * 1e3:.2f} ms direct, "
+          f"{r['pooled'] * 1e3:.2f} ms with a pooled keystream ({r['speedup']:.1f}x)")
+
+    print("\nCompression before encryption (16 KB, Elephant, encrypt + decrypt)\n")
+    for r in bench_compression():
+        print(f"{r['input']:6s} {r['codec']:4s} (used {r['used']:4s}) | ratio {r['ratio']:5.3f} | "
+              f"{r['seconds']:6.2f} s | saved {r['saved'] * 100:5.1f}%")
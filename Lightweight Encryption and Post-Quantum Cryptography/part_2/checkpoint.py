@@ -0,0 +1,75 @@
+# checkpoint.py
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+CHECKPOINT_SUFFIX = ".ckpt"
+CHECKPOINT_VERSION = 1
+DEFAULT_INTERVAL = 30.0          # seconds between checkpoints of a long job
+
+
+def key_id(key: bytes) -> str:
+    """Fingerprint binding a checkpoint to its key without storing the key"""
+    return hashlib.blake2b(key, digest_size=16, person=b"checkpoint").hexdigest()
+
+
+def save_checkpoint(path: str, fields: dict) -> None:
+    """Atomically replace path with a JSON checkpoint (temporary file, fsync, rename).
+
+    The file is readable by its owner only: a MAC checkpoint holds the
+    keyed state lanes, which are secret material like the key itself.
+    """
+    data = dict(fields, version=CHECKPOINT_VERSION)
+    if os.path.exists(path + ".tmp"):
+        os.remove(path + ".tmp")     # O_CREAT keeps the mode of a file that is already there
+    descriptor = os.open(path + ".tmp", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path: str, kind: str, **expected) -> dict:
+    """Read a checkpoint written for this kind of job; every expected field must match"""
+    try:
+        with open(path) as file:
+            data = json.load(file)
+    except FileNotFoundError:
+        raise ValueError("No checkpoint to resume from: {}".format(path))
+    except (OSError, ValueError):
+        raise ValueError("Corrupted checkpoint: {}".format(path))
+    if not isinstance(data, dict) or data.get("version") != CHECKPOINT_VERSION or data.get("kind") != kind:
+        raise ValueError("Not a {} checkpoint: {}".format(kind, path))
+    for name, value in expected.items():
+        if data.get(name) != value:
+            raise ValueError("Checkpoint does not match this job ({} differs)".format(name))
+    return data
+
+
+def remove_checkpoint(path: str) -> None:
+    for leftover in (path, path + ".tmp"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+class Checkpointer:
+    """Decides when a long job saves its progress; interval=None disables checkpoints"""
+
+    def __init__(self, path: str, interval: Optional[float]):
+        if interval is not None and interval < 0:
+            raise ValueError("Checkpoint interval must not be negative")
+        self.path = path
+        self.interval = interval
+        self.last = time.monotonic()
+        self.saved = 0
+
+    def due(self) -> bool:
+        return self.interval is not None and time.monotonic() - self.last >= self.interval
+
+    def save(self, fields: dict) -> None:
+        save_checkpoint(self.path, fields)
+        self.last = time.monotonic()
+        self.saved += 1
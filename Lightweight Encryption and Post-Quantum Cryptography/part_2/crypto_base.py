@@ -1,6 +1,9 @@
 # crypto_base.py
 # from dataclasses import dataclass
 from typing import List, Optional, Tuple
+from contextlib import contextmanager
+import hmac
+import mmap
 import os
 import struct
 
@@ -14,6 +17,10 @@ class CryptoError(Exception):
     """Base class for cryptographic exceptions"""
     pass
 
+class AuthenticationError(CryptoError, ValueError):
+    """A tag did not verify; still a ValueError for existing callers"""
+    pass
+
 def rotate_left(value, shift, size=64):
     """Rotate left (circular left shift)"""
     return ((value << shift) | (value >> (size - shift))) & ((1 << size) - 1)
@@ -28,4 +35,92 @@ def state_to_bytes(state):
 
 def xor_bytes(a, b):
     """XOR two byte strings"""
-    return bytes(x ^ y for x, y in zip(a, b))
\ No newline at end of file
+    return bytes(x ^ y for x, y in zip(a, b))
+
+def writable_view(buffer):
+    """Byte-level memoryview of a writable buffer (bytearray, memoryview, mmap)"""
+    try:
+        view = memoryview(buffer)
+    except TypeError:
+        raise ValueError("Buffer must support the buffer protocol")
+    if view.readonly:
+        view.release()
+        raise ValueError("Buffer must be writable")
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
+
+@contextmanager
+def writable_file_buffer(filepath):
+    """Memory-map a file read/write so it can be encrypted in place"""
+    with open(filepath, 'r+b') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield bytearray()    # mmap cannot map empty files
+            return
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE)
+        try:
+            yield mapped
+            mapped.flush()
+        finally:
+            mapped.close()
+
+class StreamingMAC:
+    """Incremental MAC in the style of hashlib: update() as data arrives, then digest().
+
+    absorb(view) receives whole rate-sized blocks only; finish(tail)
+    receives the remaining partial block (possibly empty), pads it and
+    returns the tag. state is the lane list absorb and finish work on;
+    when given, snapshot() and restore() let a long MAC be checkpointed.
+    """
+    def __init__(self, rate, absorb, finish, state=None):
+        self.rate = rate
+        self._absorb = absorb
+        self._finish = finish
+        self._pending = bytearray()
+        self._tag = None
+        self.state = state
+
+    def update(self, data):
+        if self._tag is not None:
+            raise ValueError("MAC already finalized")
+        view = memoryview(data).cast('B')
+        if self._pending:
+            take = min(len(view), self.rate - len(self._pending))
+            self._pending += view[:take]
+            view = view[take:]
+            if len(self._pending) < self.rate:
+                return
+            self._absorb(memoryview(bytes(self._pending)))
+            self._pending.clear()
+        full = len(view) - len(view) % self.rate
+        if full:
+            self._absorb(view[:full])
+        self._pending += view[full:]
+
+    def snapshot(self):
+        """Progress so far as plain data: the permutation lanes and the pending partial block"""
+        if self.state is None or self._tag is not None:
+            raise ValueError("MAC state cannot be saved")
+        return {"lanes": list(self.state), "pending": self._pending.hex()}
+
+    def restore(self, snapshot):
+        """Continue from a snapshot of a MAC begun with the same key, nonce and associated data"""
+        if self.state is None or self._tag is not None:
+            raise ValueError("MAC state cannot be restored")
+        lanes = snapshot["lanes"]
+        pending = bytes.fromhex(snapshot["pending"])
+        if len(lanes) != len(self.state) or len(pending) >= self.rate:
+            raise ValueError("Snapshot does not fit this MAC")
+        self.state[:] = lanes
+        self._pending[:] = pending
+
+    def digest(self):
+        if self._tag is None:
+            self._tag = self._finish(bytes(self._pending))
+            self._pending.clear()
+        return self._tag
+
+    def verify(self, tag):
+        """Raise ValueError unless tag matches (constant-time comparison)"""
+        if not hmac.compare_digest(self.digest(), tag):
+            raise AuthenticationError("Authentication failed")
@@ -1,15 +1,58 @@
 import struct
 import hmac
+import sys
+from array import array
 from typing import List, Optional
 from dataclasses import dataclass
-from crypto_base import AuthenticatedData, CryptoError, rotate_left, xor_bytes
+from crypto_base import AuthenticatedData, AuthenticationError, CryptoError, StreamingMAC, rotate_left, xor_bytes, writable_view
 @dataclass
 class AuthenticatedData:
     ciphertext: bytes
     tag: bytes
 
+DEFAULT_RATE = 8      # bytes per permutation, the original parameter set
+MAX_RATE = 168        # keeps a 256-bit capacity in the 1600-bit state
+LANE_CHUNK = 1 << 16  # bytes converted to 64-bit lanes at a time by _process_blocks
+_SWAP_LANES = sys.byteorder == "little"
+MAC_DOMAIN = 1 << 63  # capacity-lane flag separating the MAC from the AEAD modes
+_MASK = (1 << 64) - 1
+
+
+def _rho_pi_table():
+    """(source lane, rotation) for every lane after permutation's in-place rho/pi chain"""
+    lanes = [(i, 0) for i in range(25)]
+    temp = lanes[1]
+    for y in range(1, 5):
+        for x in range(5):
+            next_pos = (x + 3 * y) % 5 + 5 * x
+            new_temp = lanes[next_pos]
+            lanes[next_pos] = (temp[0], (temp[1] + (x + y * 2) % 64) % 64)
+            temp = new_temp
+    return lanes
+
+RHO_PI = _rho_pi_table()
+# Per output lane: source lane, its theta column, and the two rotation shifts
+_GATHER = [(source, source % 5, shift, 64 - shift) for source, shift in RHO_PI]
+# Per output lane: itself and the next two lanes of its row, for chi
+_CHI = [(i, i - i % 5 + (i + 1) % 5, i - i % 5 + (i + 2) % 5) for i in range(25)]
+
 class Elephant:
-    def __init__(self):
+    def __init__(self, rate: int = DEFAULT_RATE, log_file: Optional[str] = None):
+        """Create a cipher instance.
+
+        rate selects the parameter set for encrypt/decrypt: the default
+        8-byte rate is the original wire format, while a wide rate (a
+        multiple of 8 up to MAX_RATE, e.g. 136 or 168) XORs that many bytes
+        across the leading lanes per permutation. Ciphertexts of the two
+        parameter sets are not interchangeable.
+
+        log_file turns on the debug trace: encrypt/decrypt append their
+        keystream and tag states to it. Those states are secret-derived,
+        so it is off by default and meant for debugging only.
+        """
+        if rate % 8 or not DEFAULT_RATE <= rate <= MAX_RATE:
+            raise ValueError("Rate must be a multiple of 8 between 8 and {}".format(MAX_RATE))
+        self.rate = rate
         self.ROUNDS = 12
         self.STATE_SIZE = 25  # 5x5 state
         self.round_constants = [
@@ -18,11 +61,13 @@ class Elephant:
             0x8000000080008081, 0x8000000000008009, 0x000000000000008A,
             0x0000000000000088, 0x0000000080008009, 0x000000008000000A
         ]
-        self.log_file = "elephant_debug.log"
+        self.log_file = log_file
     def xor_bytes(a: bytes, b: bytes) -> bytes:
         """XOR two byte strings"""
         return bytes(x ^ y for x, y in zip(a, b))
     def log(self, message: str) -> None:
+        if self.log_file is None:
+            return
         with open(self.log_file, "a") as f:
             f.write(message + "\n")
     def initialize_state(self) -> List[int]:
@@ -76,6 +121,39 @@ class Elephant:
                     state[start + x] = t[x] ^ ((~t[(x + 1) % 5]) & t[(x + 2) % 5])
             state[0] ^= self.round_constants[round_idx]
 
+    def permutation_pair(self, state: List[int], tag_state: List[int]) -> None:
+        """Apply the permutation to state and tag_state in one interleaved pass.
+
+        Same result as permutation(state) followed by permutation(tag_state),
+        but both states share the round loop and the precomputed rho/pi and
+        chi tables, with theta folded into the rho/pi gather. Equal states
+        (which the AEAD modes keep absorbing the same blocks into) are
+        permuted once and copied.
+        """
+        if state == tag_state:
+            states = (state,)
+        else:
+            states = (state, tag_state)
+        mask = _MASK
+        for constant in self.round_constants[:self.ROUNDS]:
+            for s in states:
+                c0 = s[0] ^ s[5] ^ s[10] ^ s[15] ^ s[20]
+                c1 = s[1] ^ s[6] ^ s[11] ^ s[16] ^ s[21]
+                c2 = s[2] ^ s[7] ^ s[12] ^ s[17] ^ s[22]
+                c3 = s[3] ^ s[8] ^ s[13] ^ s[18] ^ s[23]
+                c4 = s[4] ^ s[9] ^ s[14] ^ s[19] ^ s[24]
+                d = (c4 ^ (((c1 << 1) | (c1 >> 63)) & mask),
+                     c0 ^ (((c2 << 1) | (c2 >> 63)) & mask),
+                     c1 ^ (((c3 << 1) | (c3 >> 63)) & mask),
+                     c2 ^ (((c4 << 1) | (c4 >> 63)) & mask),
+                     c3 ^ (((c0 << 1) | (c0 >> 63)) & mask))
+                b = [(((v := s[source] ^ d[column]) << shift) | (v >> back)) & mask
+                     for source, column, shift, back in _GATHER]
+                s[:] = [b[i] ^ (~b[j] & b[k]) for i, j, k in _CHI]
+                s[0] ^= constant
+        if len(states) == 1:
+            tag_state[:] = state
+
     def process_associated_data(self, state: List[int], associated_data: bytes) -> None:
         """Process associated data into state"""
         if associated_data:
@@ -88,6 +166,103 @@ class Elephant:
             for i in range(len(state)):
                 state[i] ^= state_copy[i]
 
+    def _wide_initial_states(self, key: bytes, nonce: bytes, associated_data: Optional[bytes]):
+        """Initial (state, tag_state) for the wide-rate parameter set.
+
+        Key and nonce fill lanes 0-2 and the rate is written to the last
+        capacity lane, so each rate gets its own domain.
+        """
+        state = self.initialize_state()
+        state[0], state[1], state[2] = struct.unpack(">3Q", key + nonce)
+        state[self.STATE_SIZE - 1] = self.rate
+        self.permutation(state)
+        if associated_data:
+            lanes = self.rate // 8
+            fmt = ">{}Q".format(lanes)
+            state_copy = state.copy()
+            for i in range(0, len(associated_data), self.rate):
+                block = associated_data[i:i + self.rate].ljust(self.rate, b'\x00')
+                for j, value in enumerate(struct.unpack(fmt, block)):
+                    state[j] ^= value
+                self.permutation(state)
+            for i in range(len(state)):
+                state[i] ^= state_copy[i]
+        return state, state.copy()
+
+    def _wide_process(self, data, out, state: List[int], tag_state: List[int],
+                     decrypting: bool) -> None:
+        """Wide-rate keystream XOR: rate bytes of data per permutation pair.
+
+        out may be the same writable buffer as data for in-place use. Both
+        states absorb the zero-padded plaintext block across all rate lanes.
+        """
+        rate = self.rate
+        lanes = rate // 8
+        fmt = ">{}Q".format(lanes)
+        length = len(data)
+        for i in range(0, length, rate):
+            n = min(rate, length - i)
+            block = bytes(data[i:i + n])
+            values = struct.unpack(fmt, block if n == rate else block.ljust(rate, b'\x00'))
+            out_block = struct.pack(fmt, *[v ^ k for v, k in zip(values, state)])[:n]
+            out[i:i + n] = out_block
+            if decrypting:
+                padded = out_block if n == rate else out_block.ljust(rate, b'\x00')
+                values = struct.unpack(fmt, padded)
+            for j in range(lanes):
+                state[j] ^= values[j]
+                tag_state[j] ^= values[j]
+            self.permutation_pair(state, tag_state)
+
+    def _process_blocks(self, data, out, state: List[int], tag_state: List[int],
+                        decrypting: bool, chained: bool = False, iv: int = 0) -> None:
+        """Shared 8-byte block loop of the default and CBC modes.
+
+        data is read as big-endian 64-bit lanes, LANE_CHUNK bytes at a
+        time, and the result is written to out, a presized buffer of the
+        same length (it may be data itself). Only the tail block is padded.
+        The default mode absorbs the plaintext; with chained=True (CBC,
+        iv as a 64-bit int) each block is also XORed with the previous
+        ciphertext lane and the ciphertext is absorbed instead.
+        """
+        permutation_pair = self.permutation_pair
+        absorb_output = decrypting != chained
+        previous = iv if chained else 0
+        length = len(data)
+        full_end = length - length % 8
+        source = memoryview(data)
+        for start in range(0, full_end, LANE_CHUNK):
+            end = min(start + LANE_CHUNK, full_end)
+            lanes = array('Q')
+            lanes.frombytes(source[start:end])
+            if _SWAP_LANES:
+                lanes.byteswap()
+            for j in range(len(lanes)):
+                value = lanes[j]
+                result = value ^ state[0] ^ previous
+                lanes[j] = result
+                absorbed = result if absorb_output else value
+                if chained:
+                    previous = absorbed
+                state[0] ^= absorbed
+                tag_state[0] ^= absorbed
+                permutation_pair(state, tag_state)
+            if _SWAP_LANES:
+                lanes.byteswap()
+            out[start:end] = memoryview(lanes).cast('B')
+        if full_end < length:
+            tail = length - full_end
+            shift = 8 * (8 - tail)
+            value = int.from_bytes(source[full_end:], "big") << shift
+            result = value ^ state[0] ^ previous
+            out[full_end:] = (result >> shift).to_bytes(tail, "big")
+            # Only the bytes actually produced are absorbed, zero-padded
+            absorbed = result >> shift << shift if absorb_output else value
+            state[0] ^= absorbed
+            tag_state[0] ^= absorbed
+            permutation_pair(state, tag_state)
+        source.release()
+
     def encrypt(self, plaintext: bytes, key: bytes, nonce: bytes,
                associated_data: Optional[bytes] = None) -> AuthenticatedData:
         """Encrypt data and generate authentication tag"""
@@ -95,6 +270,11 @@ class Elephant:
             raise ValueError("Key must be 16 bytes")
         if len(nonce) != 8:
             raise ValueError("Nonce must be 8 bytes")
+        if self.rate != DEFAULT_RATE:
+            state, tag_state = self._wide_initial_states(key, nonce, associated_data)
+            ciphertext = bytearray(len(plaintext))
+            self._wide_process(plaintext, ciphertext, state, tag_state, decrypting=False)
+            return AuthenticatedData(bytes(ciphertext), struct.pack(">Q", tag_state[0]))
         # Initialize state with key and nonce
         state = self.bytes_to_state(key + nonce)
         self.permutation(state)
@@ -106,30 +286,8 @@ class Elephant:
         
         # Encrypt plaintext
         self.log("encrypt first : state = " + str(state))
-        ciphertext = bytearray()
-        for i in range(0, len(plaintext), 8):
-            original_len = len(plaintext[i:i + 8])
-            is_last_block = (i + 8 >= len(plaintext))
-            
-            # Pad block with zeros
-            block = plaintext[i:i + 8].ljust(8, b'\x00')
-            block_val = struct.unpack(">Q", block)[0]
-            
-            keystream = state[0]
-            encrypted_block = struct.pack(">Q", block_val ^ keystream)
-            ciphertext.extend(encrypted_block[:original_len])
-            
-            # For the last block, make sure we use the same length as the original data
-            if is_last_block:
-                state_update_val = struct.unpack(">Q", plaintext[i:i + original_len].ljust(8, b'\x00'))[0]
-                state[0] ^= state_update_val
-                tag_state[0] ^= state_update_val
-            else:
-                state[0] ^= block_val
-                tag_state[0] ^= block_val
-                
-            self.permutation(state)
-            self.permutation(tag_state)
+        ciphertext = bytearray(len(plaintext))
+        self._process_blocks(plaintext, ciphertext, state, tag_state, decrypting=False)
         self.log("encrypt : last tag_state = " + str(tag_state))
         tag = struct.pack(">Q", tag_state[0])
         return AuthenticatedData(bytes(ciphertext), tag)
@@ -143,6 +301,13 @@ class Elephant:
             raise ValueError("Nonce must be 8 bytes")
         if len(tag) != 8:
             raise ValueError("Tag must be 8 bytes")
+        if self.rate != DEFAULT_RATE:
+            state, tag_state = self._wide_initial_states(key, nonce, associated_data)
+            plaintext = bytearray(len(ciphertext))
+            self._wide_process(ciphertext, plaintext, state, tag_state, decrypting=True)
+            if not hmac.compare_digest(struct.pack(">Q", tag_state[0]), tag):
+                raise AuthenticationError("Authentication failed")
+            return bytes(plaintext)
 
         # Initialize state with key and nonce
         state = self.bytes_to_state(key + nonce)
@@ -156,42 +321,157 @@ class Elephant:
         
         # Decrypt ciphertext
         self.log("decrppt first state  = " + str(state))
-        plaintext = bytearray()
-        for i in range(0, len(ciphertext), 8):
-            original_len = len(ciphertext[i:i + 8])
-            is_last_block = (i + 8 >= len(ciphertext))
-            
-            # Pad block with zeros
-            block = ciphertext[i:i + 8].ljust(8, b'\x00')
-            block_val = struct.unpack(">Q", block)[0]
-            
-            keystream = state[0]
-            decrypted_val = block_val ^ keystream
-            decrypted_block = struct.pack(">Q", decrypted_val)
-            plaintext.extend(decrypted_block[:original_len])
-            
-            # For the last block, same length should be used as the original data
-            if is_last_block:
-                state_update_val = struct.unpack(">Q", decrypted_block[:original_len].ljust(8, b'\x00'))[0]
-                state[0] ^= state_update_val
-                tag_state[0] ^= state_update_val
-            else:
-                state[0] ^= decrypted_val
-                tag_state[0] ^= decrypted_val
-                
-            self.permutation(state)
-            self.permutation(tag_state)
+        plaintext = bytearray(len(ciphertext))
+        self._process_blocks(ciphertext, plaintext, state, tag_state, decrypting=True)
         self.log("decrypt : last tag_state = " + str(tag_state))
         # Verify tag
         computed_tag = struct.pack(">Q", tag_state[0])
         if not hmac.compare_digest(computed_tag, tag):
-            raise ValueError("Authentication failed")
+            raise AuthenticationError("Authentication failed")
         
         return bytes(plaintext)
     
+    def _process_in_place(self, view: memoryview, state: List[int], tag_state: List[int],
+                          decrypting: bool) -> None:
+        """XOR the keystream into view block by block, absorbing the plaintext"""
+        if self.rate != DEFAULT_RATE:
+            self._wide_process(view, view, state, tag_state, decrypting)
+            return
+        self._process_blocks(view, view, state, tag_state, decrypting)
+
+    def _initial_states(self, key: bytes, nonce: bytes, associated_data: Optional[bytes]):
+        if self.rate != DEFAULT_RATE:
+            return self._wide_initial_states(key, nonce, associated_data)
+        state = self.bytes_to_state(key + nonce)
+        self.permutation(state)
+        if associated_data:
+            self.process_associated_data(state, associated_data)
+        return state, state.copy()
+
+    def encrypt_into(self, buffer, key: bytes, nonce: bytes,
+                     associated_data: Optional[bytes] = None) -> bytes:
+        """Encrypt a writable buffer (bytearray, memoryview, mmap) in place and return the tag.
+
+        Produces the same ciphertext and tag as encrypt() without allocating
+        a second copy of the data.
+        """
+        if len(key) != 16:
+            raise ValueError("Key must be 16 bytes")
+        if len(nonce) != 8:
+            raise ValueError("Nonce must be 8 bytes")
+        with writable_view(buffer) as view:
+            state, tag_state = self._initial_states(key, nonce, associated_data)
+            self._process_in_place(view, state, tag_state, decrypting=False)
+        return struct.pack(">Q", tag_state[0])
+
+    def decrypt_into(self, buffer, key: bytes, nonce: bytes, tag: bytes,
+                     associated_data: Optional[bytes] = None) -> None:
+        """Decrypt a writable buffer in place and verify the tag.
+
+        Elephant only knows the tag after the last block, so on failure the
+        buffer is encrypted again and left holding the original ciphertext.
+        """
+        if len(key) != 16:
+            raise ValueError("Key must be 16 bytes")
+        if len(nonce) != 8:
+            raise ValueError("Nonce must be 8 bytes")
+        if len(tag) != 8:
+            raise ValueError("Tag must be 8 bytes")
+        with writable_view(buffer) as view:
+            state, tag_state = self._initial_states(key, nonce, associated_data)
+            self._process_in_place(view, state, tag_state, decrypting=True)
+            computed_tag = struct.pack(">Q", tag_state[0])
+            if not hmac.compare_digest(computed_tag, tag):
+                state, tag_state = self._initial_states(key, nonce, associated_data)
+                self._process_in_place(view, state, tag_state, decrypting=False)
+                raise AuthenticationError("Authentication failed")
+
+    def _mac_absorb(self, state: List[int], data) -> None:
+        """Absorb whole rate blocks of data into the leading lanes, one permutation each"""
+        width = self.rate // 8
+        permutation = self.permutation
+        step = LANE_CHUNK - LANE_CHUNK % self.rate
+        source = memoryview(data)
+        for start in range(0, len(source), step):
+            lanes = array('Q')
+            lanes.frombytes(source[start:start + step])
+            if _SWAP_LANES:
+                lanes.byteswap()
+            for i in range(0, len(lanes), width):
+                for j in range(width):
+                    state[j] ^= lanes[i + j]
+                permutation(state)
+        source.release()
+
+    def _mac_pad(self, tail: bytes) -> bytes:
+        """10* padding to a whole rate block, so every message length absorbs differently"""
+        return (tail + b'\x80').ljust(self.rate, b'\x00')
+
+    def mac_init(self, key: bytes, nonce: bytes,
+                 associated_data: Optional[bytes] = None) -> StreamingMAC:
+        """Streaming authentication-only mode: update() with data, then digest() for an 8-byte tag.
+
+        Only a single state absorbs the message, rate bytes per permutation;
+        no keystream or ciphertext is produced, so it costs half of
+        encrypt() per block. Key and nonce fill lanes 0-2 and MAC_DOMAIN
+        marks the last capacity lane, so tags never coincide with AEAD tags.
+        """
+        if len(key) != 16:
+            raise ValueError("Key must be 16 bytes")
+        if len(nonce) != 8:
+            raise ValueError("Nonce must be 8 bytes")
+        state = self.initialize_state()
+        state[0], state[1], state[2] = struct.unpack(">3Q", key + nonce)
+        state[self.STATE_SIZE - 1] = MAC_DOMAIN | self.rate
+        self.permutation(state)
+        if associated_data:
+            full = len(associated_data) - len(associated_data) % self.rate
+            self._mac_absorb(state, associated_data[:full])
+            self._mac_absorb(state, self._mac_pad(associated_data[full:]))
+        state[self.STATE_SIZE - 2] ^= 1     # associated data ends here
+
+        def finish(tail: bytes) -> bytes:
+            self._mac_absorb(state, self._mac_pad(tail))
+            return struct.pack(">Q", state[0])
+        return StreamingMAC(self.rate, lambda block: self._mac_absorb(state, block), finish, state)
+
+    def mac(self, data, key: bytes, nonce: bytes,
+            associated_data: Optional[bytes] = None) -> bytes:
+        """8-byte tag authenticating data (any bytes-like object) without encrypting it"""
+        stream = self.mac_init(key, nonce, associated_data)
+        stream.update(data)
+        return stream.digest()
+
+    def verify_mac(self, data, key: bytes, nonce: bytes, tag: bytes,
+                   associated_data: Optional[bytes] = None) -> None:
+        """Raise ValueError unless tag is the MAC of data"""
+        if len(tag) != 8:
+            raise ValueError("Tag must be 8 bytes")
+        stream = self.mac_init(key, nonce, associated_data)
+        stream.update(data)
+        stream.verify(tag)
+
+    def encrypt_many(self, messages, key: bytes, nonces, associated_data: Optional[bytes] = None,
+                     backend: Optional[str] = None) -> List[AuthenticatedData]:
+        """Encrypt a batch (one nonce per message) on the backend expected to be fastest.
+
+        See backends.Dispatcher; backend forces an engine by name and
+        backends.dispatcher_for(cipher).last_backend reports the one used.
+        """
+        from backends import dispatcher_for
+        return dispatcher_for(self).encrypt_many(messages, key, nonces, associated_data, backend)
+
+    def decrypt_many(self, ciphertexts, key: bytes, nonces, tags, associated_data: Optional[bytes] = None,
+                     backend: Optional[str] = None) -> List[bytes]:
+        """Decrypt a batch; raises ValueError if any tag fails"""
+        from backends import dispatcher_for
+        return dispatcher_for(self).decrypt_many(ciphertexts, key, nonces, tags, associated_data, backend)
+
     def encrypt_cbc(self, plaintext: bytes, key: bytes, iv: bytes, 
                 associated_data: Optional[bytes] = None) -> AuthenticatedData:
         """CBC mode encryption"""
+        if self.rate != DEFAULT_RATE:
+            raise ValueError("CBC and OFB modes use the default 8-byte rate")
         if len(key) != 16:
             raise ValueError("Key must be 16 bytes")
         if len(iv) != 8:
@@ -205,36 +485,9 @@ class Elephant:
             self.process_associated_data(state, associated_data)
         
         tag_state = state.copy()
-        ciphertext = bytearray()
-        previous = iv
-
-        # Process plaintext in blocks
-        for i in range(0, len(plaintext), 8):
-            original_len = len(plaintext[i:i + 8])
-            is_last_block = (i + 8 >= len(plaintext))
-            
-            block = plaintext[i:i + 8].ljust(8, b'\x00')
-            xored = xor_bytes(block, previous)
-            
-            block_val = struct.unpack(">Q", xored)[0]
-            keystream = state[0]
-            encrypted_val = block_val ^ keystream
-            encrypted_block = struct.pack(">Q", encrypted_val)
-            
-            ciphertext.extend(encrypted_block[:original_len])
-            previous = encrypted_block
-            
-            # Handle last block specially
-            if is_last_block:
-                state_update_val = struct.unpack(">Q", encrypted_block[:original_len].ljust(8, b'\x00'))[0]
-                state[0] ^= state_update_val
-                tag_state[0] ^= state_update_val
-            else:
-                state[0] ^= encrypted_val
-                tag_state[0] ^= encrypted_val
-            
-            self.permutation(state)
-            self.permutation(tag_state)
+        ciphertext = bytearray(len(plaintext))
+        self._process_blocks(plaintext, ciphertext, state, tag_state, decrypting=False,
+                             chained=True, iv=struct.unpack(">Q", iv)[0])
 
         tag = struct.pack(">Q", tag_state[0])
         return AuthenticatedData(bytes(ciphertext), tag)
@@ -242,6 +495,8 @@ class Elephant:
     def decrypt_cbc(self, ciphertext: bytes, key: bytes, iv: bytes, tag: bytes,
                     associated_data: Optional[bytes] = None) -> bytes:
         """CBC mode decryption"""
+        if self.rate != DEFAULT_RATE:
+            raise ValueError("CBC and OFB modes use the default 8-byte rate")
         if len(key) != 16:
             raise ValueError("Key must be 16 bytes")
         if len(iv) != 8:
@@ -257,74 +512,68 @@ class Elephant:
             self.process_associated_data(state, associated_data)
         
         tag_state = state.copy()
-        plaintext = bytearray()
-        previous = iv
-
-        # Process ciphertext in blocks
-        for i in range(0, len(ciphertext), 8):
-            original_len = len(ciphertext[i:i + 8])
-            is_last_block = (i + 8 >= len(ciphertext))
-            
-            block = ciphertext[i:i + 8].ljust(8, b'\x00')
-            block_val = struct.unpack(">Q", block)[0]
-            
-            keystream = state[0]
-            decrypted_val = block_val ^ keystream
-            decrypted_block = struct.pack(">Q", decrypted_val)
-            
-            plaintext_block = xor_bytes(decrypted_block, previous)
-            plaintext.extend(plaintext_block[:original_len])
-            previous = block
-            
-            # Handle last block specially
-            if is_last_block:
-                state_update_val = struct.unpack(">Q", block[:original_len].ljust(8, b'\x00'))[0]
-                state[0] ^= state_update_val
-                tag_state[0] ^= state_update_val
-            else:
-                state[0] ^= block_val
-                tag_state[0] ^= block_val
-            
-            self.permutation(state)
-            self.permutation(tag_state)
+        plaintext = bytearray(len(ciphertext))
+        self._process_blocks(ciphertext, plaintext, state, tag_state, decrypting=True,
+                             chained=True, iv=struct.unpack(">Q", iv)[0])
 
         # Verify tag
         computed_tag = struct.pack(">Q", tag_state[0])
         if not hmac.compare_digest(computed_tag, tag):
-            raise ValueError("Authentication failed")
+            raise AuthenticationError("Authentication failed")
 
         return bytes(plaintext)
 
+    def ofb_keystream(self, key: bytes, iv: bytes, length: int,
+                      associated_data: Optional[bytes] = None) -> bytes:
+        """OFB keystream for a message of the given length.
+
+        It depends only on key, IV and associated data, so it can be
+        computed before the message is known (see keystream_pool).
+        """
+        if self.rate != DEFAULT_RATE:
+            raise ValueError("CBC and OFB modes use the default 8-byte rate")
+        if len(key) != 16:
+            raise ValueError("Key must be 16 bytes")
+        if len(iv) != 8:
+            raise ValueError("IV must be 8 bytes")
+        keystream = bytearray(-(-length // 8) * 8)
+        previous = iv
+        for i in range(0, length, 8):
+            previous = self.encrypt(previous, key, iv, associated_data).ciphertext
+            keystream[i:i + 8] = previous
+        del keystream[length:]
+        return bytes(keystream)
+
     def encrypt_ofb(self, plaintext: bytes, key: bytes, iv: bytes,
-                    associated_data: Optional[bytes] = None) -> AuthenticatedData:
-        """OFB mode encryption"""
+                    associated_data: Optional[bytes] = None,
+                    keystream: Optional[bytes] = None) -> AuthenticatedData:
+        """OFB mode encryption; keystream may be precomputed with ofb_keystream()"""
+        if self.rate != DEFAULT_RATE:
+            raise ValueError("CBC and OFB modes use the default 8-byte rate")
         if len(key) != 16:
             raise ValueError("Key must be 16 bytes")
         if len(iv) != 8:
             raise ValueError("IV must be 8 bytes")
+        if keystream is None:
+            keystream = self.ofb_keystream(key, iv, len(plaintext), associated_data)
+        elif len(keystream) < len(plaintext):
+            raise ValueError("Keystream shorter than the message")
 
-        blocks = [plaintext[i:i+8] for i in range(0, len(plaintext), 8)]
-        previous = iv
-        ciphertext = bytearray()
-        
+        ciphertext = xor_bytes(plaintext, keystream)
         state = self.bytes_to_state(key + iv)
         self.permutation(state)
         tag_state = state.copy()
 
-        for block in blocks:
-            keystream = self.encrypt(previous, key, iv, associated_data).ciphertext
-            encrypted = xor_bytes(block, keystream[:len(block)])
-            ciphertext.extend(encrypted)
-            previous = keystream
-            
-            tag_state[0] ^= struct.unpack(">Q", encrypted.ljust(8, b'\x00'))[0]
+        for i in range(0, len(ciphertext), 8):
+            tag_state[0] ^= struct.unpack(">Q", ciphertext[i:i + 8].ljust(8, b'\x00'))[0]
             self.permutation(tag_state)
 
         tag = struct.pack(">Q", tag_state[0])
-        return AuthenticatedData(bytes(ciphertext), tag)
+        return AuthenticatedData(ciphertext, tag)
 
     def decrypt_ofb(self, ciphertext: bytes, key: bytes, iv: bytes, tag: bytes,
-                    associated_data: Optional[bytes] = None) -> bytes:
+                    associated_data: Optional[bytes] = None,
+                    keystream: Optional[bytes] = None) -> bytes:
         """OFB mode decryption"""
         # In OFB mode, decryption is the same as encryption
-        return self.encrypt_ofb(ciphertext, key, iv, associated_data).ciphertext
\ No newline at end of file
+        return self.encrypt_ofb(ciphertext, key, iv, associated_data, keystream).ciphertext
\ No newline at end of file
@@ -2,66 +2,290 @@
 import os
 import hashlib
 import hmac
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from crypto_base import AuthenticationError
 from isap import ISAP
 from elephant import Elephant
+from read_ahead import DEFAULT_DEPTH, PipelineStats, ReadAhead
+from checkpoint import (CHECKPOINT_SUFFIX, DEFAULT_INTERVAL, Checkpointer, key_id, load_checkpoint,
+                        remove_checkpoint)
+
+TREE_CHUNK_SIZE = 1 << 20       # 1 MiB leaves
+TREE_SUFFIX = ".merkle"
+TREE_MAGIC = b"MRKL1"
+TREE_HEADER = struct.Struct(">5sBQQQQ")  # magic, algorithm, chunk size, file size, mtime_ns, leaves
+TREE_ALGORITHMS = {'ISAP': 1, 'Elephant': 2}
+READ_CHUNK_SIZE = 1 << 20       # bytes read at a time when streaming a whole file
+ELEPHANT_TAG_SIZE = 8
+
+def leaf_hash(chunk: bytes) -> bytes:
+    """Merkle leaf hash (domain-separated from inner nodes)"""
+    return hashlib.sha256(b"\x00" + chunk).digest()
+
+def merkle_root(leaves: List[bytes]) -> bytes:
+    """Root of a binary Merkle tree; an odd node is carried up unchanged"""
+    if not leaves:
+        return leaf_hash(b"")
+    level = list(leaves)
+    while len(level) > 1:
+        paired = [hashlib.sha256(b"\x01" + level[i] + level[i + 1]).digest()
+                  for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            paired.append(level[-1])
+        level = paired
+    return level[0]
+
+@dataclass
+class TreeVerification:
+    valid: bool
+    corrupted_ranges: List[Tuple[int, int]] = field(default_factory=list)  # [start, end) byte offsets
+    rehashed_chunks: int = 0
+
+    def __bool__(self) -> bool:
+        return self.valid
 
 class FileIntegrity:
     @staticmethod
-    def generate_file_extract(filepath: str, key: bytes, nonce: bytes, algorithm: str) -> bytes:
-        """Generate and encrypt file integrity extract using the specified algorithm."""
+    def generate_file_extract(filepath: str, key: bytes, nonce: bytes, algorithm: str,
+                              mac: bool = False, depth: int = DEFAULT_DEPTH,
+                              stats: Optional[PipelineStats] = None,
+                              checkpoint_interval: Optional[float] = None,
+                              resume: bool = False) -> bytes:
+        """Generate and encrypt file integrity extract using the specified algorithm.
+
+        By default the SHA-256 digest is sealed (ciphertext + tag). With
+        mac=True the file is streamed through the cipher's MAC-only mode and
+        the extract is just the tag; only Elephant is accepted, since the
+        ISAP tag does not cover the whole file. The file is read ahead by a
+        background thread into depth buffers; pass stats to collect its
+        I/O wait and compute times.
+
+        The pure-Python MAC of a large file can run for hours, so in mac
+        mode its state is saved to filepath + CHECKPOINT_SUFFIX every
+        checkpoint_interval seconds, and resume=True continues from there
+        with the same result. The checkpoint holds the keyed MAC state, so
+        it is secret material: it is created owner-only and removed once
+        the tag is out.
+        """
+        if (checkpoint_interval is not None or resume) and not mac:
+            raise ValueError("Only MAC-only extracts can be checkpointed; SHA-256 state cannot be saved")
+        stream = FileIntegrity._mac_stream(key, nonce, algorithm) if mac else hashlib.sha256()
+        checkpoint_path = filepath + CHECKPOINT_SUFFIX
+        stat = os.stat(filepath)
+        job = {"kind": "mac", "algorithm": algorithm, "key_id": key_id(key), "nonce": nonce.hex(),
+               "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        offset = 0
+        if resume:
+            saved = load_checkpoint(checkpoint_path, **job)
+            stream.restore(saved["mac"])
+            offset = saved["offset"]
+        if resume and checkpoint_interval is None:
+            checkpoint_interval = DEFAULT_INTERVAL
+        checkpointer = Checkpointer(checkpoint_path, checkpoint_interval)
+
+        # Buffers are sized for the file as it is now; a file still growing is read to its end anyway
+        chunk_size = max(1, min(READ_CHUNK_SIZE, stat.st_size))
         with open(filepath, 'rb') as file:
-            file_content = file.read()
-        
-        file_hash = hashlib.sha256(file_content).digest()
-        
-        if algorithm == 'ISAP':
+            file.seek(offset)
+            with ReadAhead(file, chunk_size, depth, stats=stats) as reader:
+                for chunk in reader:
+                    stream.update(chunk)
+                    offset += len(chunk)
+                    if checkpointer.due():
+                        checkpointer.save(dict(job, offset=offset, mac=stream.snapshot()))
+        if mac:
+            remove_checkpoint(checkpoint_path)
+            return stream.digest()
+        return FileIntegrity._seal(stream.digest(), key, nonce, algorithm)
+
+    @staticmethod
+    def append_extract_to_file(filepath: str, extract: bytes) -> None:
+        with open(filepath, 'ab') as file:
+            file.write(extract)
+
+    @staticmethod
+    def verify_file_integrity(filepath: str, key: bytes, nonce: bytes, algorithm: str,
+                              mac: bool = False, depth: int = DEFAULT_DEPTH,
+                              stats: Optional[PipelineStats] = None) -> bool:
+        """Check a file carrying an appended extract; mac must match generate_file_extract"""
+        if mac:
+            stream = FileIntegrity._mac_stream(key, nonce, algorithm)
+            extract_size = ELEPHANT_TAG_SIZE
+        elif algorithm == 'ISAP':
             if len(nonce) != 16:
                 raise ValueError("ISAP requires 16-byte nonce")
-            isap = ISAP()
-            authenticated_data = isap.encrypt(file_hash, key, nonce)
+            # The extract is the sealed 32-byte digest followed by its tag
+            stream, extract_size = hashlib.sha256(), 32 + ISAP.TAG_SIZE
         elif algorithm == 'Elephant':
             if len(nonce) != 8:
                 raise ValueError("Elephant requires 8-byte nonce")
-            elephant = Elephant()
-            authenticated_data = elephant.encrypt(file_hash, key, nonce)
+            stream, extract_size = hashlib.sha256(), 32 + ELEPHANT_TAG_SIZE
         else:
             raise ValueError("Unsupported algorithm specified.")
+
+        # Stream the data part through the read-ahead pipeline, then read the extract
+        data_size = os.path.getsize(filepath) - extract_size
+        if data_size < 0:
+            return False
+        with open(filepath, 'rb') as file:
+            with ReadAhead(file, READ_CHUNK_SIZE, depth, limit=data_size, stats=stats) as reader:
+                for chunk in reader:
+                    stream.update(chunk)
+                    data_size -= len(chunk)
+            if data_size:
+                return False      # truncated while reading
+            encrypted_extract = file.read()
+        if mac:
+            return hmac.compare_digest(stream.digest(), encrypted_extract)
+
+        try:
+            decrypted_hash = FileIntegrity._unseal(encrypted_extract, key, nonce, algorithm)
+        except ValueError:
+            return False
         
-        return authenticated_data.ciphertext + authenticated_data.tag
+        recalculated_hash = stream.digest()
+        return hmac.compare_digest(decrypted_hash, recalculated_hash)
 
     @staticmethod
-    def append_extract_to_file(filepath: str, extract: bytes) -> None:
-        with open(filepath, 'ab') as file:
-            file.write(extract)
+    def _mac_stream(key: bytes, nonce: bytes, algorithm: str):
+        if algorithm == 'ISAP':
+            raise ValueError("MAC-only extracts require Elephant; the ISAP tag only covers the end of the data")
+        if algorithm != 'Elephant':
+            raise ValueError("Unsupported algorithm specified.")
+        if len(nonce) != 8:
+            raise ValueError("Elephant requires 8-byte nonce")
+        return Elephant().mac_init(key, nonce)
 
     @staticmethod
-    def verify_file_integrity(filepath: str, key: bytes, nonce: bytes, algorithm: str) -> bool:
-        with open(filepath, 'rb') as file:
-            file_content = file.read()
-        
-        encrypted_extract = file_content[-32:]
-        file_data = file_content[:-32]
-        
+    def _seal(data: bytes, key: bytes, nonce: bytes, algorithm: str,
+              associated_data: Optional[bytes] = None) -> bytes:
+        """Encrypt a digest with the selected cipher and return ciphertext + tag"""
         if algorithm == 'ISAP':
             if len(nonce) != 16:
                 raise ValueError("ISAP requires 16-byte nonce")
-            isap = ISAP()
-            ciphertext, tag = encrypted_extract[:16], encrypted_extract[16:]
-            try:
-                decrypted_hash = isap.decrypt(ciphertext, key, nonce, tag)
-            except ValueError:
-                return False
+            authenticated_data = ISAP().encrypt(data, key, nonce, associated_data)
         elif algorithm == 'Elephant':
             if len(nonce) != 8:
                 raise ValueError("Elephant requires 8-byte nonce")
-            elephant = Elephant()
-            ciphertext, tag = encrypted_extract[:16], encrypted_extract[16:]
-            try:
-                decrypted_hash = elephant.decrypt(ciphertext, key, nonce, tag)
-            except ValueError:
-                return False
+            authenticated_data = Elephant().encrypt(data, key, nonce, associated_data)
         else:
             raise ValueError("Unsupported algorithm specified.")
-        
-        recalculated_hash = hashlib.sha256(file_data).digest()
-        return hmac.compare_digest(decrypted_hash, recalculated_hash)
\ No newline at end of file
+        return authenticated_data.ciphertext + authenticated_data.tag
+
+    @staticmethod
+    def _unseal(sealed: bytes, key: bytes, nonce: bytes, algorithm: str,
+                associated_data: Optional[bytes] = None) -> bytes:
+        """Inverse of _seal; raises ValueError when authentication fails"""
+        if algorithm == 'ISAP':
+            if len(nonce) != 16:
+                raise ValueError("ISAP requires 16-byte nonce")
+            cipher, tag_size = ISAP(), ISAP.TAG_SIZE
+        elif algorithm == 'Elephant':
+            if len(nonce) != 8:
+                raise ValueError("Elephant requires 8-byte nonce")
+            cipher, tag_size = Elephant(), ELEPHANT_TAG_SIZE
+        else:
+            raise ValueError("Unsupported algorithm specified.")
+        if len(sealed) < tag_size:
+            raise AuthenticationError("Authentication failed")
+        return cipher.decrypt(sealed[:-tag_size], key, nonce, sealed[-tag_size:], associated_data)
+
+    @staticmethod
+    def hash_chunks(filepath: str, chunk_size: int, indices=None,
+                    workers: Optional[int] = None) -> List[bytes]:
+        """Leaf hashes for the given chunk indices (all chunks by default).
+
+        Each worker thread reads its own chunk with os.pread; hashlib drops
+        the GIL while hashing, so leaves are computed in parallel.
+        """
+        size = os.path.getsize(filepath)
+        if indices is None:
+            indices = range(-(-size // chunk_size))
+        fd = os.open(filepath, os.O_RDONLY)
+        try:
+            def hash_one(index):
+                return leaf_hash(os.pread(fd, chunk_size, index * chunk_size))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(hash_one, indices))
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def generate_tree_extract(filepath: str, key: bytes, nonce: bytes, algorithm: str,
+                              chunk_size: int = TREE_CHUNK_SIZE,
+                              workers: Optional[int] = None) -> bytes:
+        """Tree-mode extract: seal a Merkle root and keep the leaves in a sidecar.
+
+        The sidecar (filepath + TREE_SUFFIX) stores a header, the leaf hashes
+        and the sealed root. The header is passed as associated data, so the
+        recorded chunk size, file size and mtime are authenticated too.
+        Returns the sealed root.
+        """
+        if algorithm not in TREE_ALGORITHMS:
+            raise ValueError("Unsupported algorithm specified.")
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be positive")
+        stat = os.stat(filepath)
+        leaves = FileIntegrity.hash_chunks(filepath, chunk_size, workers=workers)
+        header = TREE_HEADER.pack(TREE_MAGIC, TREE_ALGORITHMS[algorithm], chunk_size,
+                                  stat.st_size, stat.st_mtime_ns, len(leaves))
+        sealed_root = FileIntegrity._seal(merkle_root(leaves), key, nonce, algorithm, header)
+
+        sidecar = filepath + TREE_SUFFIX
+        with open(sidecar + ".tmp", 'wb') as file:
+            file.write(header)
+            file.write(b"".join(leaves))
+            file.write(sealed_root)
+        os.replace(sidecar + ".tmp", sidecar)
+        return sealed_root
+
+    @staticmethod
+    def verify_tree_integrity(filepath: str, key: bytes, nonce: bytes, algorithm: str,
+                              full: bool = False,
+                              workers: Optional[int] = None) -> TreeVerification:
+        """Check a file against its tree-mode sidecar.
+
+        If size and mtime still match the sidecar only the sealed root and
+        leaf list are checked (pass full=True to rehash anyway). Otherwise
+        every chunk is rehashed in parallel and the byte ranges whose leaves
+        differ are reported.
+        """
+        size = os.path.getsize(filepath)
+        whole_file = [(0, size)] if size else []
+        try:
+            with open(filepath + TREE_SUFFIX, 'rb') as file:
+                sidecar = file.read()
+            header = sidecar[:TREE_HEADER.size]
+            magic, algorithm_id, chunk_size, recorded_size, mtime_ns, count = TREE_HEADER.unpack(header)
+        except (OSError, struct.error):
+            return TreeVerification(False, whole_file)
+        if magic != TREE_MAGIC or algorithm_id != TREE_ALGORITHMS.get(algorithm):
+            return TreeVerification(False, whole_file)
+
+        leaves_end = TREE_HEADER.size + 32 * count
+        leaves = [sidecar[i:i + 32] for i in range(TREE_HEADER.size, leaves_end, 32)]
+        try:
+            root = FileIntegrity._unseal(sidecar[leaves_end:], key, nonce, algorithm, header)
+        except ValueError:
+            return TreeVerification(False, whole_file)
+        if len(leaves) != count or not hmac.compare_digest(root, merkle_root(leaves)):
+            return TreeVerification(False, whole_file)
+
+        if not full and size == recorded_size and os.stat(filepath).st_mtime_ns == mtime_ns:
+            return TreeVerification(True)
+
+        current = FileIntegrity.hash_chunks(filepath, chunk_size, workers=workers)
+        ranges: List[Tuple[int, int]] = []
+        for index in range(max(len(current), len(leaves))):
+            if index < len(current) and index < len(leaves) and current[index] == leaves[index]:
+                continue
+            start = index * chunk_size
+            end = min((index + 1) * chunk_size, max(size, recorded_size))
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return TreeVerification(not ranges, ranges, len(current))
@@ -0,0 +1,276 @@
+# integrity_watch.py
+import heapq
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from file_integrity import FileIntegrity, TREE_SUFFIX
+
+CHANGED, COLD = 0, 1                # queue priorities, lower runs first
+DEFAULT_BUDGET_MB = 8.0             # background I/O budget in MB/s
+DEFAULT_COLD_INTERVAL = 24 * 3600   # re-verify untouched files once a day
+
+
+class PollingChangeFeed:
+    """Stand-in for an inotify-style feed: reports files whose size or mtime changed.
+
+    With require_sidecar=True (the default) only files that have a
+    tree-mode sidecar next to them are watched.
+    """
+
+    def __init__(self, roots: Iterable[str], require_sidecar: bool = True):
+        self.roots = list(roots)
+        self.require_sidecar = require_sidecar
+        self.snapshot: Dict[str, Tuple[int, int]] = {}
+
+    def files(self) -> Dict[str, Tuple[int, int]]:
+        current = {}
+        for root in self.roots:
+            for dirpath, _, filenames in os.walk(root):
+                present = set(filenames)
+                for name in filenames:
+                    if name.endswith(TREE_SUFFIX) or name.endswith(TREE_SUFFIX + ".tmp"):
+                        continue
+                    if self.require_sidecar and name + TREE_SUFFIX not in present:
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue    # removed while walking
+                    current[path] = (stat.st_size, stat.st_mtime_ns)
+        return current
+
+    def poll(self) -> List[str]:
+        """Paths that appeared or changed since the previous poll"""
+        current = self.files()
+        changed = [path for path, signature in current.items()
+                   if self.snapshot.get(path) != signature]
+        self.snapshot = current
+        return changed
+
+
+class RateLimiter:
+    """Token bucket measured in bytes per second"""
+
+    def __init__(self, bytes_per_second: float, clock=time.monotonic, sleep=time.sleep):
+        if bytes_per_second <= 0:
+            raise ValueError("I/O budget must be positive")
+        self.rate = bytes_per_second
+        self.capacity = bytes_per_second    # allow at most one second of burst
+        self.tokens = bytes_per_second
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+
+    def acquire(self, nbytes: int) -> float:
+        """Wait until nbytes may be read; returns the time spent waiting"""
+        now = self.clock()
+        # max() guards against wall clocks (the watcher's default) stepping backwards
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= nbytes
+        if self.tokens >= 0:
+            return 0.0
+        delay = -self.tokens / self.rate
+        self.sleep(delay)
+        return delay
+
+
+@dataclass
+class WatchStats:
+    backlog: int = 0
+    changed_backlog: int = 0
+    verified: int = 0             # lifetime counters, persisted across restarts
+    failures: int = 0
+    bytes_verified: int = 0
+    session_verified: int = 0     # since this process started
+    session_bytes: int = 0
+    throttled_seconds: float = 0.0
+    uptime: float = 0.0
+
+    @property
+    def verification_rate(self) -> float:
+        """Files verified per second of uptime"""
+        return self.session_verified / self.uptime if self.uptime else 0.0
+
+    @property
+    def byte_rate(self) -> float:
+        return self.session_bytes / self.uptime if self.uptime else 0.0
+
+
+class IntegrityWatcher:
+    """Long-running re-verification of sealed files (tree-mode sidecars).
+
+    Changed files are verified first; every other file is re-verified once
+    it has gone cold_interval seconds without a check. Each verification is
+    charged to an I/O budget in MB/s, and progress is persisted to
+    state_path so a restart carries on where it stopped.
+    """
+
+    def __init__(self, roots: Iterable[str], key: bytes, nonce: bytes, algorithm: str,
+                 state_path: str, io_budget_mb: float = DEFAULT_BUDGET_MB,
+                 cold_interval: float = DEFAULT_COLD_INTERVAL,
+                 feed: Optional[PollingChangeFeed] = None,
+                 verifier: Optional[Callable[[str, bool], bool]] = None,
+                 clock=time.time, sleep=time.sleep):
+        self.key = key
+        self.nonce = nonce
+        self.algorithm = algorithm
+        self.state_path = state_path
+        self.cold_interval = cold_interval
+        self.feed = feed or PollingChangeFeed(roots)
+        self.verifier = verifier or self._verify_tree
+        self.clock = clock
+        self.limiter = RateLimiter(io_budget_mb * 1024 * 1024, clock=clock, sleep=sleep)
+        self.started = clock()
+
+        self.queue: List[Tuple[int, float, int, str]] = []
+        self.queued: Dict[str, int] = {}     # path -> priority currently queued
+        self.sequence = 0
+        self.files: Dict[str, dict] = {}     # path -> last verification record
+        self.stats = WatchStats()
+        self.failed: List[str] = []
+        self._load_state()
+
+    def _verify_tree(self, path: str, changed: bool) -> bool:
+        if not os.path.exists(path + TREE_SUFFIX):
+            return False
+        # Cold files have unchanged mtimes, so force a full rehash to catch bit rot
+        return FileIntegrity.verify_tree_integrity(path, self.key, self.nonce,
+                                                   self.algorithm, full=not changed).valid
+
+    def _load_state(self) -> None:
+        try:
+            with open(self.state_path) as file:
+                saved = json.load(file)
+        except (OSError, ValueError):
+            return
+        self.files = saved.get("files", {})
+        counters = saved.get("counters", {})
+        self.stats.verified = counters.get("verified", 0)
+        self.stats.failures = counters.get("failures", 0)
+        self.stats.bytes_verified = counters.get("bytes_verified", 0)
+        self.failed = saved.get("failed", [])
+        # Files the previous run knew about count as unchanged until they differ
+        self.feed.snapshot = {path: (record["size"], record["mtime_ns"])
+                              for path, record in self.files.items()}
+
+    def save_state(self) -> None:
+        """Write progress atomically so a crash never leaves a torn state file"""
+        saved = {
+            "files": self.files,
+            "failed": self.failed,
+            "counters": {
+                "verified": self.stats.verified,
+                "failures": self.stats.failures,
+                "bytes_verified": self.stats.bytes_verified,
+            },
+        }
+        with open(self.state_path + ".tmp", "w") as file:
+            json.dump(saved, file)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def _enqueue(self, path: str, priority: int, due: float) -> None:
+        current = self.queued.get(path)
+        if current is not None and current <= priority:
+            return
+        self.queued[path] = priority     # a stale lower-priority entry is skipped when popped
+        self.sequence += 1
+        heapq.heappush(self.queue, (priority, due, self.sequence, path))
+
+    def scan(self) -> int:
+        """Pick up changes from the feed and schedule files that went cold"""
+        now = self.clock()
+        changed = self.feed.poll()
+        for path in changed:
+            self._enqueue(path, CHANGED, now)
+        for path in self.feed.snapshot:
+            record = self.files.get(path)
+            last = record["last_verified"] if record else 0.0
+            if now - last >= self.cold_interval:
+                self._enqueue(path, COLD, last)
+        return len(changed)
+
+    def step(self) -> Optional[str]:
+        """Verify the next queued file; returns its path or None when idle"""
+        while self.queue:
+            priority, _, _, path = heapq.heappop(self.queue)
+            if self.queued.get(path) != priority:
+                continue
+            del self.queued[path]
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.files.pop(path, None)
+                continue
+
+            self.stats.throttled_seconds += self.limiter.acquire(stat.st_size)
+            ok = self.verifier(path, priority == CHANGED)
+            self.files[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                                "last_verified": self.clock(), "ok": ok}
+            self.stats.verified += 1
+            self.stats.bytes_verified += stat.st_size
+            self.stats.session_verified += 1
+            self.stats.session_bytes += stat.st_size
+            if ok:
+                if path in self.failed:
+                    self.failed.remove(path)
+            else:
+                self.stats.failures += 1
+                if path not in self.failed:
+                    self.failed.append(path)
+            return path
+        return None
+
+    def counters(self) -> WatchStats:
+        """Current backlog, rates and failure counters"""
+        self.stats.backlog = len(self.queued)
+        self.stats.changed_backlog = sum(1 for p in self.queued.values() if p == CHANGED)
+        self.stats.uptime = self.clock() - self.started
+        return self.stats
+
+    def run(self, stop: Optional[threading.Event] = None, poll_interval: float = 5.0,
+            save_every: int = 50) -> None:
+        """Main loop: poll, verify until idle or the next poll is due, persist"""
+        stop = stop or threading.Event()
+        since_save = 0
+        while not stop.is_set():
+            self.scan()
+            deadline = self.clock() + poll_interval
+            while not stop.is_set() and self.clock() < deadline:
+                if self.step() is None:
+                    break
+                since_save += 1
+                if since_save >= save_every:
+                    self.save_state()
+                    since_save = 0
+            self.save_state()
+            since_save = 0
+            stop.wait(max(0.0, deadline - self.clock()))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Continuously re-verify sealed files")
+    parser.add_argument("roots", nargs="+")
+    parser.add_argument("--key", required=True, help="key as hex")
+    parser.add_argument("--nonce", required=True, help="nonce as hex")
+    parser.add_argument("--algorithm", choices=["ISAP", "Elephant"], default="ISAP")
+    parser.add_argument("--state", default="integrity_watch.json")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_MB, help="I/O budget in MB/s")
+    parser.add_argument("--cold-interval", type=float, default=DEFAULT_COLD_INTERVAL)
+    parser.add_argument("--poll", type=float, default=5.0)
+    args = parser.parse_args()
+
+    watcher = IntegrityWatcher(args.roots, bytes.fromhex(args.key), bytes.fromhex(args.nonce),
+                               args.algorithm, args.state, args.budget, args.cold_interval)
+    try:
+        watcher.run(poll_interval=args.poll)
+    except KeyboardInterrupt:
+        watcher.save_state()
+        stats = watcher.counters()
+        print(f"verified {stats.verified}, failures {stats.failures}, backlog {stats.backlog}, "
+              f"{stats.verification_rate:.2f} files/s")
@@ -1,4 +1,4 @@
-from crypto_base import AuthenticatedData, rotate_left, bytes_to_state, state_to_bytes, xor_bytes
+from crypto_base import AuthenticatedData, AuthenticationError, rotate_left, bytes_to_state, state_to_bytes, xor_bytes, writable_view
 from typing import Optional, List
 import os
 import hmac
@@ -94,11 +94,8 @@ class ISAP:
             self.absorb(state, associated_data, 0x01)
 
         # Encrypt plaintext
-        ciphertext = bytearray()
-        for i in range(0, len(plaintext), self.RATE):
-            block = plaintext[i:i + self.RATE]
-            keystream = self.squeeze(state, len(block))
-            ciphertext.extend(xor_bytes(block, keystream))
+        ciphertext = bytearray(plaintext)
+        self._xor_keystream_in_place(ciphertext, state)
 
         # Generate tag
         tag_state = self.initialize(key, nonce + bytes([0x02]))  # Domain separation
@@ -123,7 +120,7 @@ class ISAP:
         computed_tag = self.squeeze(tag_state, self.TAG_SIZE)
 
         if not hmac.compare_digest(computed_tag, tag):
-            raise ValueError("Authentication failed")
+            raise AuthenticationError("Authentication failed")
 
         # Initialize state for decryption
         state = self.initialize(key, nonce)
@@ -133,13 +130,74 @@ class ISAP:
             self.absorb(state, associated_data, 0x01)
 
         # Decrypt ciphertext
-        plaintext = bytearray()
-        for i in range(0, len(ciphertext), self.RATE):
-            block = ciphertext[i:i + self.RATE]
-            keystream = self.squeeze(state, len(block))
-            plaintext.extend(xor_bytes(block, keystream))
+        plaintext = bytearray(ciphertext)
+        self._xor_keystream_in_place(plaintext, state)
 
         return bytes(plaintext)
+    def _xor_keystream_in_place(self, view, state):
+        """XOR the squeezed keystream into view, one RATE block at a time"""
+        for i in range(0, len(view), self.RATE):
+            block_len = min(self.RATE, len(view) - i)
+            keystream = self.squeeze(state, block_len)
+            value = int.from_bytes(view[i:i + block_len], "big") ^ int.from_bytes(keystream, "big")
+            view[i:i + block_len] = value.to_bytes(block_len, "big")
+
+    def encrypt_into(self, buffer, key, nonce, associated_data=None):
+        """Encrypt a writable buffer (bytearray, memoryview, mmap) in place and return the tag"""
+        if len(key) != self.KEY_SIZE:
+            raise ValueError("Key must be {} bytes".format(self.KEY_SIZE))
+        if len(nonce) != self.NONCE_SIZE:
+            raise ValueError("Nonce must be {} bytes".format(self.NONCE_SIZE))
+
+        with writable_view(buffer) as view:
+            state = self.initialize(key, nonce)
+            if associated_data:
+                self.absorb(state, associated_data, 0x01)
+            self._xor_keystream_in_place(view, state)
+
+            tag_state = self.initialize(key, nonce + bytes([0x02]))
+            self.absorb(tag_state, view, 0x03)
+        return self.squeeze(tag_state, self.TAG_SIZE)
+
+    def decrypt_into(self, buffer, key, nonce, tag, associated_data=None):
+        """Verify the tag, then decrypt a writable buffer in place.
+
+        The tag covers the ciphertext, so a forged buffer is rejected before
+        any byte of it is modified.
+        """
+        if len(key) != self.KEY_SIZE:
+            raise ValueError("Key must be {} bytes".format(self.KEY_SIZE))
+        if len(nonce) != self.NONCE_SIZE:
+            raise ValueError("Nonce must be {} bytes".format(self.NONCE_SIZE))
+        if len(tag) != self.TAG_SIZE:
+            raise ValueError("Tag must be {} bytes".format(self.TAG_SIZE))
+
+        with writable_view(buffer) as view:
+            tag_state = self.initialize(key, nonce + bytes([0x02]))
+            self.absorb(tag_state, view, 0x03)
+            computed_tag = self.squeeze(tag_state, self.TAG_SIZE)
+            if not hmac.compare_digest(computed_tag, tag):
+                raise AuthenticationError("Authentication failed")
+
+            state = self.initialize(key, nonce)
+            if associated_data:
+                self.absorb(state, associated_data, 0x01)
+            self._xor_keystream_in_place(view, state)
+
+    def encrypt_many(self, messages, key, nonces, associated_data=None, backend=None):
+        """Encrypt a batch (one nonce per message) on the backend expected to be fastest.
+
+        See backends.Dispatcher; backend forces an engine by name and
+        backends.dispatcher_for(cipher).last_backend reports the one used.
+        """
+        from backends import dispatcher_for
+        return dispatcher_for(self).encrypt_many(messages, key, nonces, associated_data, backend)
+
+    def decrypt_many(self, ciphertexts, key, nonces, tags, associated_data=None, backend=None):
+        """Decrypt a batch; raises ValueError if any tag fails"""
+        from backends import dispatcher_for
+        return dispatcher_for(self).decrypt_many(ciphertexts, key, nonces, tags, associated_data, backend)
+
     def encrypt_cbc(self, plaintext: bytes, key: bytes, iv: bytes,
                    associated_data: Optional[bytes] = None) -> AuthenticatedData:
         """CBC mode encryption"""
@@ -148,15 +206,14 @@ class ISAP:
         if len(iv) != self.NONCE_SIZE:
             raise ValueError(f"IV must be {self.NONCE_SIZE} bytes")
 
-        blocks = [plaintext[i:i+self.RATE] for i in range(0, len(plaintext), self.RATE)]
         previous = iv
         ciphertext = bytearray()
         
         state = self.initialize(key, iv)
         tag_state = state.copy()
 
-        for block in blocks:
-            block = block.ljust(self.RATE, b'\x00')
+        for i in range(0, len(plaintext), self.RATE):
+            block = plaintext[i:i + self.RATE].ljust(self.RATE, b'\x00')
             xored = xor_bytes(block, previous)
             encrypted = self.encrypt(xored, key, iv, associated_data).ciphertext
             ciphertext.extend(encrypted)
@@ -187,36 +244,50 @@ class ISAP:
 
         return bytes(plaintext)
 
-    def encrypt_ofb(self, plaintext: bytes, key: bytes, iv: bytes,
-                associated_data: Optional[bytes] = None) -> AuthenticatedData:
-        """OFB mode encryption"""
+    def ofb_keystream(self, key: bytes, iv: bytes, length: int,
+                      associated_data: Optional[bytes] = None) -> bytes:
+        """OFB keystream for a message of the given length (independent of the message)"""
         if len(key) != self.KEY_SIZE:
             raise ValueError(f"Key must be {self.KEY_SIZE} bytes")
         if len(iv) != self.NONCE_SIZE:
             raise ValueError(f"IV must be {self.NONCE_SIZE} bytes")
-
-        blocks = [plaintext[i:i+8] for i in range(0, len(plaintext), 8)]
+        keystream = bytearray(-(-length // 8) * 8)
         previous = iv
-        ciphertext = bytearray()
-        
+        for i in range(0, length, 8):
+            previous = self.encrypt(previous, key, iv, associated_data).ciphertext
+            keystream[i:i + 8] = previous[:8]
+        del keystream[length:]
+        return bytes(keystream)
+
+    def _ofb_tag_state(self, ciphertext: bytes, key: bytes, iv: bytes):
         state = bytes_to_state(key + iv)
         self.permutation(state, self.PA_ROUNDS)
-        tag_state = state.copy()
+        for i in range(0, len(ciphertext), 8):
+            state[0] ^= struct.unpack(">Q", ciphertext[i:i + 8].ljust(8, b'\x00'))[0]
+            self.permutation(state, self.PB_ROUNDS)
+        return state
 
-        for block in blocks:
-            keystream = self.encrypt(previous, key, iv, associated_data).ciphertext
-            encrypted = xor_bytes(block, keystream[:len(block)])
-            ciphertext.extend(encrypted)
-            previous = keystream
-            
-            tag_state[0] ^= struct.unpack(">Q", encrypted.ljust(8, b'\x00'))[0]
-            self.permutation(tag_state, self.PB_ROUNDS)
+    def encrypt_ofb(self, plaintext: bytes, key: bytes, iv: bytes,
+                    associated_data: Optional[bytes] = None,
+                    keystream: Optional[bytes] = None) -> AuthenticatedData:
+        """OFB mode encryption; keystream may be precomputed with ofb_keystream()"""
+        if len(key) != self.KEY_SIZE:
+            raise ValueError(f"Key must be {self.KEY_SIZE} bytes")
+        if len(iv) != self.NONCE_SIZE:
+            raise ValueError(f"IV must be {self.NONCE_SIZE} bytes")
+        if keystream is None:
+            keystream = self.ofb_keystream(key, iv, len(plaintext), associated_data)
+        elif len(keystream) < len(plaintext):
+            raise ValueError("Keystream shorter than the message")
 
+        ciphertext = xor_bytes(plaintext, keystream)
+        tag_state = self._ofb_tag_state(ciphertext, key, iv)
         tag = self.squeeze(tag_state, self.TAG_SIZE)
-        return AuthenticatedData(bytes(ciphertext), tag)
+        return AuthenticatedData(ciphertext, tag)
 
     def decrypt_ofb(self, ciphertext: bytes, key: bytes, iv: bytes, tag: bytes,
-                    associated_data: Optional[bytes] = None) -> bytes:
+                    associated_data: Optional[bytes] = None,
+                    keystream: Optional[bytes] = None) -> bytes:
         """OFB mode decryption"""
         if len(key) != self.KEY_SIZE:
             raise ValueError(f"Key must be {self.KEY_SIZE} bytes")
@@ -224,27 +295,14 @@ class ISAP:
             raise ValueError(f"IV must be {self.NONCE_SIZE} bytes")
         if len(tag) != self.TAG_SIZE:
             raise ValueError(f"Tag must be {self.TAG_SIZE} bytes")
-
-        blocks = [ciphertext[i:i+8] for i in range(0, len(ciphertext), 8)]
-        previous = iv
-        plaintext = bytearray()
-        
-        state = bytes_to_state(key + iv)
-        self.permutation(state, self.PA_ROUNDS)
-        tag_state = state.copy()
-
-        for block in blocks:
-            keystream = self.encrypt(previous, key, iv, associated_data).ciphertext
-            decrypted = xor_bytes(block, keystream[:len(block)])
-            plaintext.extend(decrypted)
-            previous = keystream
-            
-            tag_state[0] ^= struct.unpack(">Q", block.ljust(8, b'\x00'))[0]
-            self.permutation(tag_state, self.PB_ROUNDS)
+        if keystream is None:
+            keystream = self.ofb_keystream(key, iv, len(ciphertext), associated_data)
+        elif len(keystream) < len(ciphertext):
+            raise ValueError("Keystream shorter than the message")
 
         # Verify tag
-        computed_tag = self.squeeze(tag_state, self.TAG_SIZE)
+        computed_tag = self.squeeze(self._ofb_tag_state(ciphertext, key, iv), self.TAG_SIZE)
         if not hmac.compare_digest(computed_tag, tag):
-            raise ValueError("Authentication failed")
+            raise AuthenticationError("Authentication failed")
 
-        return bytes(plaintext)
+        return xor_bytes(ciphertext, keystream)
@@ -0,0 +1,227 @@
+# keystream_pool.py
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from crypto_base import AuthenticatedData
+from nonce_source import ReuseDetector
+
+DEFAULT_POOL_BYTES = 1 << 20     # keystream bytes held (or being computed) at once
+DEFAULT_EVICTED_LIMIT = 4096     # evicted reservations remembered so they can still be used once
+
+QUEUED, RUNNING, READY, EVICTED, CLAIMED = range(5)
+
+
+@dataclass
+class PoolStats:
+    reserved: int = 0
+    hits: int = 0          # keystream was ready when the message arrived
+    waits: int = 0         # message arrived while the worker was computing it
+    misses: int = 0        # computed on the request path (evicted, not started or not reserved)
+    evicted: int = 0
+    pooled_bytes: int = 0
+    peak_bytes: int = 0
+
+
+class _Reservation:
+    def __init__(self, length: int, ad_id: bytes, decrypting: bool):
+        self.length = length
+        self.ad_id = ad_id
+        self.decrypting = decrypting
+        self.status = QUEUED
+        self.keystream: Optional[bytearray] = None
+        self.done = threading.Event()
+
+
+def _ad_id(associated_data: Optional[bytes]) -> bytes:
+    return hashlib.blake2b(associated_data or b"", digest_size=16).digest()
+
+
+class KeystreamPool:
+    """Precomputes OFB keystreams for (key, IV) pairs reserved ahead of time.
+
+    cipher is an Elephant or ISAP instance. Worker threads fill reserved
+    keystreams in the background; encrypt()/decrypt() then only XOR and
+    compute the tag. Each (key, IV) can be encrypted under once: a
+    ReuseDetector refuses repeats, and a keystream is wiped as soon as it
+    is taken. Decryption is not checked, so one pool can decrypt what it
+    encrypted; reserve with decrypting=True for incoming messages.
+
+    Reservations are counted against max_bytes when made; going over the
+    limit evicts the oldest ones, which fall back to computing the
+    keystream when their message arrives. Only the last evicted_limit
+    evicted (key, IV) pairs are remembered: an older one that was reserved
+    for encryption is refused as a reuse when its message finally comes.
+    """
+
+    def __init__(self, cipher, max_bytes: int = DEFAULT_POOL_BYTES, workers: int = 1,
+                 detector: Optional[ReuseDetector] = None, evicted_limit: int = DEFAULT_EVICTED_LIMIT):
+        if max_bytes <= 0 or workers < 1:
+            raise ValueError("Pool size and worker count must be positive")
+        self.cipher = cipher
+        self.max_bytes = max_bytes
+        self.detector = detector or ReuseDetector(strict=True)
+        self.stats = PoolStats()
+        self.entries: "OrderedDict[Tuple[bytes, bytes], _Reservation]" = OrderedDict()
+        self.evicted: "OrderedDict[Tuple[bytes, bytes], _Reservation]" = OrderedDict()
+        self.evicted_limit = evicted_limit
+        self.lock = threading.Lock()
+        self.jobs: "queue.Queue" = queue.Queue()
+        self.threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    @staticmethod
+    def _entry_id(key: bytes, iv: bytes) -> Tuple[bytes, bytes]:
+        return hashlib.blake2b(key, digest_size=16, person=b"ofb-pool").digest(), bytes(iv)
+
+    def _release(self, reservation: _Reservation) -> None:
+        if reservation.status in (QUEUED, RUNNING, READY):
+            self.stats.pooled_bytes -= reservation.length
+
+    def _forget(self, entry_id: Tuple[bytes, bytes], reservation: _Reservation) -> None:
+        """Move an entry without keystream out of entries, keeping a bounded record of it"""
+        del self.entries[entry_id]
+        reservation.status = EVICTED
+        reservation.keystream = None
+        self.evicted[entry_id] = reservation
+        while len(self.evicted) > self.evicted_limit:
+            self.evicted.popitem(last=False)
+
+    def _evict_until(self, needed: int) -> None:
+        excess = self.stats.pooled_bytes + needed - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for entry_id, reservation in self.entries.items():     # oldest first; stops once enough is freed
+            if excess <= 0:
+                break
+            if reservation.status != RUNNING:
+                victims.append((entry_id, reservation))
+                excess -= reservation.length
+        for entry_id, reservation in victims:
+            self._release(reservation)
+            self._forget(entry_id, reservation)
+            self.stats.evicted += 1
+
+    def reserve(self, key: bytes, iv: bytes, length: int,
+                associated_data: Optional[bytes] = None, decrypting: bool = False) -> None:
+        """Schedule the keystream for a message of up to length bytes"""
+        if not 0 <= length <= self.max_bytes:
+            raise ValueError("Reservation must fit in the pool")
+        entry_id = self._entry_id(key, iv)
+        with self.lock:
+            if entry_id in self.entries or entry_id in self.evicted:
+                raise ValueError("This (key, IV) is already reserved")
+        if not decrypting:
+            self.detector.check(key, iv)     # raises on a repeated (key, IV)
+        reservation = _Reservation(length, _ad_id(associated_data), decrypting)
+        with self.lock:
+            self._evict_until(length)
+            self.entries[entry_id] = reservation
+            self.stats.reserved += 1
+            self.stats.pooled_bytes += length
+            self.stats.peak_bytes = max(self.stats.peak_bytes, self.stats.pooled_bytes)
+        self.jobs.put((entry_id, reservation, key, iv, associated_data))
+
+    def _worker(self) -> None:
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                self._fill(*job)
+            finally:
+                self.jobs.task_done()
+
+    def _fill(self, entry_id: Tuple[bytes, bytes], reservation: _Reservation, key: bytes, iv: bytes,
+              associated_data: Optional[bytes]) -> None:
+        with self.lock:
+            if reservation.status != QUEUED:
+                return
+            reservation.status = RUNNING
+        try:
+            keystream = bytearray(self.cipher.ofb_keystream(key, iv, reservation.length,
+                                                            associated_data))
+        except Exception:
+            keystream = None      # the request path recomputes and raises the error itself
+        with self.lock:
+            if keystream is None:
+                self._release(reservation)
+                if self.entries.get(entry_id) is reservation:
+                    self._forget(entry_id, reservation)
+                else:
+                    reservation.status = EVICTED     # already taken; the waiter recomputes
+            else:
+                reservation.keystream = keystream
+                reservation.status = READY
+        reservation.done.set()
+
+    def wait(self) -> None:
+        """Block until every queued reservation has been filled (or skipped)"""
+        self.jobs.join()
+
+    def _take(self, key: bytes, iv: bytes, length: int, associated_data: Optional[bytes],
+              decrypting: bool) -> bytes:
+        """Hand out the keystream for (key, IV) once; encryption never reuses one"""
+        entry_id = self._entry_id(key, iv)
+        with self.lock:
+            table = self.entries if entry_id in self.entries else self.evicted
+            reservation = table.get(entry_id)
+            if reservation is not None:
+                if reservation.ad_id != _ad_id(associated_data):
+                    raise ValueError("Associated data does not match the reservation")
+                del table[entry_id]
+                if reservation.status == QUEUED:
+                    self._release(reservation)
+                    reservation.status = CLAIMED     # the worker will skip it
+                elif reservation.status == RUNNING:
+                    self.stats.waits += 1
+        if not decrypting and (reservation is None or reservation.decrypting):
+            self.detector.check(key, iv)     # not reserved for encryption: this is its one use
+        if reservation is not None:
+            if reservation.status == RUNNING:
+                reservation.done.wait()
+            with self.lock:
+                keystream = reservation.keystream
+                self._release(reservation)
+                reservation.status = CLAIMED
+                reservation.keystream = None
+            if keystream is not None and len(keystream) >= length:
+                result = bytes(keystream[:length])
+                keystream[:] = bytes(len(keystream))    # wipe the pooled copy
+                with self.lock:
+                    self.stats.hits += 1
+                return result
+        with self.lock:
+            self.stats.misses += 1
+        return self.cipher.ofb_keystream(key, iv, length, associated_data)
+
+    def encrypt(self, plaintext: bytes, key: bytes, iv: bytes,
+                associated_data: Optional[bytes] = None) -> AuthenticatedData:
+        keystream = self._take(key, iv, len(plaintext), associated_data, False)
+        return self.cipher.encrypt_ofb(plaintext, key, iv, associated_data, keystream)
+
+    def decrypt(self, ciphertext: bytes, key: bytes, iv: bytes, tag: bytes,
+                associated_data: Optional[bytes] = None) -> bytes:
+        keystream = self._take(key, iv, len(ciphertext), associated_data, True)
+        return self.cipher.decrypt_ofb(ciphertext, key, iv, tag, associated_data, keystream)
+
+    def pending(self) -> int:
+        """Reservations not yet taken"""
+        with self.lock:
+            return len(self.entries)
+
+    def close(self) -> None:
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,258 @@
+# memory_profile.py
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, List
+
+from elephant import Elephant, LANE_CHUNK
+from file_integrity import FileIntegrity, READ_CHUNK_SIZE, TREE_CHUNK_SIZE
+from isap import ISAP
+from read_ahead import DEFAULT_DEPTH
+
+KIB, MIB, GIB = 1 << 10, 1 << 20, 1 << 30
+FILE_SIZES = (MIB, 64 * MIB, GIB)
+# Buffer handling is profiled with the permutations stubbed out (see permutations_stubbed)
+CIPHER_SIZES = {'ISAP': 16 * KIB, 'Elephant': 256 * KIB}
+# The real permutations are profiled at a size they finish in seconds under tracemalloc
+PERMUTATION_SIZES = {'ISAP': 1 * KIB, 'Elephant': 256}
+MAC_FILE_LIMIT = MIB        # larger MAC-only file cases would take minutes even stubbed
+SLACK = 16 * KIB            # interpreter overhead that does not grow with the input
+TREE_WORKERS = 2
+TREE_LEAF_BYTES = 4 * KIB   # a leaf digest plus the Future pool.map keeps for it until the end
+
+# Modes allowed one whole-size copy beyond size + 2 x chunk, and why
+_FROZEN = "fills a bytearray and returns it as bytes, which copies it once"
+BUDGET_EXCEPTIONS = {
+    "encrypt": _FROZEN,
+    "decrypt": _FROZEN,
+    "encrypt_cbc": _FROZEN,
+    "decrypt_cbc": _FROZEN,
+    "encrypt_ofb": _FROZEN + "; the keystream is freed before that copy",
+    "decrypt_ofb": _FROZEN + "; the keystream is freed before that copy",
+}
+
+
+@dataclass
+class Measurement:
+    case: str
+    size: int
+    peak_bytes: int         # traced peak above the baseline; inputs already in memory are excluded
+    retained_bytes: int     # still allocated once the result is dropped
+    retained_blocks: int    # net memory blocks left behind (leak indicator)
+    budget_bytes: int
+    seconds: float
+    stubbed: bool = False
+
+    @property
+    def within_budget(self) -> bool:
+        return self.peak_bytes <= self.budget_bytes
+
+
+def measure(case: str, size: int, budget: int, function: Callable[[], object],
+            stubbed: bool = False) -> Measurement:
+    """Run function under tracemalloc and record its peak and retained memory"""
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        del result
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measurement(case, size, peak - baseline, current - baseline,
+                       sys.getallocatedblocks() - blocks, budget, seconds, stubbed)
+
+
+@contextmanager
+def permutations_stubbed():
+    """Make both permutations no-ops.
+
+    A permutation only rewrites one fixed-size state, so this leaves the
+    memory profile of the surrounding buffer handling unchanged while
+    letting pure-Python modes run on inputs of realistic size. Outputs
+    are not valid ciphertexts while it is active.
+    """
+    saved = Elephant.permutation, Elephant.permutation_pair, ISAP.permutation
+    Elephant.permutation = lambda self, state: None
+    Elephant.permutation_pair = lambda self, state, tag_state: None
+    ISAP.permutation = lambda self, state, rounds: None
+    try:
+        yield
+    finally:
+        Elephant.permutation, Elephant.permutation_pair, ISAP.permutation = saved
+
+
+def cipher_cases(cipher, size: int, stubbed: bool = False, modes=None) -> List[Measurement]:
+    """Every mode of one cipher on a size-byte input.
+
+    Budgets: modes returning a new buffer may use size + 2 x chunk, the
+    in-place and MAC paths only 2 x chunk, and the modes in
+    BUDGET_EXCEPTIONS one more size. chunk is Elephant's LANE_CHUNK and
+    ISAP's 8-byte rate. SLACK is added to all of them.
+    """
+    name = type(cipher).__name__
+    key = bytes(range(16))
+    nonce = bytes(ISAP.NONCE_SIZE if isinstance(cipher, ISAP) else 8)
+    data = os.urandom(size)
+    chunk = min(size, LANE_CHUNK) if isinstance(cipher, Elephant) else ISAP.RATE
+    copy_budget = size + 2 * chunk + SLACK
+    stream_budget = 2 * chunk + SLACK
+    results: List[Measurement] = []
+
+    def run(mode, budget, function):
+        if modes is None or mode in modes:
+            if mode in BUDGET_EXCEPTIONS:
+                budget += size
+            results.append(measure("{}.{}".format(name, mode), size, budget, function, stubbed))
+
+    sealed = cipher.encrypt(data, key, nonce)
+    run("encrypt", copy_budget, lambda: cipher.encrypt(data, key, nonce))
+    run("decrypt", copy_budget, lambda: cipher.decrypt(sealed.ciphertext, key, nonce, sealed.tag))
+
+    buffer = bytearray(data)
+    tags = []
+    run("encrypt_into", stream_budget, lambda: tags.append(cipher.encrypt_into(buffer, key, nonce)))
+    if tags:
+        run("decrypt_into", stream_budget, lambda: cipher.decrypt_into(buffer, key, nonce, tags[0]))
+
+    chained = cipher.encrypt_cbc(data, key, nonce)
+    run("encrypt_cbc", copy_budget, lambda: cipher.encrypt_cbc(data, key, nonce))
+    if isinstance(cipher, Elephant):     # ISAP.decrypt_cbc cannot take the IV encrypt_cbc requires
+        run("decrypt_cbc", copy_budget, lambda: cipher.decrypt_cbc(chained.ciphertext, key, nonce, chained.tag))
+
+    feedback = cipher.encrypt_ofb(data, key, nonce)
+    run("encrypt_ofb", copy_budget, lambda: cipher.encrypt_ofb(data, key, nonce))
+    run("decrypt_ofb", copy_budget,
+        lambda: cipher.decrypt_ofb(feedback.ciphertext, key, nonce, feedback.tag))
+    if isinstance(cipher, Elephant):     # ISAP has no MAC-only mode
+        run("mac", stream_budget, lambda: cipher.mac(data, key, nonce))
+    return results
+
+
+def file_cases(size: int, directory: str, workers: int = TREE_WORKERS) -> List[Measurement]:
+    """FileIntegrity generate/verify on a sparse file of the given size.
+
+    Streaming paths may hold the DEFAULT_DEPTH read-ahead buffers (plus the
+    MAC's lane conversion in mac mode); tree mode one chunk per worker plus
+    two, and TREE_LEAF_BYTES per leaf.
+    """
+    path = os.path.join(directory, "sparse_{}.bin".format(size))
+    with open(path, "wb") as file:
+        file.truncate(size)
+    key = bytes(range(16))
+    stream_budget = DEFAULT_DEPTH * min(size, READ_CHUNK_SIZE) + 2 * SLACK
+    mac_budget = stream_budget + 2 * LANE_CHUNK
+    results: List[Measurement] = []
+    try:
+        for algorithm, nonce in [('ISAP', bytes(16)), ('Elephant', bytes(8))]:
+            extracts = []
+            results.append(measure("FileIntegrity.generate[{}]".format(algorithm), size, stream_budget,
+                                   lambda: extracts.append(FileIntegrity.generate_file_extract(
+                                       path, key, nonce, algorithm))))
+            FileIntegrity.append_extract_to_file(path, extracts[0])
+            verdict = []
+            results.append(measure("FileIntegrity.verify[{}]".format(algorithm), size, stream_budget,
+                                   lambda: verdict.append(FileIntegrity.verify_file_integrity(
+                                       path, key, nonce, algorithm))))
+            assert verdict == [True], "Extract did not verify"
+            os.truncate(path, size)
+
+        if size <= MAC_FILE_LIMIT:
+            with permutations_stubbed():
+                extracts = []
+                results.append(measure("FileIntegrity.generate[mac]", size, mac_budget,
+                                       lambda: extracts.append(FileIntegrity.generate_file_extract(
+                                           path, key, bytes(8), 'Elephant', mac=True)), stubbed=True))
+                FileIntegrity.append_extract_to_file(path, extracts[0])
+                results.append(measure("FileIntegrity.verify[mac]", size, mac_budget,
+                                       lambda: FileIntegrity.verify_file_integrity(
+                                           path, key, bytes(8), 'Elephant', mac=True), stubbed=True))
+                os.truncate(path, size)
+
+        leaves = -(-size // TREE_CHUNK_SIZE)
+        tree_budget = (workers + 2) * TREE_CHUNK_SIZE + TREE_LEAF_BYTES * leaves + SLACK
+        results.append(measure("FileIntegrity.generate_tree", size, tree_budget,
+                               lambda: FileIntegrity.generate_tree_extract(
+                                   path, key, bytes(8), 'Elephant', workers=workers)))
+        results.append(measure("FileIntegrity.verify_tree", size, tree_budget,
+                               lambda: FileIntegrity.verify_tree_integrity(
+                                   path, key, bytes(8), 'Elephant', full=True, workers=workers)))
+    finally:
+        for leftover in (path, path + ".merkle"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    return results
+
+
+def run_suite(file_sizes=FILE_SIZES, cipher_sizes=CIPHER_SIZES,
+              permutation_sizes=PERMUTATION_SIZES) -> List[Measurement]:
+    results: List[Measurement] = []
+    ciphers = {'ISAP': ISAP, 'Elephant': Elephant}
+    with permutations_stubbed():
+        for name, size in cipher_sizes.items():
+            results += cipher_cases(ciphers[name](), size, stubbed=True)
+    for name, size in permutation_sizes.items():
+        results += cipher_cases(ciphers[name](), size, modes=("encrypt", "mac"))
+    with tempfile.TemporaryDirectory() as directory:
+        for size in file_sizes:
+            results += file_cases(size, directory)
+    return results
+
+
+def report(results: List[Measurement]) -> dict:
+    """JSON-ready summary for trend tracking"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "read_chunk_size": READ_CHUNK_SIZE,
+        "lane_chunk": LANE_CHUNK,
+        "budget_exceptions": BUDGET_EXCEPTIONS,
+        "results": [dict(asdict(m), within_budget=m.within_budget) for m in results],
+    }
+
+
+def parse_size(text: str) -> int:
+    units = {"K": KIB, "M": MIB, "G": GIB}
+    text = text.strip().upper().rstrip("B").rstrip("I")
+    if text and text[-1] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Peak-memory regression suite")
+    parser.add_argument("--file-sizes", default="1M,64M,1G",
+                        help="comma-separated FileIntegrity sizes (K/M/G suffixes)")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(file_sizes=[parse_size(s) for s in args.file_sizes.split(",") if s])
+    for m in results:
+        print("{:32s} {:>11d} B | peak {:>10d} / {:>10d} {} | retained {:>7d} B | {:7.2f} s{}".format(
+            m.case, m.size, m.peak_bytes, m.budget_bytes, "ok  " if m.within_budget else "OVER",
+            m.retained_bytes, m.seconds, " (stubbed)" if m.stubbed else ""), file=sys.stderr)
+    text = json.dumps(report(results), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    return 0 if all(m.within_budget for m in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+# nonce_source.py
+import hashlib
+import math
+import os
+import threading
+import warnings
+import weakref
+from collections import OrderedDict
+from itertools import count
+from typing import Optional
+
+ISAP_NONCE_SIZE = 16
+ELEPHANT_NONCE_SIZE = 8
+DEFAULT_PREFETCH = 4096             # random bytes fetched per os.urandom call
+DEFAULT_DETECTOR_BYTES = 1 << 20    # memory shared by all per-key Bloom filters
+
+
+class NonceReuseWarning(UserWarning):
+    """A nonce was (probably) used twice under the same key"""
+    pass
+
+
+# Objects holding per-thread random state. A forked child inherits that
+# state, so it is dropped there; otherwise parent and child would hand out
+# the same bytes.
+_per_thread_owners: "weakref.WeakSet" = weakref.WeakSet()
+
+def _reset_after_fork() -> None:
+    for owner in list(_per_thread_owners):
+        owner.local = threading.local()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class RandomPool:
+    """os.urandom output refilled in large batches, one buffer per thread"""
+
+    def __init__(self, prefetch: int = DEFAULT_PREFETCH):
+        if prefetch <= 0:
+            raise ValueError("Prefetch size must be positive")
+        self.prefetch = prefetch
+        self.refills = 0
+        self.local = threading.local()
+        _per_thread_owners.add(self)
+
+    def take(self, n: int) -> bytes:
+        """Return n fresh random bytes; each byte is handed out once"""
+        local = self.local
+        offset = getattr(local, "offset", self.prefetch)
+        if offset + n > self.prefetch:
+            if n > self.prefetch:
+                return os.urandom(n)
+            local.buffer = os.urandom(self.prefetch)
+            offset = 0
+            self.refills += 1
+        local.offset = offset + n
+        return local.buffer[offset:offset + n]
+
+
+_shared_pool = RandomPool()
+
+def random_nonce(size: int = ISAP_NONCE_SIZE) -> bytes:
+    """Random nonce from the shared prefetch pool instead of one syscall per call"""
+    return _shared_pool.take(size)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over byte strings"""
+
+    def __init__(self, capacity: int, error_rate: float = 1e-6):
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("Error rate must be between 0 and 1")
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = max(64, (bits + 7) // 8 * 8)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(self.size // 8)
+        self.capacity = capacity
+        self.count = 0
+
+    @classmethod
+    def for_memory(cls, nbytes: int, error_rate: float = 1e-6) -> "BloomFilter":
+        """Largest filter that fits in nbytes at the given error rate"""
+        capacity = int(nbytes * 8 * math.log(2) ** 2 / -math.log(error_rate))
+        return cls(max(1, capacity), error_rate)
+
+    def _positions(self, item: bytes):
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item: bytes) -> bool:
+        """Insert item; returns True if it was (probably) present already"""
+        bits = self.bits
+        present = True
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            byte = position >> 3
+            if not bits[byte] & mask:
+                present = False
+                bits[byte] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, item: bytes) -> bool:
+        return all(self.bits[p // 8] >> (p % 8) & 1 for p in self._positions(item))
+
+    @property
+    def saturated(self) -> bool:
+        """Past capacity the false-positive rate climbs above error_rate"""
+        return self.count >= self.capacity
+
+
+class ReuseDetector:
+    """Per-key Bloom filters that flag repeated (key, nonce) pairs.
+
+    Keys are identified by a hash, never stored. memory_bytes caps the total
+    size: each key gets a filter of per_key_bytes, and the least recently
+    used key is dropped once the cap is reached. A hit is only "probable",
+    so by default it raises a NonceReuseWarning; strict=True raises
+    ValueError instead.
+
+    A clean check only means something if the cipher's keystream depends
+    on the nonce. Elephant at its default rate never reads the nonce, so
+    two messages under one key and the same associated data share a
+    keystream whatever nonces they carry; see NonceAllocator.for_elephant.
+    """
+
+    def __init__(self, memory_bytes: int = DEFAULT_DETECTOR_BYTES, per_key_bytes: int = 64 * 1024,
+                 error_rate: float = 1e-6, strict: bool = False):
+        if per_key_bytes <= 0 or memory_bytes < per_key_bytes:
+            raise ValueError("Memory limit must hold at least one filter")
+        self.per_key_bytes = per_key_bytes
+        self.max_keys = memory_bytes // per_key_bytes
+        self.error_rate = error_rate
+        self.strict = strict
+        self.filters: "OrderedDict[bytes, BloomFilter]" = OrderedDict()
+        self.checked = 0
+        self.reuses = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def _filter_for(self, key: bytes) -> BloomFilter:
+        key_id = hashlib.blake2b(key, digest_size=16, person=b"nonce-reuse").digest()
+        bloom = self.filters.get(key_id)
+        if bloom is None:
+            if len(self.filters) >= self.max_keys:
+                self.filters.popitem(last=False)
+                self.evicted += 1
+            bloom = self.filters[key_id] = BloomFilter.for_memory(self.per_key_bytes, self.error_rate)
+        else:
+            self.filters.move_to_end(key_id)
+        return bloom
+
+    def check(self, key: bytes, nonce: bytes) -> bool:
+        """Record a (key, nonce) use; returns True if it looks like a reuse"""
+        with self.lock:
+            self.checked += 1
+            reused = self._filter_for(key).add(nonce)
+            if reused:
+                self.reuses += 1
+        if reused:
+            message = "Nonce reuse detected for this key"
+            if self.strict:
+                raise ValueError(message)
+            warnings.warn(message, NonceReuseWarning, stacklevel=2)
+        return reused
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(bloom.bits) for bloom in self.filters.values())
+
+
+class NonceAllocator:
+    """Counter-based nonces: a random per-thread prefix followed by a counter.
+
+    Every thread draws its own prefix from the random pool, so threads
+    never contend on a shared counter; when a counter wraps the thread
+    simply takes a fresh prefix, and so does a forked child process.
+    Nonces are unique per allocator as long as prefixes do not collide,
+    which for 16-byte ISAP nonces (8-byte prefix) is negligible and for
+    8-byte Elephant nonces (4-byte prefix) is the birthday bound over
+    2**32 prefixes.
+    """
+
+    def __init__(self, nonce_size: int = ISAP_NONCE_SIZE, counter_size: Optional[int] = None,
+                 detector: Optional[ReuseDetector] = None, pool: Optional[RandomPool] = None):
+        counter_size = nonce_size // 2 if counter_size is None else counter_size
+        if not 0 < counter_size < nonce_size:
+            raise ValueError("Counter must be shorter than the nonce")
+        self.nonce_size = nonce_size
+        self.counter_size = counter_size
+        self.prefix_size = nonce_size - counter_size
+        self.counter_limit = 1 << (8 * counter_size)
+        self.detector = detector
+        self.pool = pool or _shared_pool
+        self.local = threading.local()
+        _per_thread_owners.add(self)
+
+    @classmethod
+    def for_isap(cls, **kwargs) -> "NonceAllocator":
+        return cls(ISAP_NONCE_SIZE, **kwargs)
+
+    @classmethod
+    def for_elephant(cls, **kwargs) -> "NonceAllocator":
+        """8-byte nonces for Elephant.
+
+        Unique nonces only prevent keystream reuse at wide rates
+        (Elephant(rate=...)). The default parameter set initialises from
+        the key alone, so there the associated data must differ per
+        message under a key, e.g. by including the nonce as
+        file_encryption does, or the keystream repeats.
+        """
+        return cls(ELEPHANT_NONCE_SIZE, **kwargs)
+
+    def _new_prefix(self) -> None:
+        self.local.prefix = self.pool.take(self.prefix_size)
+        self.local.counter = count()
+
+    def next(self, key: Optional[bytes] = None) -> bytes:
+        """Allocate a nonce; with a detector and a key the use is also recorded"""
+        local = self.local
+        try:
+            value = next(local.counter)
+        except AttributeError:
+            self._new_prefix()
+            value = next(local.counter)
+        if value >= self.counter_limit:
+            self._new_prefix()
+            value = next(local.counter)
+        nonce = local.prefix + value.to_bytes(self.counter_size, "big")
+        if self.detector is not None and key is not None:
+            self.detector.check(key, nonce)
+        return nonce
+
+    def observe(self, key: bytes, nonce: bytes) -> bool:
+        """Record a nonce the caller chose itself, e.g. one read from a file header"""
+        if self.detector is None:
+            return False
+        return self.detector.check(key, nonce)
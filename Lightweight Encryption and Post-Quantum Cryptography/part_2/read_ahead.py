@@ -0,0 +1,171 @@
+# read_ahead.py
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+DEFAULT_DEPTH = 2               # buffers in flight; 2 is classic double buffering
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class PipelineStats:
+    chunks: int = 0
+    bytes_read: int = 0
+    read_time: float = 0.0      # background thread inside read calls
+    io_wait: float = 0.0        # consumer blocked until the next chunk was ready
+    compute_time: float = 0.0   # consumer busy between chunks
+
+    @property
+    def overlap(self) -> float:
+        """Share of the read time hidden behind computation"""
+        if not self.read_time:
+            return 1.0
+        return min(1.0, max(0.0, 1.0 - self.io_wait / self.read_time))
+
+
+class ReadAhead:
+    """Reads a binary file on a background thread, ahead of its consumer.
+
+    depth buffers of chunk_size bytes are allocated once and reused: the
+    thread fills free buffers with readinto while the caller hashes or
+    encrypts the chunk it was given last. Iterating yields memoryviews of
+    full chunks (only the last one may be shorter), each valid until the
+    next one is requested; read(n) copies bytes out for record parsers.
+    At most limit bytes are read when a limit is given.
+    """
+
+    def __init__(self, file: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 depth: int = DEFAULT_DEPTH, limit: Optional[int] = None,
+                 stats: Optional[PipelineStats] = None):
+        if chunk_size < 1 or depth < 1:
+            raise ValueError("Chunk size and depth must be positive")
+        if limit is not None and limit < 0:
+            raise ValueError("Limit must not be negative")
+        self.file = file
+        self.limit = limit
+        self.stats = stats if stats is not None else PipelineStats()
+        if limit is not None:
+            chunk_size = max(1, min(chunk_size, limit))     # no buffer larger than the data
+        self.chunk_size = chunk_size
+        self.buffers = [bytearray(chunk_size) for _ in range(depth)]
+        self.free: "queue.Queue" = queue.Queue()
+        self.filled: "queue.Queue" = queue.Queue()
+        for index in range(depth):
+            self.free.put(index)
+        self.stopping = threading.Event()
+        self._current = None        # [buffer index, length, offset] of a partly consumed chunk
+        self._finished = False
+        self._resumed = None        # when the consumer last got a chunk back
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+
+    def _read_into(self, view: memoryview) -> int:
+        """Fill view unless the file ends first; returns the byte count"""
+        readinto = getattr(self.file, "readinto", None)
+        total = 0
+        while total < len(view):
+            if readinto is not None:
+                count = readinto(view[total:])
+            else:
+                data = self.file.read(len(view) - total)
+                count = len(data)
+                view[total:total + count] = data
+            if not count:
+                break
+            total += count
+        return total
+
+    def _reader(self) -> None:
+        remaining = self.limit
+        try:
+            while True:
+                index = self.free.get()
+                if index is None or self.stopping.is_set():
+                    return
+                wanted = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                start = time.perf_counter()
+                with memoryview(self.buffers[index]) as view:
+                    count = self._read_into(view[:wanted]) if wanted else 0
+                self.stats.read_time += time.perf_counter() - start
+                self.stats.bytes_read += count
+                if count:
+                    self.filled.put((index, count))
+                if remaining is not None:
+                    remaining -= count
+                if count < wanted or not wanted:
+                    self.filled.put(None)
+                    return
+        except BaseException as error:
+            self.filled.put(error)
+
+    def _next_chunk(self):
+        """Wait for the next filled (index, length); None at the end of the data"""
+        if self._finished:
+            return None
+        now = time.perf_counter()
+        if self._resumed is not None:
+            self.stats.compute_time += now - self._resumed
+        item = self.filled.get()
+        self._resumed = time.perf_counter()
+        self.stats.io_wait += self._resumed - now
+        if item is None or isinstance(item, BaseException):
+            self._finished = True
+            if item is not None:
+                raise item
+            return None
+        self.stats.chunks += 1
+        return item
+
+    def __iter__(self):
+        try:
+            while True:
+                if self._current is None:
+                    item = self._next_chunk()
+                    if item is None:
+                        return
+                    self._current = [item[0], item[1], 0]
+                index, length, offset = self._current
+                yield memoryview(self.buffers[index])[offset:length]
+                self._current = None
+                self.free.put(index)
+        finally:
+            self.close()
+
+    def read(self, size: int = -1) -> bytes:
+        """File-style read served from the prefetched chunks"""
+        parts = []
+        while size:
+            if self._current is None:
+                item = self._next_chunk()
+                if item is None:
+                    break
+                self._current = [item[0], item[1], 0]
+            index, length, offset = self._current
+            take = length - offset if size < 0 else min(size, length - offset)
+            parts.append(bytes(memoryview(self.buffers[index])[offset:offset + take]))
+            if size > 0:
+                size -= take
+            if offset + take == length:
+                self._current = None
+                self.free.put(index)
+            else:
+                self._current[2] = offset + take
+        return b"".join(parts)
+
+    def close(self) -> None:
+        """Stop the reader thread; the file is left open at an unspecified position"""
+        if self._resumed is not None and not self._finished:
+            self.stats.compute_time += time.perf_counter() - self._resumed
+            self._resumed = None
+        self._finished = True
+        self.stopping.set()
+        self.free.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,172 @@
+# test_aead_service.py
+import os
+import socket
+import tempfile
+import threading
+from aead_service import (AEADServer, AEADClient, load_test, encode_request, process_request,
+                          decode_response, read_frame, OP_DECRYPT, STATUS_AUTH_FAILED, STATUS_BAD_REQUEST)
+from elephant import Elephant
+from isap import ISAP
+
+def socket_path(directory):
+    return os.path.join(directory, "aead.sock")
+
+def test_round_trip_matches_direct_calls():
+    key = os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        with AEADServer(socket_path(tmp), workers=2) as server, AEADClient(server.path) as client:
+            for algorithm, cipher, nonce_size in [('ISAP', ISAP(), 16), ('Elephant', Elephant(), 8)]:
+                for plaintext, ad in [(b"", None), (b"Hello service", None), (os.urandom(100), b"metadata")]:
+                    nonce = os.urandom(nonce_size)
+                    expected = cipher.encrypt(plaintext, key, nonce, ad)
+                    encrypted = client.encrypt(algorithm, plaintext, key, nonce, ad)
+                    assert encrypted.ciphertext == expected.ciphertext
+                    assert encrypted.tag == expected.tag
+                    decrypted = client.decrypt(algorithm, encrypted.ciphertext, key, nonce, encrypted.tag, ad)
+                    assert decrypted == plaintext
+                print(f"{algorithm} over the service: OK")
+
+def test_errors_are_reported():
+    key = os.urandom(16)
+    nonce = os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        with AEADServer(socket_path(tmp), workers=1, use_processes=False) as server, \
+                AEADClient(server.path) as client:
+            encrypted = client.encrypt('ISAP', b"Test message", key, nonce)
+            try:
+                client.decrypt('ISAP', encrypted.ciphertext, key, nonce, bytes(16))
+                assert False, "Should fail with tampered tag"
+            except ValueError as e:
+                assert "Authentication failed" in str(e)
+
+            try:
+                client.encrypt('ISAP', b"Test message", key, nonce[:8])
+                assert False, "Should fail with invalid nonce size"
+            except ValueError:
+                pass
+
+    # Garbage never reaches a cipher
+    _, status, _, _ = decode_response(process_request(b"\x00\x01"))
+    assert status == STATUS_BAD_REQUEST
+    body = encode_request(7, 9, 'ISAP', key, nonce, b"data")
+    request_id, status, _, _ = decode_response(process_request(body))
+    assert (request_id, status) == (7, STATUS_BAD_REQUEST)
+
+    # Only a failed tag check is reported as an authentication failure
+    for tag, tag_nonce, expected in [(bytes(16), nonce, STATUS_AUTH_FAILED), (bytes(3), nonce, STATUS_BAD_REQUEST),
+                                     (bytes(16), nonce[:8], STATUS_BAD_REQUEST)]:
+        body = encode_request(8, OP_DECRYPT, 'ISAP', key, tag_nonce, b"data", tag)
+        assert decode_response(process_request(body))[:2] == (8, expected)
+    print("Error reporting test passed!")
+
+def test_socket_path_is_checked():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = socket_path(tmp)
+        with open(path, "w") as f:
+            f.write("not a socket")
+        try:
+            AEADServer(path, workers=1, use_processes=False).start()
+            assert False, "Should refuse to replace a regular file"
+        except ValueError:
+            pass
+        with open(path) as f:
+            assert f.read() == "not a socket"
+        os.remove(path)
+
+        with AEADServer(path, workers=1, use_processes=False):
+            try:
+                AEADServer(path, workers=1, use_processes=False).start()
+                assert False, "Should refuse a socket another server is listening on"
+            except ValueError:
+                pass
+            assert os.path.exists(path)
+
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)            # left behind by a server that died
+        stale.close()
+        with AEADServer(path, workers=1, use_processes=False), AEADClient(path) as client:
+            assert client.encrypt('Elephant', b"data", os.urandom(16), os.urandom(8)).tag
+        assert not os.path.exists(path)
+    print("Socket path test passed!")
+
+def test_close_drops_idle_connections():
+    with tempfile.TemporaryDirectory() as tmp:
+        server = AEADServer(socket_path(tmp), workers=1, use_processes=False).start()
+        idle = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        idle.connect(server.path)
+        with AEADClient(server.path) as client:
+            client.encrypt('Elephant', b"data", os.urandom(16), os.urandom(8))
+            readers = [connection.reader for connection in server.connections]
+            assert len(readers) == 2
+            closer = threading.Thread(target=server.close)
+            closer.start()
+            closer.join(5)
+            assert not closer.is_alive() and not any(reader.is_alive() for reader in readers)
+        idle.settimeout(5)
+        assert read_frame(idle) is None       # the server hung up
+        idle.close()
+    print("Close test passed!")
+
+def test_broken_pool_is_replaced():
+    key, nonce = os.urandom(16), os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        with AEADServer(socket_path(tmp), workers=1) as server, AEADClient(server.path) as client:
+            client.encrypt('ISAP', b"warm up", key, nonce)
+            broken = server.pool
+            for process in list(broken._processes.values()):
+                process.kill()
+            failures = 0
+            for _ in range(5):
+                try:
+                    assert client.encrypt('ISAP', b"after", key, nonce).ciphertext
+                    break
+                except ValueError:
+                    failures += 1        # batches caught by the crash are answered with an error
+            assert failures < 5 and server.pool is not broken
+            assert client.encrypt('ISAP', b"again", key, nonce).ciphertext
+    print("Broken pool test passed!")
+
+def test_concurrent_clients_are_batched():
+    key = os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        with AEADServer(socket_path(tmp), workers=1, use_processes=False, max_delay=0.01) as server:
+            errors = []
+            with AEADClient(server.path, pool_size=8) as client:
+                def worker():
+                    try:
+                        for _ in range(5):
+                            nonce = os.urandom(16)
+                            plaintext = os.urandom(32)
+                            encrypted = client.encrypt('ISAP', plaintext, key, nonce)
+                            assert client.decrypt('ISAP', encrypted.ciphertext, key, nonce,
+                                                  encrypted.tag) == plaintext
+                    except Exception as e:
+                        errors.append(e)
+                threads = [threading.Thread(target=worker) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            assert not errors, errors
+            assert server.stats.requests == 80
+            assert server.stats.mean_batch_size > 1
+            print(f"Mean batch size: {server.stats.mean_batch_size:.1f}")
+
+def test_load_generator():
+    with tempfile.TemporaryDirectory() as tmp:
+        with AEADServer(socket_path(tmp), workers=2) as server:
+            result = load_test(server.path, clients=4, requests_per_client=10, message_size=32)
+    assert result["requests"] == 40
+    assert 0 < result["p50"] <= result["p99"]
+    print(f"{result['rps']:.0f} req/s, p50 {result['p50'] * 1e3:.2f} ms, p99 {result['p99'] * 1e3:.2f} ms")
+
+if __name__ == "__main__":
+    print("Running AEAD service tests...\n")
+    test_round_trip_matches_direct_calls()
+    test_errors_are_reported()
+    test_socket_path_is_checked()
+    test_close_drops_idle_connections()
+    test_broken_pool_is_replaced()
+    test_concurrent_clients_are_batched()
+    test_load_generator()
+    print("\nAll tests completed!")
@@ -0,0 +1,133 @@
+# test_backends.py
+import json
+import os
+import tempfile
+import backends
+from backends import Dispatcher, CostModel, available_backends, dispatcher_for
+from elephant import Elephant
+from isap import ISAP
+
+def batch(nonce_size, lengths=(0, 1, 7, 8, 9, 23, 40)):
+    return [os.urandom(n) for n in lengths], [os.urandom(nonce_size) for _ in lengths]
+
+def test_backends_agree():
+    for cipher, nonce_size in [(ISAP(), 16), (Elephant(), 8)]:
+        key = os.urandom(16)
+        messages, nonces = batch(nonce_size)
+        for ad in (None, b"header data"):
+            expected = [cipher.encrypt(m, key, n, ad) for m, n in zip(messages, nonces)]
+            for name in available_backends(cipher):
+                results = backends.BACKENDS[name].encrypt_many(cipher, messages, key, nonces, ad)
+                assert [(r.ciphertext, r.tag) for r in results] == [(e.ciphertext, e.tag) for e in expected], name
+                plaintexts = backends.BACKENDS[name].decrypt_many(
+                    cipher, [e.ciphertext for e in expected], key, nonces, [e.tag for e in expected], ad)
+                assert plaintexts == messages, name
+
+                tags = [e.tag for e in expected]
+                tags[3] = bytes(len(tags[3]))
+                try:
+                    backends.BACKENDS[name].decrypt_many(cipher, [e.ciphertext for e in expected],
+                                                         key, nonces, tags, ad)
+                    assert False, "Should fail with a wrong tag"
+                except ValueError:
+                    pass
+        print(f"{type(cipher).__name__}: {', '.join(available_backends(cipher))} agree")
+
+def test_calibration_cache_and_routing():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "calibration.json")
+        dispatcher = Dispatcher(Elephant(), cache_path=path)
+        models = dispatcher.calibrate()
+        assert set(models) == set(available_backends(dispatcher.cipher))
+        with open(path) as f:
+            assert dispatcher.cache_key in json.load(f)
+
+        # A second dispatcher reads the cache instead of measuring again
+        cached = Dispatcher(Elephant(), cache_path=path)
+        cached._measure = None
+        assert cached.calibrate() == models
+
+        # Routing follows the cost models
+        cached.models = {name: CostModel(100.0, 0.0, 0.0) for name in models}
+        cached.models.update(scalar=CostModel(0.0, 0.0, 1.0), process=CostModel(0.0, 4.0, 0.0))
+        assert cached.choose([64]) == "scalar"
+        assert cached.choose([64] * 8) == "process"
+
+        # Overrides: per call, per dispatcher and through the environment
+        assert cached.choose([64] * 8, backend="scalar") == "scalar"
+        cached.backend = "scalar"
+        assert cached.choose([64] * 8) == "scalar"
+        cached.backend = None
+        os.environ[backends.OVERRIDE_ENV] = "scalar"
+        try:
+            assert cached.choose([64] * 8) == "scalar"
+        finally:
+            del os.environ[backends.OVERRIDE_ENV]
+        try:
+            cached.choose([64], backend="no-such-engine")
+            assert False, "Should reject an unknown backend"
+        except ValueError:
+            pass
+
+        # Wide-rate Elephant has no vector engine and is calibrated separately
+        wide = Dispatcher(Elephant(rate=136), cache_path=path)
+        assert "vector" not in available_backends(wide.cipher)
+        assert wide.cache_key != dispatcher.cache_key
+    print("Calibration cache and routing test passed!")
+
+def test_process_pool_is_reused():
+    cipher, key = Elephant(), os.urandom(16)
+    messages, nonces = batch(8, [16] * 6)
+    engine = backends.ProcessBackend(workers=2)
+    try:
+        expected = engine.encrypt_many(cipher, messages, key, nonces)
+        pool = engine.pool
+        assert pool is not None
+        with tempfile.TemporaryDirectory() as tmp:
+            dispatcher = Dispatcher(cipher, cache_path=os.path.join(tmp, "calibration.json"))
+            dispatcher._measure(engine)
+        assert engine.pool is pool, "Calibration should run on the same pool"
+
+        # A dead worker breaks the pool; the next call replaces it
+        for process in list(pool._processes.values()):
+            process.kill()
+            process.join()
+        assert engine.encrypt_many(cipher, messages, key, nonces) == expected
+        assert engine.pool is not pool
+    finally:
+        engine.shutdown()
+    assert engine.pool is None
+    print("Process pool reuse test passed!")
+
+def test_cipher_methods():
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ[backends.CACHE_ENV] = os.path.join(tmp, "calibration.json")
+        backends._dispatchers.clear()
+        try:
+            for cipher, nonce_size in [(ISAP(), 16), (Elephant(), 8)]:
+                key = os.urandom(16)
+                messages, nonces = batch(nonce_size, [32] * 16)
+                results = cipher.encrypt_many(messages, key, nonces)
+                chosen = dispatcher_for(cipher).last_backend
+                assert chosen in available_backends(cipher)
+                assert results[5].ciphertext == cipher.encrypt(messages[5], key, nonces[5]).ciphertext
+                plaintexts = cipher.decrypt_many([r.ciphertext for r in results], key, nonces,
+                                                 [r.tag for r in results], backend="scalar")
+                assert plaintexts == messages and dispatcher_for(cipher).last_backend == "scalar"
+                try:
+                    cipher.encrypt_many(messages, key, nonces[:-1])
+                    assert False, "Should need one nonce per message"
+                except ValueError:
+                    pass
+                print(f"{type(cipher).__name__}: 16 x 32 bytes routed to {chosen}")
+        finally:
+            del os.environ[backends.CACHE_ENV]
+            backends._dispatchers.clear()
+
+if __name__ == "__main__":
+    print("Running backend dispatch tests...\n")
+    test_backends_agree()
+    test_calibration_cache_and_routing()
+    test_process_pool_is_reused()
+    test_cipher_methods()
+    print("\nAll tests completed!")
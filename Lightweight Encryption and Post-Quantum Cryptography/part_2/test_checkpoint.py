@@ -0,0 +1,236 @@
+# test_checkpoint.py
+import io
+import json
+import os
+import tempfile
+import file_encryption
+import file_integrity
+from checkpoint import CHECKPOINT_SUFFIX, Checkpointer, load_checkpoint, save_checkpoint
+from elephant import Elephant
+from file_encryption import encrypt_file, decrypt_file, encrypt_stream
+from file_integrity import FileIntegrity
+
+class Interrupted(Exception):
+    pass
+
+class InterruptingCipher:
+    """Seals the first `calls` records, then fails like a killed process"""
+    def __init__(self, cipher, calls):
+        self.cipher = cipher
+        self.calls = calls
+
+    def encrypt(self, *args):
+        if not self.calls:
+            raise Interrupted()
+        self.calls -= 1
+        return self.cipher.encrypt(*args)
+
+def write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_save_and_load():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "job" + CHECKPOINT_SUFFIX)
+        save_checkpoint(path, {"kind": "encrypt", "offset": 5})
+        assert load_checkpoint(path, "encrypt", offset=5)["offset"] == 5
+        assert os.listdir(tmp) == ["job" + CHECKPOINT_SUFFIX]
+        if os.name == "posix":
+            # A leftover world-readable temporary file does not pass its mode on
+            write(path + ".tmp", b"")
+            os.chmod(path + ".tmp", 0o644)
+            save_checkpoint(path, {"kind": "encrypt", "offset": 5})
+            assert os.stat(path).st_mode & 0o777 == 0o600
+        for kind, expected in [("mac", {}), ("encrypt", {"offset": 6})]:
+            try:
+                load_checkpoint(path, kind, **expected)
+                assert False, "Should reject a checkpoint of another job"
+            except ValueError:
+                pass
+        write(path, b"{not json")
+        for missing in (path, path + ".gone"):
+            try:
+                load_checkpoint(missing, "encrypt")
+                assert False, "Should reject a missing or corrupted checkpoint"
+            except ValueError:
+                pass
+        assert Checkpointer(path, 0).due() and not Checkpointer(path, None).due()
+    print("Checkpoint file test passed!")
+
+def test_mac_snapshot():
+    key, nonce = os.urandom(16), os.urandom(8)
+    data = os.urandom(333)
+    first = Elephant().mac_init(key, nonce, b"ad")
+    first.update(data[:101])
+    snapshot = json.loads(json.dumps(first.snapshot()))
+    second = Elephant().mac_init(key, nonce, b"ad")
+    second.restore(snapshot)
+    second.update(data[101:])
+    assert second.digest() == Elephant().mac(data, key, nonce, b"ad")
+    try:
+        second.snapshot()
+        assert False, "A finished MAC has no state to save"
+    except ValueError:
+        pass
+    print("MAC snapshot test passed!")
+
+def test_encryption_resume():
+    key = os.urandom(16)
+    data = os.urandom(2000)
+    original = file_encryption._cipher
+    with tempfile.TemporaryDirectory() as tmp:
+        source, encrypted = os.path.join(tmp, "data.bin"), os.path.join(tmp, "data.lwef")
+        write(source, data)
+        file_encryption._cipher = lambda name: InterruptingCipher(original(name), 5)
+        try:
+            encrypt_file(source, encrypted, key, chunk_size=256, checkpoint_interval=0)
+            assert False, "The run should have been interrupted"
+        except Interrupted:
+            pass
+        finally:
+            file_encryption._cipher = original
+        saved = load_checkpoint(encrypted + CHECKPOINT_SUFFIX, "encrypt")
+        assert (saved["offset"], saved["records"]) == (5 * 256, 5)   # saved after each full record
+        with open(encrypted, "ab") as f:
+            f.write(b"half-written record")
+
+        stats = encrypt_file(source, encrypted, key, chunk_size=256, resume=True)
+        assert stats.records == 8 and stats.plaintext_bytes == len(data)
+        assert sorted(os.listdir(tmp)) == ["data.bin", "data.lwef"]
+
+        # Byte-identical to an uninterrupted run with the same nonce
+        container = read(encrypted)
+        nonce = bytes.fromhex(saved["nonce"])
+        expected = io.BytesIO()
+        encrypt_stream(io.BytesIO(data), expected, key, chunk_size=256, nonce=nonce)
+        assert container == expected.getvalue()
+        decrypt_file(encrypted, source + ".out", key)
+        assert read(source + ".out") == data
+    print("Encryption resume test passed!")
+
+def test_resume_refusals():
+    key = os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        source, encrypted = os.path.join(tmp, "data.bin"), os.path.join(tmp, "data.lwef")
+        write(source, os.urandom(1000))
+        original = file_encryption._cipher
+        file_encryption._cipher = lambda name: InterruptingCipher(original(name), 2)
+        try:
+            encrypt_file(source, encrypted, key, chunk_size=100, checkpoint_interval=0)
+        except Interrupted:
+            pass
+        finally:
+            file_encryption._cipher = original
+
+        changed = bytearray(read(source))
+        changed[50] ^= 1
+        write(source, bytes(changed))
+        cases = [
+            ("input changed", lambda: encrypt_file(source, encrypted, key, chunk_size=100, resume=True)),
+            ("wrong key", lambda: encrypt_file(source, encrypted, os.urandom(16), chunk_size=100, resume=True)),
+            ("other chunk size", lambda: encrypt_file(source, encrypted, key, chunk_size=200, resume=True)),
+            ("no checkpoint", lambda: encrypt_file(source, source + ".x", key, resume=True)),
+            ("compressed", lambda: encrypt_file(source, encrypted, key, codec="zlib", checkpoint_interval=1)),
+            ("sha-256 extract", lambda: FileIntegrity.generate_file_extract(
+                source, key, os.urandom(8), "Elephant", checkpoint_interval=1)),
+        ]
+        for name, attempt in cases:
+            try:
+                attempt()
+                assert False, "Should refuse: {}".format(name)
+            except ValueError:
+                pass
+    print("Resume refusal test passed!")
+
+def test_resume_refuses_later_changes():
+    # Records past the checkpoint were already sealed once; new input there
+    # would be sealed under the same nonce and record index
+    key = os.urandom(16)
+    data = os.urandom(1000)
+    with tempfile.TemporaryDirectory() as tmp:
+        source, encrypted = os.path.join(tmp, "data.bin"), os.path.join(tmp, "data.lwef")
+        write(source, data)
+        original = file_encryption._cipher
+        file_encryption._cipher = lambda name: InterruptingCipher(original(name), 5)
+        try:
+            encrypt_file(source, encrypted, key, chunk_size=100, checkpoint_interval=0)
+        except Interrupted:
+            pass
+        finally:
+            file_encryption._cipher = original
+        checkpoint = load_checkpoint(encrypted + CHECKPOINT_SUFFIX, "encrypt")
+        assert checkpoint["offset"] == 500
+        stat = os.stat(source)
+
+        changed = bytearray(data)
+        changed[700] ^= 1
+
+        def edit_in_place():                      # same size, newer mtime
+            with open(source, "r+b") as f:
+                f.write(changed)
+            os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        def replace_file():                       # same size and mtime, another inode
+            replacement = os.path.join(tmp, "replacement.bin")
+            write(replacement, bytes(changed))
+            os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.replace(replacement, source)
+
+        for change in (edit_in_place, replace_file):
+            change()
+            try:
+                encrypt_file(source, encrypted, key, chunk_size=100, resume=True)
+                assert False, "Should refuse an input changed by {}".format(change.__name__)
+            except ValueError:
+                pass
+        assert load_checkpoint(encrypted + CHECKPOINT_SUFFIX, "encrypt") == checkpoint
+    print("Later change refusal test passed!")
+
+def test_mac_extract_resume():
+    key, nonce = os.urandom(16), os.urandom(8)
+    data = os.urandom(1500)
+
+    class InterruptAfterSaves(Checkpointer):
+        def save(self, fields):
+            super().save(fields)
+            if self.saved == 3:
+                raise Interrupted()
+
+    saved_chunk, saved_checkpointer = file_integrity.READ_CHUNK_SIZE, file_integrity.Checkpointer
+    file_integrity.READ_CHUNK_SIZE = 128
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "document.bin")
+            write(path, data)
+            file_integrity.Checkpointer = InterruptAfterSaves
+            try:
+                FileIntegrity.generate_file_extract(path, key, nonce, "Elephant", mac=True, checkpoint_interval=0)
+                assert False, "The run should have been interrupted"
+            except Interrupted:
+                pass
+            finally:
+                file_integrity.Checkpointer = saved_checkpointer
+            assert load_checkpoint(path + CHECKPOINT_SUFFIX, "mac")["offset"] == 3 * 128
+
+            tag = FileIntegrity.generate_file_extract(path, key, nonce, "Elephant", mac=True, resume=True)
+            assert tag == Elephant().mac(data, key, nonce)
+            assert os.listdir(tmp) == ["document.bin"]
+            FileIntegrity.append_extract_to_file(path, tag)
+            assert FileIntegrity.verify_file_integrity(path, key, nonce, "Elephant", mac=True)
+    finally:
+        file_integrity.READ_CHUNK_SIZE = saved_chunk
+    print("MAC extract resume test passed!")
+
+if __name__ == "__main__":
+    print("Running checkpoint tests...\n")
+    test_save_and_load()
+    test_mac_snapshot()
+    test_encryption_resume()
+    test_resume_refusals()
+    test_resume_refuses_later_changes()
+    test_mac_extract_resume()
+    print("\nAll tests passed!")
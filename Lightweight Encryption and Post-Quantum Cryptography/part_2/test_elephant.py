@@ -1,5 +1,10 @@
 from elephant import Elephant
+import elephant
+from crypto_base import writable_file_buffer
 import os
+import random
+import tempfile
+import time
 
 cipher = Elephant()
 def test_elephant():
@@ -124,10 +129,204 @@ def test_tag_verification():
     except ValueError:
         pass
 
+def test_in_place():
+    key = os.urandom(16)
+    nonce = os.urandom(8)
+    associated_data = b"Additional data"
+
+    for length in [0, 1, 7, 8, 9, 16, 100]:
+        plaintext = os.urandom(length)
+        expected = cipher.encrypt(plaintext, key, nonce, associated_data)
+
+        buffer = bytearray(plaintext)
+        tag = cipher.encrypt_into(buffer, key, nonce, associated_data)
+        assert bytes(buffer) == expected.ciphertext, f"Ciphertext mismatch for length {length}"
+        assert tag == expected.tag, f"Tag mismatch for length {length}"
+
+        cipher.decrypt_into(memoryview(buffer), key, nonce, tag, associated_data)
+        assert bytes(buffer) == plaintext, f"Failed for length {length}"
+
+    # A bad tag leaves the ciphertext untouched
+    buffer = bytearray(b"Test message")
+    tag = cipher.encrypt_into(buffer, key, nonce)
+    ciphertext = bytes(buffer)
+    try:
+        cipher.decrypt_into(buffer, key, nonce, bytes(8))
+        assert False, "Should fail with wrong tag"
+    except ValueError:
+        pass
+    assert bytes(buffer) == ciphertext
+
+    try:
+        cipher.encrypt_into(b"read-only", key, nonce)
+        assert False, "Should fail with read-only buffer"
+    except ValueError:
+        pass
+    print("\nIn-place encryption test passed!")
+
+def test_in_place_file():
+    key = os.urandom(16)
+    nonce = os.urandom(8)
+    content = os.urandom(5000)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.bin")
+        with open(path, "wb") as f:
+            f.write(content)
+
+        with writable_file_buffer(path) as buffer:
+            tag = cipher.encrypt_into(buffer, key, nonce)
+        with open(path, "rb") as f:
+            assert f.read() == cipher.encrypt(content, key, nonce).ciphertext
+
+        with writable_file_buffer(path) as buffer:
+            cipher.decrypt_into(buffer, key, nonce, tag)
+        with open(path, "rb") as f:
+            assert f.read() == content
+    print("\nIn-place file encryption test passed!")
+
+def test_wide_rate():
+    key = os.urandom(16)
+    nonce = os.urandom(8)
+    for rate in [16, 136, 168]:
+        wide = Elephant(rate=rate)
+        for length in [0, 1, 8, rate - 1, rate, rate + 1, 3 * rate + 5]:
+            for ad in [None, b"AD", os.urandom(rate + 3)]:
+                plaintext = os.urandom(length)
+                encrypted = wide.encrypt(plaintext, key, nonce, ad)
+                assert len(encrypted.ciphertext) == length and len(encrypted.tag) == 8
+                decrypted = wide.decrypt(encrypted.ciphertext, key, nonce, encrypted.tag, ad)
+                assert decrypted == plaintext, f"Failed for rate {rate} length {length}"
+
+                buffer = bytearray(plaintext)
+                assert wide.encrypt_into(buffer, key, nonce, ad) == encrypted.tag
+                assert bytes(buffer) == encrypted.ciphertext
+
+        # Parameter sets are domain separated from the default rate
+        assert wide.encrypt(b"same", key, nonce).ciphertext != cipher.encrypt(b"same", key, nonce).ciphertext
+        encrypted = wide.encrypt(b"Test message", key, nonce)
+        try:
+            wide.decrypt(encrypted.ciphertext, key, nonce, bytes(8))
+            assert False, "Should fail with tampered tag"
+        except ValueError:
+            pass
+
+    for rate in [0, 12, 176]:
+        try:
+            Elephant(rate=rate)
+            assert False, f"Should reject rate {rate}"
+        except ValueError:
+            pass
+    try:
+        Elephant(rate=136).encrypt_cbc(b"data", key, nonce)
+        assert False, "CBC is only defined for the default rate"
+    except ValueError:
+        pass
+
+    data = os.urandom(4096)
+    timings = {}
+    for rate in [8, 136]:
+        start = time.perf_counter()
+        Elephant(rate=rate).encrypt(data, key, nonce)
+        timings[rate] = time.perf_counter() - start
+    print(f"\nWide-rate test passed! 136-byte rate is {timings[8] / timings[136]:.1f}x faster")
+
+def test_lane_chunks():
+    # Converting lanes a few blocks at a time must not change any output
+    key = os.urandom(16)
+    nonce = os.urandom(8)
+    plaintext = os.urandom(45)
+    expected = [cipher.encrypt(plaintext, key, nonce), cipher.encrypt_cbc(plaintext, key, nonce)]
+    saved = elephant.LANE_CHUNK
+    elephant.LANE_CHUNK = 16
+    try:
+        for result, mode in zip(expected, ["", "_cbc"]):
+            chunked = getattr(cipher, "encrypt" + mode)(plaintext, key, nonce)
+            assert (chunked.ciphertext, chunked.tag) == (result.ciphertext, result.tag)
+            decrypted = getattr(cipher, "decrypt" + mode)(result.ciphertext, key, nonce, result.tag)
+            assert decrypted == plaintext
+    finally:
+        elephant.LANE_CHUNK = saved
+    print("Lane chunking test passed!")
+
+def test_mac():
+    key = os.urandom(16)
+    nonce = os.urandom(8)
+    for rate in [8, 136]:
+        mac_cipher = Elephant(rate=rate)
+        data = os.urandom(1000)
+        tag = mac_cipher.mac(data, key, nonce, b"header")
+        assert len(tag) == 8
+
+        # Streaming in odd-sized pieces gives the same tag
+        stream = mac_cipher.mac_init(key, nonce, b"header")
+        for i in range(0, len(data), 7):
+            stream.update(data[i:i + 7])
+        assert stream.digest() == tag
+        mac_cipher.verify_mac(data, key, nonce, tag, b"header")
+
+        # Every byte, the length, the nonce and the associated data are covered
+        for i in range(0, len(data), 97):
+            tampered = bytearray(data)
+            tampered[i] ^= 1
+            assert mac_cipher.mac(tampered, key, nonce, b"header") != tag
+        assert mac_cipher.mac(data + b"\x00", key, nonce, b"header") != tag
+        assert mac_cipher.mac(data, key, os.urandom(8), b"header") != tag
+        assert mac_cipher.mac(data, key, nonce) != tag
+        try:
+            mac_cipher.verify_mac(data[:-1], key, nonce, tag, b"header")
+            assert False, "Should fail for a truncated message"
+        except ValueError:
+            pass
+
+    # The MAC never equals the AEAD tag of the same message
+    assert cipher.mac(b"message", key, nonce) != cipher.encrypt(b"message", key, nonce).tag
+    print("MAC-only mode test passed!")
+
+def test_permutation_pair():
+    rng = random.Random(7)
+    for _ in range(5):
+        a = [rng.getrandbits(64) for _ in range(25)]
+        b = [rng.getrandbits(64) for _ in range(25)]
+        for first, second in [(a, b), (a, a)]:
+            expected = [first.copy(), second.copy()]
+            cipher.permutation(expected[0])
+            cipher.permutation(expected[1])
+            state, tag_state = first.copy(), second.copy()
+            cipher.permutation_pair(state, tag_state)
+            assert [state, tag_state] == expected
+            assert state is not tag_state
+    print("Interleaved permutation test passed!")
+
+def test_debug_log_is_opt_in():
+    key, nonce = os.urandom(16), os.urandom(8)
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            sealed = Elephant().encrypt(b"quiet", key, nonce)
+            Elephant().decrypt(sealed.ciphertext, key, nonce, sealed.tag)
+            assert os.listdir(tmp) == []
+
+            path = os.path.join(tmp, "trace.log")
+            traced = Elephant(log_file=path)
+            assert traced.encrypt(b"quiet", key, nonce) == sealed
+            with open(path) as f:
+                assert f.read().startswith("encrypt first")
+        finally:
+            os.chdir(cwd)
+    print("Debug log test passed!")
+
 if __name__ == "__main__":
     print("Running comprehensive Elephant cipher tests...\n")
     test_elephant()
     test_error_cases()
     test_tag_verification()
     test_file_integrity()
+    test_in_place()
+    test_in_place_file()
+    test_wide_rate()
+    test_lane_chunks()
+    test_mac()
+    test_permutation_pair()
+    test_debug_log_is_opt_in()
     print("\nAll tests passed!")
\ No newline at end of file
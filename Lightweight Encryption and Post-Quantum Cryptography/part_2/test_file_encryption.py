@@ -0,0 +1,156 @@
+# test_file_encryption.py
+import io
+import os
+import tempfile
+from file_encryption import (encrypt_stream, decrypt_stream, encrypt_file, decrypt_file,
+                             STREAM_HEADER, STREAM_MAGIC, STREAM_VERSION, RECORD_HEADER, RECORD_AD, CODECS)
+from isap import ISAP
+from benchmark import sample_inputs, bench_compression
+
+def round_trip(data, key, **kwargs):
+    container = io.BytesIO()
+    stats = encrypt_stream(io.BytesIO(data), container, key, **kwargs)
+    output = io.BytesIO()
+    decrypt_stream(io.BytesIO(container.getvalue()), output, key)
+    assert output.getvalue() == data
+    return stats, container.getvalue()
+
+def test_round_trip_all_codecs():
+    key = os.urandom(16)
+    text = sample_inputs(4096)["log"]
+    for codec in CODECS:
+        for data in (b"", b"x", text):
+            stats, _ = round_trip(data, key, codec=codec, chunk_size=100)
+            assert stats.plaintext_bytes == len(data)
+    print("Round trip test passed!")
+
+def test_codec_recorded_and_skipped():
+    key = os.urandom(16)
+    inputs = sample_inputs(4096)
+    stats, container = round_trip(inputs["json"], key, codec="zlib", chunk_size=256)
+    assert stats.codec == "zlib" and stats.ratio < 0.5
+    assert container[6] == CODECS["zlib"]
+    assert stats.records == -(-stats.cipher_bytes // 256)
+
+    stats, container = round_trip(inputs["random"], key, codec="lzma")
+    assert stats.codec == "none" and stats.ratio == 1.0
+    assert container[6] == CODECS["none"]
+    print("Codec selection test passed!")
+
+def test_tampering_is_detected():
+    # Elephant's tag covers every ciphertext byte and the associated data
+    key = os.urandom(16)
+    data = sample_inputs(1024)["log"]
+    _, container = round_trip(data, key, algorithm="Elephant", codec="bz2", chunk_size=64)
+    header_size = STREAM_HEADER.size + 8
+    record_size = 5 + 64 + 8
+    swapped = container[header_size + record_size:header_size + 2 * record_size]
+    cases = {
+        "flipped byte": container[:header_size + 10] + bytes([container[header_size + 10] ^ 1])
+                        + container[header_size + 11:],
+        "records swapped": container[:header_size] + swapped
+                           + container[header_size:header_size + record_size]
+                           + container[header_size + 2 * record_size:],
+        "truncated": container[:-20],
+        "final record dropped": container[:header_size + record_size * 2],
+        "trailing data": container + b"\x00",
+        "wrong magic": b"XXXX" + container[4:],
+    }
+    for name, damaged in cases.items():
+        try:
+            decrypt_stream(io.BytesIO(damaged), io.BytesIO(), key)
+            assert False, "Should fail: {}".format(name)
+        except ValueError:
+            pass
+    try:
+        decrypt_stream(io.BytesIO(container), io.BytesIO(), os.urandom(16))
+        assert False, "Should fail with the wrong key"
+    except ValueError:
+        pass
+    print("Tamper detection test passed!")
+
+def isap_container(data, key, nonce, chunk_size):
+    """A container as ISAP (algorithm id 1) used to write it"""
+    header = STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, 1, CODECS["none"], 0, chunk_size, 16) + nonce
+    records = []
+    chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+    for index, chunk in enumerate(chunks):
+        final = index == len(chunks) - 1
+        result = ISAP().encrypt(chunk, key, nonce, header + RECORD_AD.pack(index, final))
+        records.append(RECORD_HEADER.pack(len(chunk), final) + result.ciphertext + result.tag)
+    return header, records
+
+def test_isap_is_refused():
+    # ISAP's tag ignores the associated data, so record order and the final
+    # flag would go unchecked: such containers must not decrypt at all
+    key, nonce = os.urandom(16), os.urandom(16)
+    data = sample_inputs(256)["log"]
+    header, records = isap_container(data, key, nonce, 64)
+    forged_final = bytearray(records[0])
+    forged_final[4] = 1
+    cases = {
+        "intact": header + b"".join(records),
+        "records swapped": header + records[1] + records[0] + b"".join(records[2:]),
+        "cut after the first record": header + bytes(forged_final),
+    }
+    for name, container in cases.items():
+        try:
+            decrypt_stream(io.BytesIO(container), io.BytesIO(), key)
+            assert False, "Should refuse an ISAP container: {}".format(name)
+        except ValueError:
+            pass
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "data.bin")
+        with open(source, "wb") as f:
+            f.write(data)
+        attempts = [
+            lambda: encrypt_stream(io.BytesIO(data), io.BytesIO(), key, "ISAP"),
+            lambda: encrypt_file(source, source + ".lwef", key, "ISAP"),
+            lambda: encrypt_file(source, source + ".lwef", key, "ISAP", checkpoint_interval=1),
+        ]
+        for attempt in attempts:
+            try:
+                attempt()
+                assert False, "Should refuse to encrypt with ISAP"
+            except ValueError:
+                pass
+    print("ISAP refusal test passed!")
+
+def test_files():
+    key = os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "data.json")
+        encrypted = os.path.join(tmp, "data.lwef")
+        restored = os.path.join(tmp, "restored.json")
+        with open(source, "wb") as f:
+            f.write(sample_inputs(3000)["json"])
+        stats = encrypt_file(source, encrypted, key, "Elephant", codec="zlib", chunk_size=512)
+        assert stats.container_bytes == os.path.getsize(encrypted)
+        decrypt_file(encrypted, restored, key)
+        with open(source, "rb") as a, open(restored, "rb") as b:
+            assert a.read() == b.read()
+
+        try:
+            decrypt_file(encrypted, os.path.join(tmp, "bad.json"), os.urandom(16))
+            assert False, "Should fail with the wrong key"
+        except ValueError:
+            pass
+        assert sorted(os.listdir(tmp)) == ["data.json", "data.lwef", "restored.json"]
+    print("File encryption test passed!")
+
+def test_compression_benchmark():
+    results = bench_compression(size=2048, codecs=("none", "zlib"))
+    saved = {r["input"]: r["saved"] for r in results if r["codec"] == "zlib"}
+    assert saved["log"] > 0 and saved["json"] > 0
+    for r in results:
+        print(f"{r['input']:6s} {r['codec']:4s} | ratio {r['ratio']:.3f} | saved {r['saved'] * 100:5.1f}%")
+
+if __name__ == "__main__":
+    print("Running file encryption tests...\n")
+    test_round_trip_all_codecs()
+    test_codec_recorded_and_skipped()
+    test_tampering_is_detected()
+    test_isap_is_refused()
+    test_files()
+    test_compression_benchmark()
+    print("\nAll tests completed!")
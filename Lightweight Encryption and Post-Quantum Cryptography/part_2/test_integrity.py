@@ -1,6 +1,7 @@
 # test_integrity.py
 import os
-from file_integrity import FileIntegrity
+import tempfile
+from file_integrity import FileIntegrity, TREE_SUFFIX
 
 def test_document_integrity_elephant():
     print("\n=== Testing with Elephant Algorithm ===")
@@ -90,8 +91,88 @@ def test_document_integrity_isap():
             os.remove(test_file)
             print("\nTest file cleaned up")
 
+def rewrite(path, data):
+    """Replace file content and make sure the mtime moves even on coarse clocks"""
+    before = os.stat(path).st_mtime_ns
+    with open(path, "wb") as f:
+        f.write(data)
+    after = os.stat(path)
+    if after.st_mtime_ns == before:
+        os.utime(path, ns=(after.st_atime_ns, before + 1_000_000_000))
+
+def test_tree_extract():
+    print("\n=== Testing tree-mode extracts ===")
+    content = os.urandom(10000)
+    for algorithm, nonce_size in [('ISAP', 16), ('Elephant', 8)]:
+        key = os.urandom(16)
+        nonce = os.urandom(nonce_size)
+        with tempfile.TemporaryDirectory() as tmp:
+            test_file = os.path.join(tmp, "tree_document.bin")
+            with open(test_file, "wb") as f:
+                f.write(content)
+
+            FileIntegrity.generate_tree_extract(test_file, key, nonce, algorithm, chunk_size=1000)
+            assert os.path.exists(test_file + TREE_SUFFIX)
+
+            # Unchanged size and mtime: nothing is rehashed
+            result = FileIntegrity.verify_tree_integrity(test_file, key, nonce, algorithm)
+            assert result.valid and result.rehashed_chunks == 0
+            result = FileIntegrity.verify_tree_integrity(test_file, key, nonce, algorithm, full=True)
+            assert result.valid and result.rehashed_chunks == 10
+
+            # Corrupt two neighbouring chunks and the last one
+            corrupted = bytearray(content)
+            for offset in (2500, 3999, 9000):
+                corrupted[offset] ^= 1
+            rewrite(test_file, corrupted)
+            result = FileIntegrity.verify_tree_integrity(test_file, key, nonce, algorithm)
+            assert not result.valid
+            assert result.corrupted_ranges == [(2000, 4000), (9000, 10000)], result.corrupted_ranges
+
+            # Truncation is reported from the cut to the old end
+            rewrite(test_file, content[:5500])
+            result = FileIntegrity.verify_tree_integrity(test_file, key, nonce, algorithm)
+            assert result.corrupted_ranges == [(5000, 10000)], result.corrupted_ranges
+
+            # Restored content verifies again, a wrong key does not
+            rewrite(test_file, content)
+            assert FileIntegrity.verify_tree_integrity(test_file, key, nonce, algorithm)
+            assert not FileIntegrity.verify_tree_integrity(test_file, os.urandom(16), nonce, algorithm)
+        print(f"{algorithm} tree-mode extract: OK")
+
+def test_extract_round_trip():
+    print("\n=== Testing hash and MAC-only extracts ===")
+    content = os.urandom(3000)
+    cases = [('ISAP', 16, False), ('Elephant', 8, False), ('Elephant', 8, True)]
+    for algorithm, nonce_size, mac in cases:
+        key = os.urandom(16)
+        nonce = os.urandom(nonce_size)
+        with tempfile.TemporaryDirectory() as tmp:
+            test_file = os.path.join(tmp, "document.bin")
+            with open(test_file, "wb") as f:
+                f.write(content)
+            extract = FileIntegrity.generate_file_extract(test_file, key, nonce, algorithm, mac=mac)
+            FileIntegrity.append_extract_to_file(test_file, extract)
+            assert FileIntegrity.verify_file_integrity(test_file, key, nonce, algorithm, mac=mac)
+            assert not FileIntegrity.verify_file_integrity(test_file, os.urandom(16), nonce, algorithm, mac=mac)
+
+            with open(test_file, "r+b") as f:
+                original = f.read(11)[10]
+                f.seek(10)
+                f.write(bytes([original ^ 0xFF]))
+            assert not FileIntegrity.verify_file_integrity(test_file, key, nonce, algorithm, mac=mac)
+        print(f"{algorithm} {'MAC-only' if mac else 'hash'} extract: OK")
+
+    try:
+        FileIntegrity.generate_file_extract(__file__, os.urandom(16), os.urandom(16), 'ISAP', mac=True)
+        assert False, "ISAP MAC-only extracts should be refused"
+    except ValueError:
+        pass
+
 if __name__ == "__main__":
     print("Running file integrity tests...")
     test_document_integrity_elephant()
     test_document_integrity_isap()
+    test_tree_extract()
+    test_extract_round_trip()
     print("\nAll tests completed!")
\ No newline at end of file
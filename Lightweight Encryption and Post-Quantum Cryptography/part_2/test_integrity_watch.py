@@ -0,0 +1,140 @@
+# test_integrity_watch.py
+import os
+import tempfile
+import threading
+from file_integrity import FileIntegrity
+from integrity_watch import IntegrityWatcher, PollingChangeFeed, RateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += seconds
+
+def make_sealed_files(directory, key, nonce, count=3, size=4000):
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"file_{i}.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        FileIntegrity.generate_tree_extract(path, key, nonce, 'ISAP', chunk_size=1000)
+        paths.append(path)
+    return paths
+
+def test_rate_limiter():
+    clock = FakeClock()
+    limiter = RateLimiter(1000, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire(1000) == 0.0      # initial burst
+    assert limiter.acquire(500) == 0.5
+    clock.now += 10
+    assert limiter.acquire(1000) == 0.0      # refilled, but capped at one second
+    print("Rate limiter test passed!")
+
+def test_feed_detects_changes():
+    key, nonce = os.urandom(16), os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_sealed_files(tmp, key, nonce, count=2)
+        with open(os.path.join(tmp, "unsealed.txt"), "w") as f:
+            f.write("not watched")
+        feed = PollingChangeFeed([tmp])
+        assert sorted(feed.poll()) == sorted(paths)
+        assert feed.poll() == []
+        with open(paths[0], "ab") as f:
+            f.write(b"more")
+        assert feed.poll() == [paths[0]]
+    print("Change feed test passed!")
+
+def test_watcher_priorities_and_failures():
+    key, nonce = os.urandom(16), os.urandom(16)
+    clock = FakeClock()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_sealed_files(tmp, key, nonce)
+        state = os.path.join(tmp, "watch_state.json")
+        watcher = IntegrityWatcher([tmp], key, nonce, 'ISAP', state, io_budget_mb=1.0,
+                                   cold_interval=3600, clock=clock, sleep=clock.sleep)
+        watcher.scan()
+        assert watcher.counters().backlog == 3
+        while watcher.step():
+            pass
+        stats = watcher.counters()
+        assert stats.verified == 3 and stats.failures == 0 and stats.backlog == 0
+
+        # Corrupt one file without touching the others
+        with open(paths[1], "r+b") as f:
+            original = f.read(11)[10]
+            f.seek(10)
+            f.write(bytes([original ^ 0xFF]))
+        stat = os.stat(paths[1])     # coarse filesystem clocks may not move the mtime on their own
+        os.utime(paths[1], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        clock.now += 3600      # everything else is now cold as well
+        watcher.scan()
+        stats = watcher.counters()
+        assert stats.backlog == 3 and stats.changed_backlog == 1
+        assert watcher.step() == paths[1]     # changed file goes first
+        assert watcher.counters().failures == 1
+        assert watcher.failed == [paths[1]]
+        while watcher.step():
+            pass
+        watcher.save_state()
+
+        # A restarted watcher keeps its counters and sees nothing new
+        restarted = IntegrityWatcher([tmp], key, nonce, 'ISAP', state, clock=clock, sleep=clock.sleep)
+        assert restarted.counters().verified == 6
+        assert restarted.failed == [paths[1]]
+        restarted.scan()
+        assert restarted.counters().backlog == 0
+    print("Watcher scheduling test passed!")
+
+def test_watcher_throttles_on_its_clock():
+    key, nonce = os.urandom(16), os.urandom(16)
+    clock = FakeClock()
+    with tempfile.TemporaryDirectory() as tmp:
+        make_sealed_files(tmp, key, nonce, size=4000)
+        state = os.path.join(tmp, "watch_state.json")
+        watcher = IntegrityWatcher([tmp], key, nonce, 'ISAP', state, io_budget_mb=4000 / (1024 * 1024),
+                                   cold_interval=3600, clock=clock, sleep=clock.sleep)
+        watcher.scan()
+        while watcher.step():
+            pass
+        throttled = watcher.counters().throttled_seconds
+        assert abs(throttled - 2.0) < 1e-6 and throttled == clock.slept     # 3 files at one file per second
+
+        # Simulated time between steps refills the budget
+        clock.now += 3600
+        watcher.scan()
+        while watcher.step():
+            clock.now += 1
+        assert watcher.counters().throttled_seconds == throttled
+    print("Watcher clock test passed!")
+
+def test_run_loop_stops():
+    key, nonce = os.urandom(16), os.urandom(16)
+    with tempfile.TemporaryDirectory() as tmp:
+        make_sealed_files(tmp, key, nonce, count=2)
+        state = os.path.join(tmp, "watch_state.json")
+        watcher = IntegrityWatcher([tmp], key, nonce, 'ISAP', state)
+        stop = threading.Event()
+        thread = threading.Thread(target=watcher.run, args=(stop, 0.05))
+        thread.start()
+        stop.wait(0.5)
+        stop.set()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert watcher.counters().verified == 2
+        assert os.path.exists(state)
+    print("Run loop test passed!")
+
+if __name__ == "__main__":
+    print("Running integrity watcher tests...\n")
+    test_rate_limiter()
+    test_feed_detects_changes()
+    test_watcher_priorities_and_failures()
+    test_watcher_throttles_on_its_clock()
+    test_run_loop_stops()
+    print("\nAll tests completed!")
@@ -1,6 +1,11 @@
 import os
 from isap import ISAP, AuthenticatedData
+from crypto_base import writable_file_buffer, xor_bytes
+from file_integrity import FileIntegrity
+from nonce_source import NonceAllocator, ReuseDetector, NonceReuseWarning
+import tempfile
 import time
+import warnings
 
 def test_basic_functionality():
     isap = ISAP()
@@ -119,9 +124,75 @@ def test_nonce_reuse_warning():
     # Demonstrate why nonce reuse is dangerous
     enc1 = isap.encrypt(message1, key, nonce)
     enc2 = isap.encrypt(message2, key, nonce)
+    keystream = xor_bytes(message1, enc1.ciphertext)
+    assert xor_bytes(enc2.ciphertext, keystream) == message2[:len(message1)]
+
+    # The reuse detector catches the second use of the nonce
+    detector = ReuseDetector()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        detector.check(key, nonce)
+        detector.check(key, nonce)
+    assert len(caught) == 1 and issubclass(caught[0].category, NonceReuseWarning)
+
+    # Allocated nonces never repeat
+    allocator = NonceAllocator.for_isap(detector=ReuseDetector(strict=True))
+    for message in (message1, message2):
+        isap.encrypt(message, key, allocator.next(key))
     print("\nWarning: Nonce reuse detected!")
     print("This is unsafe in practice!")
 
+def test_in_place():
+    isap = ISAP()
+    key = os.urandom(ISAP.KEY_SIZE)
+    nonce = os.urandom(ISAP.NONCE_SIZE)
+    associated_data = b"Important metadata"
+
+    for length in [0, 1, 8, 15, 16, 100]:
+        plaintext = os.urandom(length)
+        expected = isap.encrypt(plaintext, key, nonce, associated_data)
+
+        buffer = bytearray(plaintext)
+        tag = isap.encrypt_into(buffer, key, nonce, associated_data)
+        assert bytes(buffer) == expected.ciphertext, "Ciphertext mismatch for length {}".format(length)
+        assert tag == expected.tag, "Tag mismatch for length {}".format(length)
+
+        isap.decrypt_into(buffer, key, nonce, tag, associated_data)
+        assert bytes(buffer) == plaintext, "Failed for length {}".format(length)
+
+    # Tag is checked before the buffer is touched
+    buffer = bytearray(b"Test message")
+    tag = isap.encrypt_into(buffer, key, nonce)
+    ciphertext = bytes(buffer)
+    try:
+        isap.decrypt_into(buffer, key, nonce, bytes(ISAP.TAG_SIZE))
+        assert False, "Should fail with wrong tag"
+    except ValueError:
+        pass
+    assert bytes(buffer) == ciphertext
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.bin")
+        content = os.urandom(1000)
+        with open(path, "wb") as f:
+            f.write(content)
+        with writable_file_buffer(path) as mapped:
+            tag = isap.encrypt_into(mapped, key, nonce)
+        with writable_file_buffer(path) as mapped:
+            isap.decrypt_into(mapped, key, nonce, tag)
+        with open(path, "rb") as f:
+            assert f.read() == content
+    print("In-place encryption test passed!")
+
+def test_mac():
+    # ISAP has no MAC-only mode: its tag would only cover the end of the data
+    try:
+        FileIntegrity.generate_file_extract(__file__, os.urandom(16), os.urandom(16), 'ISAP', mac=True)
+        assert False, "ISAP MAC-only extracts should be refused"
+    except ValueError:
+        pass
+    print("MAC-only refusal test passed!")
+
 if __name__ == "__main__":
     print("Running comprehensive ISAP tests...\n")
     
@@ -131,5 +202,7 @@ if __name__ == "__main__":
     test_error_cases()
     # test_performance()
     test_nonce_reuse_warning()
+    test_in_place()
+    test_mac()
     
     print("\nAll tests completed successfully!")
\ No newline at end of file
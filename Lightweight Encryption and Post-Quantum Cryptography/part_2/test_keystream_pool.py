@@ -0,0 +1,147 @@
+# test_keystream_pool.py
+import os
+from elephant import Elephant
+from isap import ISAP
+from keystream_pool import KeystreamPool
+
+def test_precomputed_matches_direct():
+    for cipher, iv_size in [(ISAP(), 16), (Elephant(), 8)]:
+        key = os.urandom(16)
+        with KeystreamPool(cipher) as pool:
+            messages = [(os.urandom(iv_size), os.urandom(length), ad)
+                        for length, ad in [(0, None), (5, None), (8, b"hdr"), (21, None)]]
+            for iv, plaintext, ad in messages:
+                pool.reserve(key, iv, len(plaintext), ad)
+            pool.wait()
+            for iv, plaintext, ad in messages:
+                expected = cipher.encrypt_ofb(plaintext, key, iv, ad)
+                result = pool.encrypt(plaintext, key, iv, ad)
+                assert (result.ciphertext, result.tag) == (expected.ciphertext, expected.tag)
+            assert pool.stats.hits == len(messages)
+            assert pool.pending() == 0 and pool.stats.pooled_bytes == 0
+        print(f"{type(cipher).__name__} pooled OFB matches direct: OK")
+
+def test_round_trip_through_two_pools():
+    isap = ISAP()
+    key, iv = os.urandom(16), os.urandom(16)
+    plaintext = b"latency sensitive message"
+    with KeystreamPool(isap) as sender, KeystreamPool(isap) as receiver:
+        sender.reserve(key, iv, 64)
+        receiver.reserve(key, iv, 64, decrypting=True)
+        receiver.wait()
+        encrypted = sender.encrypt(plaintext, key, iv)
+        assert receiver.decrypt(encrypted.ciphertext, key, iv, encrypted.tag) == plaintext
+        assert receiver.stats.hits == 1
+    print("Round trip test passed!")
+
+def test_same_pool_decrypts_its_own_messages():
+    isap = ISAP()
+    key, iv = os.urandom(16), os.urandom(16)
+    with KeystreamPool(isap) as pool:
+        pool.reserve(key, iv, 16)
+        encrypted = pool.encrypt(b"loopback", key, iv)
+        for _ in range(2):          # decrypting is not a keystream reuse
+            assert pool.decrypt(encrypted.ciphertext, key, iv, encrypted.tag) == b"loopback"
+        try:
+            pool.encrypt(b"other", key, iv)
+            assert False, "Encrypting again must still be refused"
+        except ValueError:
+            pass
+
+        other_iv = os.urandom(16)
+        pool.reserve(key, other_iv, 16, decrypting=True)
+        try:
+            pool.reserve(key, other_iv, 16)
+            assert False, "Should refuse a second reservation of the same (key, IV)"
+        except ValueError:
+            pass
+        pool.encrypt(b"one use", key, other_iv)        # a decryption reservation still counts it once
+        try:
+            pool.encrypt(b"two uses", key, other_iv)
+            assert False, "Should refuse to reuse the keystream"
+        except ValueError:
+            pass
+    print("Same-pool decryption test passed!")
+
+def test_each_keystream_used_once():
+    isap = ISAP()
+    key, iv = os.urandom(16), os.urandom(16)
+    with KeystreamPool(isap) as pool:
+        pool.reserve(key, iv, 16)
+        try:
+            pool.reserve(key, iv, 16)
+            assert False, "Should refuse a second reservation"
+        except ValueError:
+            pass
+        pool.encrypt(b"first", key, iv)
+        try:
+            pool.encrypt(b"second", key, iv)
+            assert False, "Should refuse to reuse the keystream"
+        except ValueError:
+            pass
+
+        other_iv = os.urandom(16)
+        pool.encrypt(b"unreserved", key, other_iv)      # computed inline, still only once
+        try:
+            pool.encrypt(b"again", key, other_iv)
+            assert False, "Should refuse to reuse an unreserved IV"
+        except ValueError:
+            pass
+
+        third_iv = os.urandom(16)
+        pool.reserve(key, third_iv, 16, b"ad")
+        try:
+            pool.encrypt(b"message", key, third_iv, b"other ad")
+            assert False, "Should reject mismatched associated data"
+        except ValueError:
+            pass
+        assert pool.pending() == 1
+    print("Use-once test passed!")
+
+def test_memory_limit_and_eviction():
+    isap = ISAP()
+    key = os.urandom(16)
+    ivs = [os.urandom(16) for _ in range(6)]
+    with KeystreamPool(isap, max_bytes=64) as pool:
+        try:
+            pool.reserve(key, os.urandom(16), 65)
+            assert False, "Should refuse a reservation larger than the pool"
+        except ValueError:
+            pass
+        for iv in ivs:
+            pool.reserve(key, iv, 16)
+        assert pool.stats.peak_bytes <= 64
+        assert pool.stats.evicted == 2
+        pool.wait()
+        assert pool.stats.pooled_bytes == 64
+        for iv in ivs:
+            plaintext = os.urandom(16)
+            result = pool.encrypt(plaintext, key, iv)
+            assert result.ciphertext == isap.encrypt_ofb(plaintext, key, iv).ciphertext
+        assert pool.stats.misses == 2 and pool.stats.hits == 4    # evicted ones are recomputed
+        assert pool.stats.pooled_bytes == 0
+        assert not pool.entries and not pool.evicted
+
+    # Metadata of evicted reservations stays bounded in a long-running pool
+    with KeystreamPool(isap, max_bytes=64, evicted_limit=10) as pool:
+        ivs = [os.urandom(16) for _ in range(200)]
+        for iv in ivs:
+            pool.reserve(key, iv, 16)
+        assert len(pool.entries) <= 4 + len(pool.threads) and len(pool.evicted) == 10
+        pool.wait()
+        pool.encrypt(b"recent", key, ivs[-6])          # remembered: computed on the request path
+        try:
+            pool.encrypt(b"forgotten", key, ivs[0])
+            assert False, "A forgotten reservation must not be encrypted under again"
+        except ValueError:
+            pass
+    print("Eviction test passed!")
+
+if __name__ == "__main__":
+    print("Running keystream pool tests...\n")
+    test_precomputed_matches_direct()
+    test_round_trip_through_two_pools()
+    test_same_pool_decrypts_its_own_messages()
+    test_each_keystream_used_once()
+    test_memory_limit_and_eviction()
+    print("\nAll tests completed!")
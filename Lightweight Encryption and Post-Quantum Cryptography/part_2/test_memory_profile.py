@@ -0,0 +1,68 @@
+# test_memory_profile.py
+import json
+import os
+import tempfile
+from elephant import Elephant
+from isap import ISAP
+from memory_profile import (MIB, KIB, SLACK, BUDGET_EXCEPTIONS, cipher_cases, file_cases, permutations_stubbed,
+                            report, run_suite, parse_size)
+
+def assert_within_budget(results):
+    for m in results:
+        assert m.within_budget, "{} peaked at {} bytes (budget {})".format(m.case, m.peak_bytes, m.budget_bytes)
+        assert m.retained_bytes < 4 * KIB, "{} retained {} bytes".format(m.case, m.retained_bytes)
+
+def test_cipher_buffers():
+    # Elephant needs more than one LANE_CHUNK to show whole-input copies
+    with permutations_stubbed():
+        results = cipher_cases(ISAP(), 4 * KIB, stubbed=True)
+        results += cipher_cases(Elephant(), 160 * KIB, stubbed=True, modes=("encrypt", "encrypt_into", "mac"))
+    assert len(results) == 10
+    assert_within_budget(results)
+    # Only the named exceptions get a second whole-size buffer
+    ofb = next(m for m in results if m.case == "ISAP.encrypt_ofb")
+    assert ofb.budget_bytes == 2 * 4 * KIB + 2 * ISAP.RATE + SLACK
+    assert all(reason for reason in BUDGET_EXCEPTIONS.values())
+    print("Cipher buffer budgets passed!")
+
+def test_stub_is_restored():
+    key, nonce = bytes(range(16)), bytes(8)
+    expected = Elephant().encrypt(b"restored", key, nonce)
+    with permutations_stubbed():
+        assert Elephant().encrypt(b"restored", key, nonce).tag != expected.tag
+    assert Elephant().encrypt(b"restored", key, nonce) == expected
+    print("Stub restore test passed!")
+
+def test_real_permutations():
+    results = cipher_cases(ISAP(), 256, modes=("encrypt",))
+    results += cipher_cases(Elephant(), 64, modes=("mac",))
+    assert_within_budget(results)
+    print("Working-set test passed!")
+
+def test_file_budgets():
+    with tempfile.TemporaryDirectory() as directory:
+        results = file_cases(MIB, directory) + file_cases(64 * MIB, directory)
+        assert os.listdir(directory) == []
+    assert_within_budget(results)
+    assert results[-1].peak_bytes < 8 * MIB        # a whole-file read would be 64 MiB
+    print("File budgets passed!")
+
+def test_report():
+    assert parse_size("64M") == 64 * MIB and parse_size("1GiB") == 1 << 30 and parse_size("512") == 512
+    results = run_suite(file_sizes=[KIB], cipher_sizes={'ISAP': KIB, 'Elephant': KIB},
+                        permutation_sizes={})
+    data = json.loads(json.dumps(report(results)))
+    assert all(r["within_budget"] for r in data["results"])
+    assert data["budget_exceptions"] == BUDGET_EXCEPTIONS
+    assert {"FileIntegrity.verify_tree", "Elephant.mac", "ISAP.encrypt_ofb"} <= {r["case"] for r in data["results"]}
+    assert report([])["results"] == []
+    print("Report test passed!")
+
+if __name__ == "__main__":
+    print("Running memory profile tests...\n")
+    test_cipher_buffers()
+    test_stub_is_restored()
+    test_real_permutations()
+    test_file_budgets()
+    test_report()
+    print("\nAll tests passed!")
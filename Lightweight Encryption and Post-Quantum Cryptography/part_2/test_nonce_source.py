@@ -0,0 +1,133 @@
+# test_nonce_source.py
+import os
+import threading
+import warnings
+from nonce_source import (NonceAllocator, ReuseDetector, BloomFilter, RandomPool,
+                          NonceReuseWarning, random_nonce)
+from benchmark import bench_nonces
+
+def test_random_pool():
+    pool = RandomPool(prefetch=64)
+    chunks = [pool.take(16) for _ in range(8)]
+    assert all(len(chunk) == 16 for chunk in chunks)
+    assert len(set(chunks)) == 8
+    assert pool.refills == 2
+    assert len(pool.take(100)) == 100     # larger than the batch goes straight to os.urandom
+    assert len(random_nonce(8)) == 8
+    print("Random pool test passed!")
+
+def test_allocator_uniqueness_across_threads():
+    for allocator, size in [(NonceAllocator.for_isap(), 16), (NonceAllocator.for_elephant(), 8)]:
+        results = []
+        def worker():
+            results.append([allocator.next() for _ in range(2000)])
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        nonces = [nonce for chunk in results for nonce in chunk]
+        assert all(len(nonce) == size for nonce in nonces)
+        assert len(set(nonces)) == len(nonces)
+    print("Allocator uniqueness test passed!")
+
+def test_counter_wrap_takes_new_prefix():
+    allocator = NonceAllocator(8, counter_size=1)
+    nonces = [allocator.next() for _ in range(600)]
+    assert len(set(nonces)) == 600
+    assert len({nonce[:7] for nonce in nonces}) == 3
+    try:
+        NonceAllocator(8, counter_size=8)
+        assert False, "Should fail without room for a prefix"
+    except ValueError:
+        pass
+    print("Counter wrap test passed!")
+
+def test_fork_gets_fresh_state():
+    if not hasattr(os, "fork"):
+        return
+    pool = RandomPool(prefetch=64)
+    allocator = NonceAllocator.for_elephant()
+    pool.take(16), allocator.next(), random_nonce(16)      # buffers and prefix are now in use
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.write(write_end, pool.take(16) + allocator.next() + random_nonce(16))
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end, "rb") as pipe:
+        child = pipe.read()
+    os.waitpid(pid, 0)
+    parent = pool.take(16) + allocator.next() + random_nonce(16)
+    assert len(child) == len(parent) == 40
+    assert child[:16] != parent[:16] and child[32:] != parent[32:]
+    assert child[16:20] != parent[16:20]        # the child drew its own nonce prefix
+    print("Fork test passed!")
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, error_rate=1e-4)
+    items = [os.urandom(16) for _ in range(1000)]
+    assert not any(bloom.add(item) for item in items)
+    assert all(item in bloom for item in items)
+    assert bloom.saturated
+    false_positives = sum(os.urandom(16) in bloom for _ in range(10000))
+    assert false_positives < 20
+    print("Bloom filter test passed!")
+
+def test_reuse_detector():
+    key1, key2 = os.urandom(16), os.urandom(16)
+    nonce = os.urandom(16)
+    detector = ReuseDetector(memory_bytes=4096, per_key_bytes=1024)
+    assert detector.check(key1, nonce) is False
+    assert detector.check(key2, nonce) is False    # same nonce, different key is fine
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert detector.check(key1, nonce) is True
+    assert caught and issubclass(caught[0].category, NonceReuseWarning)
+
+    strict = ReuseDetector(strict=True)
+    strict.check(key1, nonce)
+    try:
+        strict.check(key1, nonce)
+        assert False, "Should fail on reuse"
+    except ValueError:
+        pass
+
+    # Memory stays bounded: old keys are evicted
+    for _ in range(10):
+        detector.check(os.urandom(16), nonce)
+    assert len(detector.filters) == 4 and detector.evicted == 8
+    assert detector.memory_bytes <= 4096
+    print("Reuse detector test passed!")
+
+def test_allocator_with_detector():
+    key = os.urandom(16)
+    allocator = NonceAllocator.for_elephant(detector=ReuseDetector(strict=True))
+    for _ in range(1000):
+        allocator.next(key)
+    try:
+        allocator.observe(key, allocator.next(key))
+        assert False, "Should flag an allocated nonce seen again"
+    except ValueError:
+        pass
+    print("Allocator with detector test passed!")
+
+def test_benchmark_runs():
+    results = bench_nonces(count=200, message_size=16)
+    assert set(results) == {"os.urandom", "random_nonce", "counter", "counter+detector"}
+    assert all(r["seconds"] > 0 for r in results.values())
+
+if __name__ == "__main__":
+    print("Running nonce source tests...\n")
+    test_random_pool()
+    test_allocator_uniqueness_across_threads()
+    test_counter_wrap_takes_new_prefix()
+    test_fork_gets_fresh_state()
+    test_bloom_filter()
+    test_reuse_detector()
+    test_allocator_with_detector()
+    test_benchmark_runs()
+    print("\nAll tests completed!")
@@ -0,0 +1,136 @@
+# test_read_ahead.py
+import io
+import os
+import tempfile
+import time
+from file_encryption import encrypt_stream, decrypt_stream
+from file_integrity import FileIntegrity
+from read_ahead import ReadAhead, PipelineStats
+
+class SlowFile(io.BytesIO):
+    """BytesIO whose reads take a fixed time, like a slow disk"""
+    def __init__(self, data, delay):
+        super().__init__(data)
+        self.delay = delay
+
+    def readinto(self, buffer):
+        time.sleep(self.delay)
+        return super().readinto(buffer)
+
+class ReadOnly:
+    """A source with read() but no readinto()"""
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, n=-1):
+        return self.stream.read(min(n, 3))     # short reads
+
+def test_chunks_and_reads():
+    data = os.urandom(10000)
+    for chunk_size, depth in [(1, 1), (333, 2), (4096, 3), (20000, 2)]:
+        with ReadAhead(io.BytesIO(data), chunk_size, depth) as reader:
+            chunks = [bytes(chunk) for chunk in reader]
+        assert b"".join(chunks) == data
+        assert all(len(c) == chunk_size for c in chunks[:-1])
+
+        reader = ReadAhead(io.BytesIO(data), chunk_size, depth)
+        parts = [reader.read(700), reader.read(0), reader.read(1)]
+        parts += [bytes(chunk) for chunk in reader]           # iteration picks up mid-chunk
+        assert b"".join(parts) == data and not reader.thread.is_alive()
+
+    with ReadAhead(io.BytesIO(data), 256, limit=1000) as reader:
+        assert reader.read() == data[:1000] and reader.read(5) == b""
+        assert reader.chunk_size == 256 and reader.stats.bytes_read == 1000
+    with ReadAhead(io.BytesIO(data), limit=10) as reader:
+        assert len(reader.buffers[0]) == 10       # buffers never exceed the limit
+    with ReadAhead(ReadOnly(data), 1000) as reader:
+        assert b"".join(bytes(c) for c in reader) == data
+    with ReadAhead(io.BytesIO(b"")) as reader:
+        assert list(reader) == [] and reader.read() == b""
+    print("Chunking test passed!")
+
+def test_buffers_are_reused():
+    data = os.urandom(64 * 100)
+    with ReadAhead(io.BytesIO(data), 64, depth=2) as reader:
+        owners = {id(chunk.obj) for chunk in reader}
+    assert owners == {id(buffer) for buffer in reader.buffers} and reader.stats.chunks == 100
+    print("Buffer reuse test passed!")
+
+def test_errors_and_early_exit():
+    class Failing(io.BytesIO):
+        def readinto(self, buffer):
+            if self.tell() >= 100:
+                raise OSError("disk error")
+            return super().readinto(buffer)
+
+    reader = ReadAhead(Failing(bytes(1000)), 50)
+    try:
+        for _ in reader:
+            pass
+        assert False, "Should raise the reader thread's error"
+    except OSError:
+        pass
+    assert not reader.thread.is_alive()
+
+    reader = ReadAhead(io.BytesIO(bytes(10 ** 6)), 10, depth=4)
+    for _ in reader:
+        break
+    assert not reader.thread.is_alive()
+
+    for chunk_size, depth, limit in [(0, 2, None), (10, 0, None), (10, 2, -1)]:
+        try:
+            ReadAhead(io.BytesIO(), chunk_size, depth, limit)
+            assert False, "Should reject bad parameters"
+        except ValueError:
+            pass
+    print("Error handling test passed!")
+
+def test_overlap():
+    # Reads and compute each take 10-20 ms per chunk; read-ahead hides the reads
+    data = bytes(8 * 100)
+    results = {}
+    for depth in (1, 2):
+        with ReadAhead(SlowFile(data, 0.01), 100, depth) as reader:
+            for _ in reader:
+                time.sleep(0.02)
+        results[depth] = reader.stats
+    assert results[1].io_wait > 0.06
+    assert results[2].io_wait < results[1].io_wait / 2
+    assert results[2].overlap > 0.5 > results[1].overlap
+    assert results[2].compute_time > 0.15
+    print(f"I/O wait: {results[1].io_wait:.3f}s unbuffered, {results[2].io_wait:.3f}s double-buffered")
+
+def test_encryption_and_integrity_paths():
+    data = os.urandom(3000)
+    key, nonce = os.urandom(16), os.urandom(8)
+    containers = []
+    for depth in (1, 3):
+        container = io.BytesIO()
+        stats = encrypt_stream(io.BytesIO(data), container, key, nonce=nonce, chunk_size=500,
+                               read_size=256, depth=depth)
+        assert stats.pipeline.bytes_read == len(data) and stats.pipeline.chunks >= len(data) // 256
+        containers.append(container.getvalue())
+        output = io.BytesIO()
+        assert decrypt_stream(io.BytesIO(container.getvalue()), output, key, depth=depth).pipeline.bytes_read
+        assert output.getvalue() == data
+    assert containers[0] == containers[1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "document.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        stats = PipelineStats()
+        extract = FileIntegrity.generate_file_extract(path, key, nonce, 'Elephant', depth=1, stats=stats)
+        FileIntegrity.append_extract_to_file(path, extract)
+        assert FileIntegrity.verify_file_integrity(path, key, nonce, 'Elephant', depth=4, stats=stats)
+        assert stats.bytes_read == 2 * len(data)
+    print("Pipeline integration test passed!")
+
+if __name__ == "__main__":
+    print("Running read-ahead pipeline tests...\n")
+    test_chunks_and_reads()
+    test_buffers_are_reused()
+    test_errors_and_early_exit()
+    test_overlap()
+    test_encryption_and_integrity_paths()
+    print("\nAll tests passed!")